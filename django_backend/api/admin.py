@@ -1,6 +1,6 @@
 #自动生成的后台管理系统
 from django.contrib import admin
-from .models import DataFile, CleanedData, AnalysisResult, VisualizationResult
+from .models import DataFile, CleanedData, AnalysisResult, VisualizationResult, DistributionSketch, StoredArtifact, UploadSession
 
 @admin.register(DataFile)
 class DataFileAdmin(admin.ModelAdmin):
@@ -23,3 +23,20 @@ class VisualizationResultAdmin(admin.ModelAdmin):
     list_display = ('data_file', 'chart_type', 'title', 'created_at')
     list_filter = ('chart_type', 'created_at')
     search_fields = ('title',)
+
+@admin.register(DistributionSketch)
+class DistributionSketchAdmin(admin.ModelAdmin):
+    list_display = ('data_file', 'cleaned_data', 'column', 'created_at')
+    search_fields = ('column',)
+
+@admin.register(StoredArtifact)
+class StoredArtifactAdmin(admin.ModelAdmin):
+    list_display = ('path', 'kind', 'user', 'size', 'last_accessed')
+    list_filter = ('kind',)
+    search_fields = ('path',)
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'user', 'status', 'received', 'size', 'rows', 'updated_at')
+    list_filter = ('status',)
+    search_fields = ('name',)
@@ -0,0 +1,306 @@
+"""
+耗时接口（analyze、promote、clean_data、bulk_upload）的准入控制
+
+一个用户连续提交多个随机森林分析就能占满所有 CPU 核，其他用户的请求只能等待。
+这些接口在执行前向 AdmissionController 申请 CPU 槽位：
+
+- 全局槽位：settings.ADMISSION_SLOTS 个（0 表示 CPU 核数），每个请求占用 ADMISSION_COSTS[接口] 个（默认 1）；
+- 每个用户同时运行的请求数不超过 ADMISSION_USER_LIMIT；
+- 槽位不足时排队，按加权公平排队（WFQ）选择下一个运行的请求：请求入队时得到虚拟完成时间
+  F = max(V, 该用户上一个请求的 F) + 占用槽位数 / 用户权重（V 为最近开始运行的请求的虚拟开始时间），
+  总是先运行 F 最小、且所属用户未达到并发上限的请求。连续提交很多请求的用户，后面请求的 F 越来越大，
+  不会挤占其他用户；ADMISSION_WEIGHTS 中权重为 2 的用户得到两倍的份额；
+- 用户排队的请求达到 ADMISSION_USER_QUEUE 个、或总排队数达到 ADMISSION_QUEUE 时直接返回 429，
+  Retry-After 按最近请求的平均运行时间和排队的请求数估算；同步请求排队超过 ADMISSION_MAX_WAIT 秒同样返回 429。
+
+带 progress 参数的请求（见 api/progress.py）在请求线程中入队（队列已满时同样立即返回 429），
+获得槽位后才提交到后台线程池，排队中的任务不占用工作线程，取消排队中的任务会立即让出队列位置。
+
+排队深度、各用户运行中 / 排队中的请求数和排队等待时间的直方图通过 /api/metrics/ 的 admission 读取；
+每个请求的等待时间也记录在 Server-Timing 的 admission 阶段中。
+"""
+import itertools
+import math
+import os
+import threading
+import time
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+from .timing import LatencyHistogram, mark
+
+# 排队等待时间的直方图桶上界（毫秒）
+WAIT_BUCKETS_MS = (0, 1, 10, 100, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000, 300000)
+# 平均运行时间的指数移动平均系数
+SERVICE_TIME_ALPHA = 0.2
+# 还没有完成过请求时估算 Retry-After 使用的运行时间（秒）
+DEFAULT_SERVICE_SECONDS = 5.0
+
+
+class AdmissionRejected(Exception):
+    """队列已满（或排队超时），retry_after 为建议的重试间隔（秒）"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """一个请求的排队凭证；获得槽位后 granted 为 True，运行结束后必须 release"""
+
+    def __init__(self, controller, user_id, kind, cost, start_tag, finish_tag, seq, callback):
+        self.controller = controller
+        self.user_id = user_id
+        self.kind = kind
+        self.cost = cost
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.seq = seq
+        self.callback = callback
+        self.enqueued = time.monotonic()
+        self.started = None
+        self.granted = False
+        self.released = False
+
+    @property
+    def wait_seconds(self):
+        return (self.started or time.monotonic()) - self.enqueued
+
+    def wait(self, timeout=None):
+        """等待获得槽位，超时返回 False"""
+        return self.controller.wait(self, timeout)
+
+    def cancel(self):
+        """还在排队时离开队列并返回 True；已获得槽位时返回 False（需要运行结束后 release）"""
+        return self.controller.cancel(self)
+
+    def release(self):
+        self.controller.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class AdmissionController:
+    def __init__(self, slots, user_limit, user_queue, queue_limit, weights=None):
+        self.slots = max(1, slots)
+        self.user_limit = max(1, user_limit)
+        self.user_queue = user_queue
+        self.queue_limit = queue_limit
+        self.weights = weights or {}
+        self.in_use = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_histogram = LatencyHistogram(WAIT_BUCKETS_MS)
+        self._queue = []
+        self._running = {}
+        self._last_finish = {}
+        self._virtual_time = 0.0
+        self._service_seconds = None
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+
+    def retry_after(self, queued=None):
+        """按平均运行时间估算排在队尾的请求需要等待的秒数（至少 1 秒）"""
+        queued = len(self._queue) if queued is None else queued
+        service = self._service_seconds or DEFAULT_SERVICE_SECONDS
+        return max(1, math.ceil(service * (queued + 1) / self.slots))
+
+    def enqueue(self, user_id, kind, cost=1, weight=1.0, callback=None):
+        """
+        入队并返回 Ticket；队列已满时抛出 AdmissionRejected。
+        callback(ticket) 在获得槽位时调用（可能在本次调用中立即调用），不指定时由调用方 wait。
+        """
+        cost = min(max(int(cost), 1), self.slots)
+        with self._condition:
+            queued_by_user = sum(1 for ticket in self._queue if ticket.user_id == user_id)
+            # 可以立即运行的请求不受队列长度限制
+            must_wait = (
+                self._queue or self.in_use + cost > self.slots
+                or self._running.get(user_id, 0) >= self.user_limit
+            )
+            if must_wait and (len(self._queue) >= self.queue_limit or queued_by_user >= self.user_queue):
+                self.rejected += 1
+                scope = '您排队中的请求' if queued_by_user >= self.user_queue else '排队中的请求'
+                raise AdmissionRejected(f'{scope}过多，请稍后重试', self.retry_after())
+            start_tag = max(self._virtual_time, self._last_finish.get(user_id, 0.0))
+            finish_tag = start_tag + cost / max(float(weight), 1e-6)
+            self._last_finish[user_id] = finish_tag
+            ticket = Ticket(self, user_id, kind, cost, start_tag, finish_tag, next(self._seq), callback)
+            self._queue.append(ticket)
+            granted = self._dispatch()
+        self._notify(granted)
+        return ticket
+
+    def _dispatch(self):
+        """按虚拟完成时间发放槽位，返回新获得槽位的 Ticket；调用方持有 self._condition"""
+        granted = []
+        while self._queue:
+            eligible = [ticket for ticket in self._queue if self._running.get(ticket.user_id, 0) < self.user_limit]
+            if not eligible:
+                break
+            ticket = min(eligible, key=lambda t: (t.finish_tag, t.seq))
+            # 槽位不够时等待，不让占用槽位少的请求越过它（避免占用多的请求一直得不到槽位）
+            if self.in_use + ticket.cost > self.slots:
+                break
+            self._queue.remove(ticket)
+            self.in_use += ticket.cost
+            self._running[ticket.user_id] = self._running.get(ticket.user_id, 0) + 1
+            self._virtual_time = max(self._virtual_time, ticket.start_tag)
+            ticket.granted = True
+            ticket.started = time.monotonic()
+            self.admitted += 1
+            self.wait_histogram.observe(ticket.wait_seconds * 1000)
+            granted.append(ticket)
+        if granted:
+            self._condition.notify_all()
+        return granted
+
+    def _notify(self, granted):
+        # 回调可能提交任务到线程池，在锁外调用
+        for ticket in granted:
+            if ticket.callback is not None:
+                ticket.callback(ticket)
+
+    def _forget(self, user_id):
+        # 用户没有运行中和排队中的请求、且虚拟完成时间已落后时，不再保留其状态；调用方持有 self._condition
+        if self._running.get(user_id) == 0:
+            del self._running[user_id]
+        if user_id not in self._running and not any(t.user_id == user_id for t in self._queue):
+            if self._last_finish.get(user_id, 0.0) <= self._virtual_time:
+                self._last_finish.pop(user_id, None)
+
+    def wait(self, ticket, timeout=None):
+        with self._condition:
+            self._condition.wait_for(lambda: ticket.granted, timeout)
+            if not ticket.granted:
+                self.timed_out += 1
+            return ticket.granted
+
+    def cancel(self, ticket):
+        with self._condition:
+            if ticket.granted or ticket.released:
+                return False
+            ticket.released = True
+            self._queue.remove(ticket)
+            self._forget(ticket.user_id)
+            granted = self._dispatch()
+        self._notify(granted)
+        return True
+
+    def release(self, ticket):
+        with self._condition:
+            if ticket.released:
+                return
+            ticket.released = True
+            if not ticket.granted:
+                self._queue.remove(ticket)
+            else:
+                self.in_use -= ticket.cost
+                self._running[ticket.user_id] -= 1
+                elapsed = time.monotonic() - ticket.started
+                self._service_seconds = elapsed if self._service_seconds is None else (
+                    SERVICE_TIME_ALPHA * elapsed + (1 - SERVICE_TIME_ALPHA) * self._service_seconds
+                )
+            self._forget(ticket.user_id)
+            granted = self._dispatch()
+        self._notify(granted)
+
+    def snapshot(self):
+        with self._condition:
+            now = time.monotonic()
+            users = {}
+            for user_id, running in self._running.items():
+                users.setdefault(user_id, {'running': 0, 'queued': 0})['running'] = running
+            for ticket in self._queue:
+                users.setdefault(ticket.user_id, {'running': 0, 'queued': 0})['queued'] += 1
+            return {
+                'slots': self.slots,
+                'in_use': self.in_use,
+                'user_limit': self.user_limit,
+                'queue_depth': len(self._queue),
+                'queue_limit': self.queue_limit,
+                'oldest_wait_ms': round(max((now - t.enqueued for t in self._queue), default=0.0) * 1000, 3),
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'mean_service_seconds': round(self._service_seconds, 3) if self._service_seconds else None,
+                'users': {str(user_id): counts for user_id, counts in users.items()},
+                'wait': self.wait_histogram.snapshot(),
+            }
+
+
+_controller = None
+_controller_config = None
+_controller_lock = threading.Lock()
+
+
+def _config():
+    return (
+        getattr(settings, 'ADMISSION_SLOTS', 0) or os.cpu_count() or 1,
+        getattr(settings, 'ADMISSION_USER_LIMIT', 2),
+        getattr(settings, 'ADMISSION_USER_QUEUE', 8),
+        getattr(settings, 'ADMISSION_QUEUE', 64),
+        tuple(sorted(getattr(settings, 'ADMISSION_WEIGHTS', {}).items())),
+    )
+
+
+def get_controller():
+    """进程内共享的准入控制器；相关设置变化（例如测试中 override_settings）时重新创建"""
+    global _controller, _controller_config
+    config = _config()
+    with _controller_lock:
+        if _controller is None or config != _controller_config:
+            slots, user_limit, user_queue, queue_limit, weights = config
+            _controller = AdmissionController(slots, user_limit, user_queue, queue_limit, dict(weights))
+            _controller_config = config
+        return _controller
+
+
+def enabled():
+    return getattr(settings, 'ADMISSION_ENABLED', True)
+
+
+def rejected_response(message, retry_after):
+    return Response(
+        {'error': message, 'retry_after': retry_after},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={'Retry-After': str(retry_after)},
+    )
+
+
+def admission_ticket(request, kind, callback=None):
+    """
+    为请求入队，返回 (Ticket, None)；队列已满时返回 (None, 429 响应)；未启用准入控制时返回 (None, None)。
+    """
+    if not enabled():
+        return None, None
+    controller = get_controller()
+    user = request.user
+    weight = controller.weights.get(getattr(user, 'username', None), 1.0)
+    cost = getattr(settings, 'ADMISSION_COSTS', {}).get(kind, 1)
+    try:
+        return controller.enqueue(user.id, kind, cost, weight, callback), None
+    except AdmissionRejected as e:
+        return None, rejected_response(str(e), e.retry_after)
+
+
+def run_admitted(request, kind, func):
+    """获得槽位后在当前线程中运行 func 并返回其响应；队列已满或排队超时返回 429"""
+    ticket, rejected = admission_ticket(request, kind)
+    if rejected is not None:
+        return rejected
+    if ticket is None:
+        return func()
+    with ticket:
+        if not ticket.wait(getattr(settings, 'ADMISSION_MAX_WAIT', 300)):
+            return rejected_response('排队等待超时，请稍后重试', ticket.controller.retry_after())
+        mark(request, 'admission')
+        return func()
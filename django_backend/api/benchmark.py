@@ -0,0 +1,380 @@
+"""
+性能基准测试工具
+
+包含两部分：
+1. 天气数据生成器：按照 data/weather_prediction_dataset.csv 的形状（DATE、MONTH、
+   "站点_观测量" 列以及 "站点_BBQ_weather" 标签列）生成任意行数/列数的 CSV 文件，
+   可从当前的 3654 行扩展到 1000 万行、从 20 列扩展到 2000 列。
+2. 基准运行器：通过 DRF 测试客户端依次调用 preview、clean_data（每种清洗方法）
+   以及 analyze（每种分析类型），记录耗时、峰值内存（RSS）和响应大小，
+   输出可在不同提交之间对比的 JSON 报告。
+
+命令行入口见 api/management/commands/benchmark.py。
+"""
+import datetime
+import json
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+import pandas as pd
+
+from .memory import PeakRSSSampler
+
+# 报告格式版本，修改报告结构时递增
+REPORT_SCHEMA_VERSION = 1
+
+# 原始数据集中的 18 个站点
+STATIONS = [
+    'BASEL', 'BUDAPEST', 'DE_BILT', 'DRESDEN', 'DUSSELDORF', 'HEATHROW',
+    'KASSEL', 'LJUBLJANA', 'MAASTRICHT', 'MALMO', 'MONTELIMAR', 'MUENCHEN',
+    'OSLO', 'PERPIGNAN', 'ROMA', 'SONNBLICK', 'STOCKHOLM', 'TOURS',
+]
+
+# 每种观测量的取值范围：(均值, 标准差, 最小值, 最大值, 小数位数)
+# 数值参考原始数据集的 describe() 结果，单位与 metadata.txt 一致
+VARIABLES = {
+    'cloud_cover': (5.0, 2.3, 0, 8, 0),
+    'wind_speed': (3.3, 1.6, 0.0, 11.0, 1),
+    'wind_gust': (10.0, 3.8, 0.0, 34.0, 1),
+    'humidity': (0.75, 0.1, 0.2, 1.0, 2),
+    'pressure': (1.018, 0.008, 0.98, 1.05, 4),
+    'global_radiation': (1.3, 0.9, 0.0, 3.6, 2),
+    'precipitation': (0.2, 0.5, 0.0, 7.6, 2),
+    'sunshine': (4.6, 4.3, 0.0, 15.3, 1),
+    'temp_mean': (10.4, 7.2, -25.0, 35.0, 1),
+    'temp_min': (6.3, 6.5, -30.0, 30.0, 1),
+    'temp_max': (14.5, 8.2, -20.0, 40.0, 1),
+}
+
+# 生成时每次写入的行数，控制生成大文件时的内存占用
+GENERATOR_CHUNK_ROWS = 100_000
+
+# 生成数据的起始日期
+START_DATE = datetime.date(2000, 1, 1)
+
+
+def weather_columns(n_cols, with_labels=True):
+    """
+    计算生成文件的列布局。
+
+    返回 (feature_columns, label_columns)。n_cols 为包含 DATE、MONTH 在内的总列数；
+    with_labels 为 True 时，每个出现在特征列中的站点会额外占用一列 BBQ_weather 标签。
+    超过原始 18 个站点后，使用 STATION_19、STATION_20 ... 作为合成站点名。
+    """
+    if n_cols < 3:
+        raise ValueError('列数至少为 3（DATE、MONTH 和至少一列观测值）')
+
+    feature_columns = []
+    label_columns = []
+    remaining = n_cols - 2
+    station_index = 0
+    while remaining > 0:
+        if station_index < len(STATIONS):
+            station = STATIONS[station_index]
+        else:
+            station = f'STATION_{station_index + 1}'
+        station_index += 1
+
+        # 给标签列预留一个位置
+        if with_labels and remaining >= 2:
+            label_columns.append(f'{station}_BBQ_weather')
+            remaining -= 1
+
+        for variable in VARIABLES:
+            if remaining == 0:
+                break
+            feature_columns.append(f'{station}_{variable}')
+            remaining -= 1
+
+    return feature_columns, label_columns
+
+
+def _generate_chunk(rng, start_row, n_rows, feature_columns, label_columns):
+    """生成一个数据块（DataFrame），行号从 start_row 开始"""
+    dates = pd.date_range(START_DATE + datetime.timedelta(days=start_row), periods=n_rows, freq='D')
+    # 季节因子：用于让温度、日照等随月份变化，使聚类/回归结果有意义
+    season = np.sin((dates.dayofyear.to_numpy() - 110) / 365.25 * 2 * np.pi)
+
+    data = {
+        'DATE': dates.strftime('%Y%m%d').astype(int),
+        'MONTH': dates.month,
+    }
+    for col in feature_columns:
+        variable = next(v for v in VARIABLES if col.endswith(v))
+        mean, std, low, high, decimals = VARIABLES[variable]
+        values = rng.normal(mean, std, n_rows)
+        if variable.startswith('temp') or variable in ('sunshine', 'global_radiation'):
+            values += season * std
+        values = np.clip(values, low, high)
+        if decimals == 0:
+            data[col] = np.rint(values).astype(np.int64)
+        else:
+            data[col] = np.round(values, decimals)
+
+    df = pd.DataFrame(data)
+
+    # BBQ 标签：与原始标签规则类似，依赖当天的最高温度、降水和日照
+    for label in label_columns:
+        station = label[:-len('_BBQ_weather')]
+        temp_max = df.get(f'{station}_temp_max', pd.Series(season * 8.2 + 14.5))
+        precipitation = df.get(f'{station}_precipitation', pd.Series(np.zeros(n_rows)))
+        sunshine = df.get(f'{station}_sunshine', pd.Series(np.full(n_rows, 5.0)))
+        df[label] = ((temp_max.to_numpy() >= 17) & (precipitation.to_numpy() < 0.5)
+                     & (sunshine.to_numpy() >= 4))
+    return df
+
+
+def generate_weather_dataset(path, n_rows=3654, n_cols=165, with_labels=True, seed=42):
+    """
+    生成一个天气数据 CSV 文件。
+
+    分块写入，生成 1000 万行的文件时内存占用也只与 GENERATOR_CHUNK_ROWS 有关。
+    相同的参数和 seed 总是生成相同的文件。返回生成的文件路径。
+    """
+    feature_columns, label_columns = weather_columns(n_cols, with_labels=with_labels)
+    rng = np.random.default_rng(seed)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.part'
+    written = 0
+    with open(tmp_path, 'w', newline='') as f:
+        while written < n_rows:
+            chunk_rows = min(GENERATOR_CHUNK_ROWS, n_rows - written)
+            chunk = _generate_chunk(rng, written, chunk_rows, feature_columns, label_columns)
+            chunk.to_csv(f, index=False, header=(written == 0))
+            written += chunk_rows
+    # 写完再改名，避免中断后留下不完整的缓存文件
+    os.replace(tmp_path, path)
+    return path
+
+
+def cached_weather_dataset(data_dir, n_rows, n_cols, with_labels=True, seed=42):
+    """在 data_dir 中按参数复用已生成的文件，不存在时才生成"""
+    name = f'weather_{n_rows}x{n_cols}_s{seed}{"_labels" if with_labels else ""}.csv'
+    path = os.path.join(data_dir, name)
+    if not os.path.exists(path):
+        generate_weather_dataset(path, n_rows, n_cols, with_labels=with_labels, seed=seed)
+    return path
+
+
+def default_cases(feature_columns, label_columns):
+    """
+    基准用例列表：每个用例是 (名称, 方法, 路径模板, 请求体)。
+
+    覆盖 preview、clean_data 的每种清洗方法/策略，以及 analyze 的每种分析类型（含抽样模式）。
+    路径和请求体中的 {file_id} 在运行时替换。
+    """
+    features = feature_columns[:5]
+    numeric_target = next((c for c in feature_columns if c.endswith('temp_mean')), feature_columns[-1])
+    class_target = label_columns[0] if label_columns else 'MONTH'
+
+    def clean(cleaning_method, **parameters):
+        return {'file_id': '{file_id}', 'cleaning_method': cleaning_method, 'parameters': parameters}
+
+    def analyze(analysis_type, **parameters):
+        return {'file_id': '{file_id}', 'analysis_type': analysis_type, 'parameters': parameters}
+
+    return [
+        ('preview', 'get', '/api/datafiles/{file_id}/preview/', None),
+        ('clean_data.missing_values.mean', 'post', '/api/cleaneddata/clean_data/', clean('missing_values', strategy='mean')),
+        ('clean_data.missing_values.median', 'post', '/api/cleaneddata/clean_data/', clean('missing_values', strategy='median')),
+        ('clean_data.missing_values.mode', 'post', '/api/cleaneddata/clean_data/', clean('missing_values', strategy='mode')),
+        ('clean_data.missing_values.drop', 'post', '/api/cleaneddata/clean_data/', clean('missing_values', strategy='drop')),
+        ('clean_data.outliers.zscore', 'post', '/api/cleaneddata/clean_data/', clean('outliers', method='zscore', threshold=3.0)),
+        ('clean_data.outliers.iqr', 'post', '/api/cleaneddata/clean_data/', clean('outliers', method='iqr', threshold=1.5)),
+        ('clean_data.outliers.mad', 'post', '/api/cleaneddata/clean_data/', clean('outliers', method='mad', threshold=3.5)),
+        ('clean_data.standardization', 'post', '/api/cleaneddata/clean_data/', clean('standardization')),
+        # 与上一个用例参数相同：命中内容寻址的清洗结果缓存
+        ('clean_data.standardization.cached', 'post', '/api/cleaneddata/clean_data/', clean('standardization')),
+        ('analyze.clustering', 'post', '/api/analysisresults/analyze/', analyze('clustering', features=features, n_clusters=3)),
+        ('analyze.dimension_reduction', 'post', '/api/analysisresults/analyze/', analyze('dimension_reduction', features=features, n_components=2)),
+        ('analyze.regression.linear', 'post', '/api/analysisresults/analyze/', analyze('regression', features=features, target=numeric_target, algorithm='linear')),
+        ('analyze.regression.random_forest', 'post', '/api/analysisresults/analyze/', analyze('regression', features=features, target=numeric_target, algorithm='random_forest')),
+        ('analyze.regression.hist_gradient_boosting', 'post', '/api/analysisresults/analyze/', analyze('regression', features=features, target=numeric_target, algorithm='hist_gradient_boosting')),
+        ('analyze.classification', 'post', '/api/analysisresults/analyze/', analyze('classification', features=features, target=class_target)),
+        ('analyze.classification.hist_gradient_boosting', 'post', '/api/analysisresults/analyze/', analyze('classification', features=features, target=class_target, algorithm='hist_gradient_boosting')),
+        # 抽样模式：拟合耗时应与行数无关
+        ('analyze.clustering.sampled', 'post', '/api/analysisresults/analyze/', analyze('clustering', features=features, n_clusters=3, sample=True)),
+        ('analyze.regression.random_forest.sampled', 'post', '/api/analysisresults/analyze/', analyze('regression', features=features, target=numeric_target, algorithm='random_forest', sample=True)),
+    ]
+
+
+def _fill(template, file_id):
+    """把请求模板中的 {file_id} 替换为实际 ID"""
+    if isinstance(template, str):
+        return int(file_id) if template == '{file_id}' else template.replace('{file_id}', str(file_id))
+    if isinstance(template, dict):
+        return {k: _fill(v, file_id) for k, v in template.items()}
+    if isinstance(template, list):
+        return [_fill(v, file_id) for v in template]
+    return template
+
+
+class BenchmarkRunner:
+    """
+    通过 DRF 测试客户端运行基准用例。
+
+    需要在已配置好的 Django 环境（测试数据库 + 临时 MEDIA_ROOT）中使用，
+    见 management/commands/benchmark.py。
+    """
+
+    def __init__(self, user, data_dir, repeat=1, case_filter=None, seed=42, log=None):
+        from rest_framework.test import APIClient
+
+        self.user = user
+        self.data_dir = data_dir
+        self.repeat = max(1, int(repeat))
+        self.case_filter = case_filter or []
+        self.seed = seed
+        self.log = log or (lambda message: None)
+        self.client = APIClient()
+        # 服务器端异常也作为一次失败的请求记录下来，而不是中断整个基准测试
+        self.client.raise_request_exception = False
+        self.client.force_authenticate(user=user)
+
+    def _create_data_file(self, path, n_rows, n_cols):
+        """直接创建 DataFile 记录，上传本身不计入基准"""
+        from django.core.files import File
+        from .models import DataFile
+
+        with open(path, 'rb') as f:
+            data_file = DataFile(
+                user=self.user,
+                name=f'benchmark_{n_rows}x{n_cols}.csv',
+                description='benchmark',
+                file_type='text/csv',
+            )
+            data_file.file.save(os.path.basename(path), File(f), save=True)
+        return data_file
+
+    def _selected(self, name):
+        return not self.case_filter or any(name.startswith(prefix) for prefix in self.case_filter)
+
+    def _clear_cleaned_artifacts(self):
+        """删除已有的清洗结果，使 clean_data 用例每次都真正执行清洗而不是命中缓存"""
+        import shutil
+        from django.conf import settings
+        from .models import CleanedData
+
+        CleanedData.objects.filter(original_file__user=self.user).delete()
+        shutil.rmtree(os.path.join(settings.MEDIA_ROOT, 'cleaned'), ignore_errors=True)
+
+    def run_case(self, name, method, path, payload):
+        """执行单个用例 repeat 次，返回耗时最短的一次的测量结果"""
+        best = None
+        for _ in range(self.repeat):
+            if name.startswith('clean_data.') and not name.endswith('.cached'):
+                self._clear_cleaned_artifacts()
+            with PeakRSSSampler() as sampler:
+                start = time.perf_counter()
+                if method == 'get':
+                    response = self.client.get(path)
+                else:
+                    response = self.client.post(path, payload, format='json')
+                wall_time = time.perf_counter() - start
+
+            measurement = {
+                'status': response.status_code,
+                'wall_time_s': round(wall_time, 6),
+                'peak_rss_bytes': sampler.peak_rss,
+                'rss_delta_bytes': sampler.peak_rss - sampler.start_rss,
+                'response_bytes': len(response.content),
+            }
+            if best is None or measurement['wall_time_s'] < best['wall_time_s']:
+                best = measurement
+        return best
+
+    def run(self, sizes):
+        """对每个 (行数, 列数) 组合运行所有被选中的用例，返回结果列表"""
+        results = []
+        for n_rows, n_cols in sizes:
+            self.log(f'准备数据: {n_rows} 行 x {n_cols} 列')
+            path = cached_weather_dataset(self.data_dir, n_rows, n_cols, seed=self.seed)
+            data_file = self._create_data_file(path, n_rows, n_cols)
+            feature_columns, label_columns = weather_columns(n_cols)
+
+            for name, method, path_template, payload in default_cases(feature_columns, label_columns):
+                if not self._selected(name):
+                    continue
+                measurement = self.run_case(
+                    name, method, _fill(path_template, data_file.id), _fill(payload, data_file.id)
+                )
+                record = {'case': name, 'rows': n_rows, 'cols': n_cols, **measurement}
+                results.append(record)
+                self.log(
+                    f"  {name:<36} {record['status']}  {record['wall_time_s']:>9.3f}s  "
+                    f"rss {record['peak_rss_bytes'] / 2**20:>8.1f}MB  "
+                    f"body {record['response_bytes'] / 2**10:>10.1f}KB"
+                )
+        return results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(results):
+    """把测量结果包装成带环境信息的报告（可直接 json.dump）"""
+    import django
+    import sklearn
+
+    return {
+        'schema': REPORT_SCHEMA_VERSION,
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'git_commit': _git_commit(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'django': django.get_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'sklearn': sklearn.__version__,
+        },
+        'results': results,
+    }
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as f:
+        report = json.load(f)
+    if report.get('schema') != REPORT_SCHEMA_VERSION:
+        raise ValueError(f'不支持的报告版本: {report.get("schema")}')
+    return report
+
+
+def compare_reports(baseline, current, metric='wall_time_s'):
+    """
+    对比两份报告中相同 (case, rows, cols) 的指标。
+
+    返回按 ratio（current / baseline）从大到小排序的列表，ratio > 1 表示变慢/变大。
+    只出现在一份报告中的用例会被忽略。
+    """
+    def key(record):
+        return record['case'], record['rows'], record['cols']
+
+    baseline_index = {key(r): r for r in baseline['results']}
+    rows = []
+    for record in current['results']:
+        old = baseline_index.get(key(record))
+        if old is None or not old.get(metric):
+            continue
+        rows.append({
+            'case': record['case'],
+            'rows': record['rows'],
+            'cols': record['cols'],
+            'baseline': old[metric],
+            'current': record[metric],
+            'ratio': record[metric] / old[metric],
+        })
+    rows.sort(key=lambda r: r['ratio'], reverse=True)
+    return rows
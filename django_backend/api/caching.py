@@ -0,0 +1,141 @@
+"""
+ETag 与条件请求（If-None-Match -> 304）
+
+上传文件、清洗结果文件和分析结果在创建后不再改变，因此：
+- 文件类接口（preview 等）的 ETag 取自文件内容的 SHA-256；
+- 记录类接口（分析结果详情等）的 ETag 取自记录的 (模型, 主键, 创建时间)；
+- 列表类接口的 ETag 取自结果集的 (数量, 最大 ID, 最新创建时间)。
+
+例外是 on_delete=SET_NULL 的外键（AnalysisResult.cleaned_data）：删除被引用的记录会把它置空。
+这类字段的值要加入记录的 ETag，并通过 queryset_etag 的 nullable 参数加入列表的聚合；
+这样的记录也不能使用 IMMUTABLE，每次使用前都要重新验证。
+
+客户端携带 If-None-Match 再次请求时，ETag 匹配则直接返回 304，不再读取文件或序列化数据。
+"""
+import hashlib
+import os
+from functools import lru_cache
+
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+# 内容可能被替换的资源：浏览器可缓存，但每次使用前都要用 ETag 重新验证
+REVALIDATE = {'private': True, 'no_cache': True}
+# 创建后不可修改的资源：一小时内无需重新请求
+IMMUTABLE = {'private': True, 'max_age': 3600, 'immutable': True}
+
+# 计算文件摘要时每次读取的字节数
+_DIGEST_BLOCK_SIZE = 1024 * 1024
+_KNOWN_DIGESTS_SIZE = 1024
+
+_known_digests = {}
+
+
+@lru_cache(maxsize=1024)
+def _file_digest(path, size, mtime_ns):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_DIGEST_BLOCK_SIZE), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def file_digest(path):
+    """
+    文件内容的 SHA-256（十六进制）。
+
+    按 (路径, 大小, 修改时间) 缓存在进程内，文件未变化时只需一次 stat。
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    return _known_digests.get(key) or _file_digest(*key)
+
+
+def remember_digest(path, digest):
+    """记录写入文件时已经算好的摘要（分块上传边接收边计算），之后 file_digest 不用再读一遍文件"""
+    stat = os.stat(path)
+    _known_digests[(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)] = digest
+    while len(_known_digests) > _KNOWN_DIGESTS_SIZE:
+        _known_digests.pop(next(iter(_known_digests)), None)
+
+
+def make_etag(*parts):
+    """由若干部分拼出强 ETag（带引号）"""
+    digest = hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def file_etag(path, *extra):
+    """文件内容 + 额外参数（如输出格式、查询参数）对应的 ETag"""
+    return make_etag('file', file_digest(path), *extra)
+
+
+def record_etag(instance, *extra):
+    """不可变记录的 ETag"""
+    return make_etag(instance._meta.label, instance.pk, instance.created_at.isoformat(), *extra)
+
+
+def queryset_etag(queryset, *extra, nullable=()):
+    """
+    不可变记录组成的结果集的 ETag，只执行一次聚合查询。
+
+    记录创建后不再修改，所以新增或删除记录都会改变 (数量, 最大 ID, 最新创建时间)。
+    nullable 为会被置空（SET_NULL）的外键字段名，置空会改变这些字段的 (非空数量, 最大值)。
+    """
+    aggregates = {'count': Count('pk'), 'max_pk': Max('pk'), 'latest': Max('created_at')}
+    for field in nullable:
+        aggregates[f'{field}_count'] = Count(field)
+        aggregates[f'{field}_max'] = Max(field)
+    summary = queryset.order_by().aggregate(**aggregates)
+    latest = summary.pop('latest')
+    latest = latest.isoformat() if latest else ''
+    nulls = [summary[f'{field}_{part}'] for field in nullable for part in ('count', 'max')]
+    return make_etag(queryset.model._meta.label, summary['count'], summary['max_pk'], latest, *nulls, *extra)
+
+
+def request_variant(request):
+    """查询参数（排序后）作为 ETag 的一部分，不同参数的响应互不混淆"""
+    return '&'.join(f'{key}={value}' for key, value in sorted(request.GET.items()))
+
+
+def _strip_weak(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def etag_matches(request, etag):
+    """
+    If-None-Match 使用弱比较（RFC 9110）：压缩中间件会把强 ETag 改为 W/ 前缀的弱 ETag，
+    客户端回传的弱 ETag 同样视为匹配。
+    """
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or _strip_weak(etag) in {_strip_weak(tag) for tag in etags}
+
+
+def _finalize(response, etag, cache_control):
+    response['ETag'] = etag
+    patch_cache_control(response, **cache_control)
+    # 响应内容取决于登录用户
+    patch_vary_headers(response, ('Authorization', 'Cookie'))
+    return response
+
+
+def conditional_response(request, etag, build_response, cache_control=REVALIDATE):
+    """
+    处理条件 GET。
+
+    If-None-Match 与 etag 匹配时返回 304（不调用 build_response）；
+    否则调用 build_response() 生成响应，成功时附加 ETag 和 Cache-Control。
+    """
+    if etag_matches(request, etag):
+        return _finalize(Response(status=status.HTTP_304_NOT_MODIFIED), etag, cache_control)
+
+    response = build_response()
+    if response.status_code == status.HTTP_200_OK:
+        _finalize(response, etag, cache_control)
+    return response
@@ -0,0 +1,281 @@
+"""
+离群值检测与处理（clean_data 的 outliers 方法）
+
+所有数值列组成一个 float64 矩阵，统计量（均值/标准差、四分位数、中位数/MAD）按列一次性
+向量化计算，不再逐列循环。原有的缺失值保持不变：只有被判定为离群值的单元格会被替换。
+
+检测方法（method）和默认阈值（threshold）：
+- zscore：|x - 均值| / 标准差 > threshold，默认 3.0
+- iqr：x < Q1 - threshold * IQR 或 x > Q3 + threshold * IQR，默认 1.5
+- mad：修正 z 分数 0.6745 * |x - 中位数| / MAD > threshold，默认 3.5（Iglewicz-Hoaglin）
+
+离群值的处理（replace）：
+- mean：替换为该列去掉离群值后的均值（默认，与原有行为一致）
+- median：替换为该列去掉离群值后的中位数
+- clip：截断到上下界
+- nan：置为缺失值
+
+列数很多时可以设置 n_jobs，把列分块后用线程池并行计算（NumPy 的排序/归约会释放 GIL）。
+
+清洗结果按内容寻址：cleaning_cache_key 由 (原始文件内容的 SHA-256, 清洗方法, 规范化后的参数)
+计算，相同的清洗请求复用已有的结果文件 cleaned/{key[:2]}/{key}.csv，不同的参数不会写到同一个文件。
+结果文件可以随时由 (原始文件, 清洗方法, 参数) 重新生成，所以磁盘空间不足时可以被回收（restore_cleaned）。
+"""
+import hashlib
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+OUTLIER_METHODS = ('zscore', 'iqr', 'mad')
+REPLACE_STRATEGIES = ('mean', 'median', 'clip', 'nan')
+DEFAULT_THRESHOLDS = {'zscore': 3.0, 'iqr': 1.5, 'mad': 3.5}
+# 正态分布下 MAD 与标准差的换算系数
+_MAD_SCALE = 0.6745
+# 每个并行任务至少处理的列数，列太少时并行没有收益
+MIN_COLUMNS_PER_BLOCK = 64
+# 清洗算法版本，修改清洗结果（而不只是性能）时递增，使旧的缓存结果失效
+# 2：按默认类型的表示（float64、DATE 为整数）清洗，与按类型计划读取之前的结果一致
+CLEANING_VERSION = 2
+
+
+def outlier_jobs(value):
+    """解析 n_jobs 参数：0 或负数表示使用全部 CPU 核，且不超过 CPU 核数"""
+    cpus = os.cpu_count() or 1
+    n_jobs = int(value or 1)
+    return cpus if n_jobs <= 0 else min(n_jobs, cpus)
+
+
+def outlier_bounds(X, method, threshold):
+    """按列计算离群值的上下界，返回 (lower, upper)，均为长度为列数的数组"""
+    if method == 'zscore':
+        center = np.nanmean(X, axis=0)
+        spread = np.nanstd(X, axis=0, ddof=1)
+        return center - threshold * spread, center + threshold * spread
+    if method == 'iqr':
+        q1, q3 = np.nanquantile(X, [0.25, 0.75], axis=0)
+        iqr = q3 - q1
+        return q1 - threshold * iqr, q3 + threshold * iqr
+    if method == 'mad':
+        median = np.nanmedian(X, axis=0)
+        mad = np.nanmedian(np.abs(X - median), axis=0)
+        return median - threshold * mad / _MAD_SCALE, median + threshold * mad / _MAD_SCALE
+    raise ValueError(f'不支持的离群值检测方法: {method}，可选：{", ".join(OUTLIER_METHODS)}')
+
+
+def _replace(X, mask, lower, upper, replace):
+    """替换 X 中 mask 为 True 的单元格（原地修改），原有的 NaN 不受影响"""
+    if replace == 'nan':
+        X[mask] = np.nan
+    elif replace == 'clip':
+        np.clip(X, lower, upper, out=X, where=mask)
+    else:
+        X[mask] = np.nan
+        fill = np.nanmean(X, axis=0) if replace == 'mean' else np.nanmedian(X, axis=0)
+        rows, cols = np.nonzero(mask)
+        X[rows, cols] = fill[cols]
+        # 原本就是 NaN 的单元格 mask 为 False，上面只写回了离群值的位置
+
+
+def _process_block(X, method, threshold, replace):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        lower, upper = outlier_bounds(X, method, threshold)
+        # NaN 与任何数比较都为 False，所以原有的缺失值不会被当成离群值
+        mask = (X < lower) | (X > upper)
+        counts = mask.sum(axis=0)
+        if counts.any():
+            _replace(X, mask, lower, upper, replace)
+    return lower, upper, counts, mask.any(axis=1)
+
+
+def remove_outliers(df, method='zscore', threshold=None, replace='mean', columns=None, n_jobs=1):
+    """
+    对 df 的数值列（或指定的 columns）检测并处理离群值，返回 (新的 DataFrame, 摘要)。
+
+    摘要包含每列的离群值数量和上下界，以及离群值总数、含离群值的行数。
+    """
+    if method not in OUTLIER_METHODS:
+        raise ValueError(f'不支持的离群值检测方法: {method}，可选：{", ".join(OUTLIER_METHODS)}')
+    if replace not in REPLACE_STRATEGIES:
+        raise ValueError(f'不支持的离群值处理方式: {replace}，可选：{", ".join(REPLACE_STRATEGIES)}')
+    threshold = DEFAULT_THRESHOLDS[method] if threshold is None else float(threshold)
+
+    if columns is None:
+        columns = [col for col in df.columns if df[col].dtype.kind in 'iuf']
+    else:
+        missing = [col for col in columns if col not in df.columns]
+        if missing:
+            raise ValueError(f'列不存在: {missing}')
+    columns = list(columns)
+
+    X = df[columns].to_numpy(dtype=np.float64, copy=True)
+    n_blocks = max(1, min(int(n_jobs or 1), math.ceil(len(columns) / MIN_COLUMNS_PER_BLOCK)))
+    if n_blocks == 1:
+        blocks = [_process_block(X, method, threshold, replace)]
+    else:
+        edges = np.linspace(0, len(columns), n_blocks + 1).astype(int)
+        views = [X[:, start:end] for start, end in zip(edges[:-1], edges[1:])]
+        with ThreadPoolExecutor(max_workers=n_blocks) as executor:
+            blocks = list(executor.map(lambda view: _process_block(view, method, threshold, replace), views))
+        # 按块计算时 X 的切片是视图，替换结果已写回 X
+
+    lower = np.concatenate([block[0] for block in blocks])
+    upper = np.concatenate([block[1] for block in blocks])
+    counts = np.concatenate([block[2] for block in blocks])
+    rows_affected = np.logical_or.reduce([block[3] for block in blocks])
+
+    result = df.copy()
+    changed = [i for i, count in enumerate(counts) if count]
+    for i in changed:
+        result[columns[i]] = X[:, i]
+
+    summary = {
+        'method': method,
+        'threshold': threshold,
+        'replace': replace,
+        'total_outliers': int(counts.sum()),
+        'rows_affected': int(rows_affected.sum()),
+        'columns': {
+            str(col): {'outliers': int(counts[i]), 'lower': lower[i], 'upper': upper[i]}
+            for i, col in enumerate(columns)
+        },
+    }
+    return result, summary
+
+
+def normalize_cleaning_parameters(cleaning_method, parameters):
+    """
+    只保留影响清洗结果的参数，并补全默认值、统一类型，
+    使 {} 与 {"strategy": "mean"}、threshold 为 3 与 "3.0" 得到相同的缓存键。
+    n_jobs 等只影响速度的参数不参与计算。
+    """
+    parameters = parameters or {}
+    if cleaning_method == 'missing_values':
+        return {'strategy': parameters.get('strategy', 'mean')}
+    if cleaning_method == 'outliers':
+        method = parameters.get('method', 'zscore')
+        threshold = parameters.get('threshold')
+        columns = parameters.get('columns')
+        return {
+            'method': method,
+            'threshold': float(threshold) if threshold is not None else DEFAULT_THRESHOLDS.get(method),
+            'replace': parameters.get('replace', 'mean'),
+            'columns': list(columns) if columns is not None else None,
+        }
+    if cleaning_method == 'standardization':
+        return {}
+    return dict(parameters)
+
+
+def cleaning_cache_key(source_digest, cleaning_method, parameters):
+    """清洗结果的内容地址（SHA-256 十六进制）"""
+    payload = json.dumps(
+        {
+            'version': CLEANING_VERSION,
+            'source': source_digest,
+            'method': cleaning_method,
+            'parameters': normalize_cleaning_parameters(cleaning_method, parameters),
+        },
+        sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def cleaned_artifact_name(cache_key):
+    """清洗结果文件相对于 MEDIA_ROOT 的路径，按键的前两位分目录"""
+    return f'cleaned/{cache_key[:2]}/{cache_key}.csv'
+
+
+def clean_frame(df, cleaning_method, parameters):
+    """
+    按清洗方法处理数据，返回 (清洗后的数据, 摘要)；未知的清洗方法原样返回。
+    df 可以是按类型计划读取的数据（见 api/loading.py），清洗前先还原为按默认类型读取时的表示
+    （float64、DATE 为 YYYYMMDD 整数），结果与按默认类型读取后清洗完全相同。
+    """
+    from .loading import export_frame
+
+    df = export_frame(df)
+    summary = {}
+    # 缺失值处理
+    # mean：用列的均值填充缺失值。
+    # median：用列的中位数填充缺失值。
+    # mode：用列的众数填充缺失值。
+    # drop：删除包含缺失值的行。
+    if cleaning_method == 'missing_values':
+        strategy = parameters.get('strategy', 'mean')
+        if strategy == 'mean':
+            df = df.fillna(df.mean())
+        elif strategy == 'median':
+            df = df.fillna(df.median())
+        elif strategy == 'mode':
+            df = df.fillna(df.mode().iloc[0])
+        elif strategy == 'drop':
+            df = df.dropna()
+    # 离群值处理，所有数值列一次性向量化计算
+    # method：zscore（默认）、iqr、mad。
+    # threshold：离群值的阈值（默认 zscore 3.0、iqr 1.5、mad 3.5）。
+    # replace：离群值替换为 mean（默认）、median、clip（截断到上下界）或 nan。
+    # columns：只处理这些列，默认所有数值列；n_jobs：按列分块并行的线程数（0 或负数表示 CPU 核数）。
+    # 原有的缺失值保持不变，每列的离群值数量保存在 summary 中。
+    elif cleaning_method == 'outliers':
+        df, summary = remove_outliers(
+            df,
+            method=parameters.get('method', 'zscore'),
+            threshold=parameters.get('threshold'),
+            replace=parameters.get('replace', 'mean'),
+            columns=parameters.get('columns'),
+            n_jobs=outlier_jobs(parameters.get('n_jobs', 1)),
+        )
+    # 标准化处理
+    # 功能：对数值列进行标准化处理，使其均值为 0，标准差为 1。
+    elif cleaning_method == 'standardization':
+        from sklearn.preprocessing import StandardScaler
+
+        scaler = StandardScaler()
+        numeric_cols = df.select_dtypes(include=[np.number]).columns
+        # 按 float64 计算，标准化后的值保持完整精度写回
+        df[numeric_cols] = scaler.fit_transform(df[numeric_cols].astype(np.float64))
+    return df, summary
+
+
+def write_cleaned(df, cache_key):
+    """
+    把清洗结果写入 cleaned/{key[:2]}/{key}.csv，返回 (相对于 MEDIA_ROOT 的路径, 写入的数据)。
+    写入前还原为原始表示（clean_frame 的结果已是原始表示，这里只处理直接传入的按类型计划读取的数据），
+    并保存结果文件的列类型计划。
+    先写入临时文件再改名，并发的相同请求或中途失败都不会留下不完整的结果文件。
+    """
+    import threading
+
+    from django.conf import settings
+
+    from .loading import export_frame, save_plan
+
+    output_path = cleaned_artifact_name(cache_key)
+    output_file_path = os.path.join(settings.MEDIA_ROOT, output_path)
+    os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
+    df = export_frame(df)
+    tmp_path = f'{output_file_path}.{os.getpid()}.{threading.get_ident()}.part'
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, output_file_path)
+    save_plan(output_file_path, df)
+    return output_path, df
+
+
+def restore_cleaned(cleaned_data):
+    """
+    返回清洗结果文件的绝对路径。文件已被存储管理器回收（见 api/storage.py）时，
+    按记录中的清洗方法和参数从原始文件重新生成（结果与第一次清洗相同）。
+    """
+    from .loading import read_frame
+
+    path = cleaned_data.file.path
+    if os.path.exists(path):
+        return path
+    print(f"清洗结果文件已被回收，重新生成: {cleaned_data.file.name}")
+    df = read_frame(cleaned_data.original_file.file.path)
+    df, _ = clean_frame(df, cleaned_data.cleaning_method, cleaned_data.parameters or {})
+    write_cleaned(df, cleaned_data.cache_key)
+    return path
@@ -0,0 +1,59 @@
+"""
+表格数据的列式传输格式
+
+行式（默认）：  {"data": [{"列1": 值, "列2": 值, ...}, ...]}，每一行都重复所有列名。
+列式：          {"data": {"列1": {...}, "列2": {...}}}，每列只出现一次，值是一个数组。
+
+每列的编码：
+- 数值列：{"type": "int64" | "float64" | ..., "values": [...]}
+- 字符串/布尔/其他列（字典编码）：
+      {"type": "dictionary", "dictionary": ["A", "B"], "codes": [0, 1, 0, ...]}
+  codes 是 dictionary 中的下标，空值对应 -1。布尔值按行式格式的约定编码为 "true"/"false"。
+- 含空值的列额外带有 "validity"：按行的有效位图（1 表示有值，字节内低位在前，与 Arrow 一致），
+  base64 编码；数值列中空值位置的 values 为 0。没有空值时不输出 validity。
+
+客户端解码示例见 vue3Project/src/utils/api.js 中的 columnarToRows。
+"""
+import base64
+
+import numpy as np
+import pandas as pd
+
+# 数值列的 dtype kind：布尔单独字典编码，不在这里
+_NUMERIC_KINDS = 'iuf'
+
+
+def validity_bitmap(valid):
+    """把布尔数组（True 表示有值）打包为 base64 位图，低位在前"""
+    return base64.b64encode(np.packbits(valid, bitorder='little').tobytes()).decode('ascii')
+
+
+def encode_column(series):
+    """按列式格式编码一个 Series"""
+    kind = series.dtype.kind
+    valid = series.notna().to_numpy()
+    has_nulls = not valid.all()
+
+    if kind in _NUMERIC_KINDS:
+        values = series.to_numpy()
+        if has_nulls:
+            values = np.where(valid, values, 0)
+        column = {'type': str(series.dtype), 'values': values}
+    else:
+        if kind == 'b':
+            series = series.map({True: 'true', False: 'false'})
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        column = {
+            'type': 'dictionary',
+            'dictionary': [value if isinstance(value, str) else str(value) for value in uniques],
+            'codes': codes.astype(np.int32 if len(uniques) > 32767 else np.int16),
+        }
+
+    if has_nulls:
+        column['validity'] = validity_bitmap(valid)
+    return column
+
+
+def encode_columnar(df):
+    """把 DataFrame 编码为 {列名: 列} 字典，配合 NumpyJSONRenderer 直接输出 NumPy 数组"""
+    return {str(col): encode_column(df[col]) for col in df.columns}
@@ -0,0 +1,47 @@
+"""
+分析引擎注册表
+
+analyze 的每种分析类型（analysis_type）由一个引擎实现（见 base.AnalysisEngine）。
+注册表只保存引擎类的导入路径，第一次请求该分析类型时才导入对应模块：
+sklearn 等重量级依赖只在引擎模块中导入，登录、文件列表等请求不会加载它们。
+
+settings.ANALYSIS_ENGINES（{分析类型: 引擎类的导入路径}）可以新增引擎或替换内置引擎，
+不需要修改视图。
+"""
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+BUILTIN_ENGINES = {
+    'clustering': 'api.engines.clustering.ClusteringEngine',
+    'dimension_reduction': 'api.engines.decomposition.PCAEngine',
+    'regression': 'api.engines.regression.RegressionEngine',
+    'classification': 'api.engines.classification.ClassificationEngine',
+}
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def engine_paths():
+    """分析类型 → 引擎类导入路径（内置引擎 + settings.ANALYSIS_ENGINES）"""
+    return {**BUILTIN_ENGINES, **getattr(settings, 'ANALYSIS_ENGINES', {})}
+
+
+def available_engines():
+    return sorted(engine_paths())
+
+
+def get_engine(analysis_type):
+    """返回分析类型对应的引擎实例（首次使用时导入并缓存），未注册时返回 None"""
+    path = engine_paths().get(analysis_type)
+    if path is None:
+        return None
+    with _engines_lock:
+        engine = _engines.get(path)
+        if engine is None:
+            engine = import_string(path)()
+            engine.name = analysis_type
+            _engines[path] = engine
+        return engine
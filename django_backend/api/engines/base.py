@@ -0,0 +1,114 @@
+"""
+分析引擎的公共接口
+
+一次分析分为三步，由 AnalysisEngine.run 依次调用：
+- prepare：从 AnalysisContext 中取出特征矩阵 / 目标列，划分训练集等；
+- fit：拟合模型（可以用 context.fit_forest 等分批拟合并报告进度）；
+- serialize：把拟合结果整理为保存到 AnalysisResult.result 的字典（NumPy 数组可以直接放入）。
+
+抽样分析时 run 还会调用 intervals 计算指标的 bootstrap 置信区间，并把抽样信息附加到结果中。
+run 记录 fit 的耗时和内存（tracemalloc 统计的新分配内存峰值，有并发的拟合时为 None），保存在结果的 training 中。
+数据读取、特征检测和结果保存由视图统一完成，引擎只负责计算。
+"""
+import time
+
+from ..memory import TracedPeak
+from ..progress import fit_boosting, fit_forest, progress_callback, report_progress
+from ..sampling import sample_report
+from ..timing import mark
+
+
+class AnalysisContext:
+    """一次分析的输入：请求、数据、特征矩阵、目标列、参数和抽样信息"""
+
+    def __init__(self, request, df, X, features, target, parameters, sampling=None, sample_info=None, selection=None):
+        self.request = request
+        self.df = df
+        # 特征矩阵（float64 DataFrame；缺失值和无穷值已用列均值填充，引擎 fills_missing 返回 False 时保留为 NaN）
+        self.X = X
+        self.features = features
+        self.target = target
+        self.parameters = parameters
+        self.sampling = sampling
+        self.sample_info = sample_info
+        # 自动选择特征时的选择信息（方法、得分、选中的列），用户指定了特征时为 None
+        self.selection = selection
+
+    def mark(self, name):
+        mark(self.request, name)
+
+    def progress(self, stage, fraction=None, **detail):
+        report_progress(self.request, stage, fraction, **detail)
+
+    def fit_forest(self, model, X, y, start=0.3, end=0.85):
+        return fit_forest(self.request, model, X, y, start, end)
+
+    def fit_boosting(self, model, X, y, start=0.3, end=0.85):
+        return fit_boosting(self.request, model, X, y, start, end)
+
+
+class AnalysisEngine:
+    """分析引擎基类。子类至少实现 fit 和 serialize"""
+
+    # 分析类型名，注册表导入引擎时设置
+    name = None
+    # 错误信息中使用的名称，例如“聚类分析失败: ...”
+    label = '分析'
+    # 是否需要 parameters.target（回归、分类）
+    requires_target = False
+    # 有监督任务的类型（regression / classification），未指定特征时按该类型选择特征（见 selection.py）
+    task = None
+    # 特征矩阵过大时是否可以分块计算（实现 run_out_of_core）
+    supports_out_of_core = False
+
+    def fills_missing(self, parameters):
+        """特征矩阵是否需要均值填充缺失值；模型能直接处理缺失值时返回 False"""
+        return True
+
+    def prepare(self, context):
+        return {'X': context.X}
+
+    def fit(self, context, prepared):
+        raise NotImplementedError
+
+    def intervals(self, context, prepared, fitted):
+        """抽样分析时指标的 bootstrap 置信区间；返回 None 表示不提供"""
+        return None
+
+    def serialize(self, context, prepared, fitted):
+        raise NotImplementedError
+
+    def run(self, context):
+        prepared = self.prepare(context)
+        started = time.perf_counter()
+        with TracedPeak() as memory:
+            fitted = self.fit(context, prepared)
+        training = {
+            'seconds': round(time.perf_counter() - started, 4),
+            # fit 期间新分配内存的峰值（字节）；与其他拟合同时进行、无法单独统计时为 None
+            'peak_memory_bytes': memory.peak_bytes,
+            'input_bytes': int(context.X.memory_usage(index=False).sum()),
+        }
+        context.mark('fit')
+        intervals = None
+        if context.sample_info:
+            intervals = self.intervals(context, prepared, fitted)
+            context.mark('bootstrap')
+        result = {
+            **self.serialize(context, prepared, fitted),
+            'training': training,
+            **sample_report(context.sample_info, intervals),
+        }
+        context.mark('serialize')
+        return result
+
+    def run_out_of_core(self, request, data_file, file_path, plan, parameters):
+        """分块计算（见 api/outofcore.py），返回分析结果"""
+        raise NotImplementedError
+
+    def out_of_core_hooks(self, request):
+        """分块计算的 stage / progress 回调"""
+        return {
+            'stage': lambda name: mark(request, name),
+            'progress': progress_callback(request, 'fitting', 0.05, 0.85),
+        }
@@ -0,0 +1,76 @@
+"""
+直方图梯度提升（algorithm=hist_gradient_boosting），回归和分类引擎共用
+
+- 特征先分箱（max_bins 个桶）再按直方图寻找分裂点，训练代价随行数近似线性增长；
+- 原生支持缺失值（分裂时缺失值整体分到收益更大的一侧），特征矩阵不做均值填充，见 AnalysisEngine.fills_missing；
+- 早停：从训练集中划出 validation_fraction 作为验证集，验证得分连续 n_iter_no_change 轮没有提升时停止；
+- 多线程（OpenMP）训练，线程数由 settings.ANALYSIS_THREADS 限制（0 表示使用全部 CPU 核）。
+
+没有系数和 feature_importances_，特征重要性用测试集上的置换重要性代替。
+"""
+import os
+
+from django.conf import settings
+from sklearn.inspection import permutation_importance
+from threadpoolctl import threadpool_limits
+
+HIST_GRADIENT_BOOSTING = 'hist_gradient_boosting'
+# 计算置换重要性最多使用的测试集行数
+IMPORTANCE_MAX_SAMPLES = 5000
+IMPORTANCE_REPEATS = 5
+
+
+def training_threads():
+    return getattr(settings, 'ANALYSIS_THREADS', 0) or os.cpu_count() or 1
+
+
+def boosting_model(model_class, parameters):
+    """按请求参数创建模型：max_iter、learning_rate、max_leaf_nodes、early_stopping、validation_fraction、n_iter_no_change"""
+    early_stopping = parameters.get('early_stopping', True)
+    if isinstance(early_stopping, str):
+        early_stopping = early_stopping.lower() not in ('false', '0', 'no')
+    return model_class(
+        max_iter=int(parameters.get('max_iter', 200)),
+        learning_rate=float(parameters.get('learning_rate', 0.1)),
+        max_leaf_nodes=int(parameters.get('max_leaf_nodes', 31)),
+        early_stopping=bool(early_stopping),
+        validation_fraction=float(parameters.get('validation_fraction', 0.1)),
+        n_iter_no_change=int(parameters.get('n_iter_no_change', 10)),
+        random_state=42,
+    )
+
+
+def fit_boosting(context, model, X, y):
+    """限制 OpenMP 线程数后拟合（有关联任务时分批拟合并报告进度）"""
+    with threadpool_limits(limits=training_threads(), user_api='openmp'):
+        context.fit_boosting(model, X, y)
+    print(f"梯度提升完成，迭代次数: {model.n_iter_}/{model.max_iter}")
+    return model
+
+
+def boosting_info(model):
+    """迭代次数和早停信息"""
+    validation_scores = getattr(model, 'validation_score_', None)
+    return {
+        'n_iter': int(model.n_iter_),
+        'max_iter': int(model.max_iter),
+        'threads': training_threads(),
+        'early_stopping': bool(model.early_stopping),
+        'stopped_early': bool(model.n_iter_ < model.max_iter),
+        'validation_fraction': model.validation_fraction if model.early_stopping else None,
+        'best_validation_score': (
+            float(validation_scores.max()) if validation_scores is not None and len(validation_scores) else None
+        ),
+    }
+
+
+def boosting_importances(model, X_test, y_test):
+    """测试集上的置换重要性（得分平均下降量），行数较多时只取 IMPORTANCE_MAX_SAMPLES 行"""
+    with threadpool_limits(limits=training_threads(), user_api='openmp'):
+        importances = permutation_importance(
+            model, X_test, y_test,
+            n_repeats=IMPORTANCE_REPEATS,
+            max_samples=min(len(X_test), IMPORTANCE_MAX_SAMPLES),
+            random_state=42,
+        )
+    return importances.importances_mean
@@ -0,0 +1,59 @@
+"""
+分类分析引擎：随机森林分类（默认）或直方图梯度提升分类（algorithm=hist_gradient_boosting，见 boosting.py）
+"""
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.model_selection import train_test_split
+
+from ..sampling import classification_intervals
+from .base import AnalysisEngine
+from .boosting import (
+    HIST_GRADIENT_BOOSTING, boosting_importances, boosting_info, boosting_model, fit_boosting, training_threads,
+)
+from .features import target_column
+
+
+class ClassificationEngine(AnalysisEngine):
+    label = '分类分析'
+    requires_target = True
+    task = 'classification'
+
+    def fills_missing(self, parameters):
+        return parameters.get('algorithm') != HIST_GRADIENT_BOOSTING
+
+    def prepare(self, context):
+        print(f"执行分类分析，目标: {context.target}, 特征数: {len(context.features)}")
+        y = target_column(context.df, context.target)
+        X_train, X_test, y_train, y_test = train_test_split(context.X, y, test_size=0.2, random_state=42)
+        return {'X_train': X_train, 'X_test': X_test, 'y_train': y_train, 'y_test': y_test}
+
+    def fit(self, context, prepared):
+        if context.parameters.get('algorithm') == HIST_GRADIENT_BOOSTING:
+            model = boosting_model(HistGradientBoostingClassifier, context.parameters)
+            fit_boosting(context, model, prepared['X_train'], prepared['y_train'])
+            return {
+                'model': model,
+                'y_pred': model.predict(prepared['X_test']),
+                'feature_importance': boosting_importances(model, prepared['X_test'], prepared['y_test']),
+                'boosting': boosting_info(model),
+            }
+        model = RandomForestClassifier(random_state=42, n_jobs=training_threads())
+        context.fit_forest(model, prepared['X_train'], prepared['y_train'])
+        return {'model': model, 'y_pred': model.predict(prepared['X_test']), 'feature_importance': model.feature_importances_}
+
+    def intervals(self, context, prepared, fitted):
+        sampling = context.sampling
+        return classification_intervals(prepared['y_test'], fitted['y_pred'], sampling['n_bootstrap'], sampling['seed'])
+
+    def serialize(self, context, prepared, fitted):
+        accuracy = float(np.mean(np.asarray(prepared['y_test']) == fitted['y_pred']))
+        print("分类分析完成，准确率: ", accuracy)
+        result = {
+            'accuracy': accuracy,
+            'feature_importance': fitted['feature_importance'],
+            'feature_names': context.features,
+            'algorithm': context.parameters.get('algorithm', 'random_forest'),
+        }
+        if 'boosting' in fitted:
+            result['boosting'] = fitted['boosting']
+        return result
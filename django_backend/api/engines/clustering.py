@@ -0,0 +1,46 @@
+"""
+聚类分析引擎：KMeans；特征矩阵过大时改用 MiniBatchKMeans 分块计算（见 api/outofcore.py）
+"""
+import numpy as np
+from sklearn.cluster import KMeans
+
+from ..sampling import clustering_intervals
+from .base import AnalysisEngine
+
+
+class ClusteringEngine(AnalysisEngine):
+    label = '聚类分析'
+    supports_out_of_core = True
+
+    def prepare(self, context):
+        # 从参数中获取聚类数量，默认为3
+        n_clusters = int(context.parameters.get('n_clusters', 3))
+        print(f"执行聚类分析，聚类数: {n_clusters}, 特征数: {len(context.features)}")
+        return {'X': context.X, 'n_clusters': n_clusters}
+
+    def fit(self, context, prepared):
+        # 初始化KMeans对象并进行聚类分析
+        kmeans = KMeans(n_clusters=prepared['n_clusters'], random_state=42)
+        return {'model': kmeans, 'clusters': kmeans.fit_predict(prepared['X'])}
+
+    def intervals(self, context, prepared, fitted):
+        sampling = context.sampling
+        return clustering_intervals(fitted['clusters'], prepared['n_clusters'], sampling['n_bootstrap'], sampling['seed'])
+
+    def serialize(self, context, prepared, fitted):
+        # 构建聚类分析结果字典（NumPy 数组直接交给 JSON 渲染器/编码器，不再转换为列表）
+        print("聚类分析完成")
+        return {
+            'clusters': fitted['clusters'],
+            'centers': fitted['model'].cluster_centers_,
+            'clusterCounts': np.bincount(fitted['clusters'], minlength=prepared['n_clusters']),
+            'feature_names': context.features,
+        }
+
+    def run_out_of_core(self, request, data_file, file_path, plan, parameters):
+        from ..outofcore import run_clustering
+
+        return run_clustering(
+            file_path, data_file, plan['features'], int(parameters.get('n_clusters', 3)),
+            **self.out_of_core_hooks(request),
+        )
@@ -0,0 +1,43 @@
+"""
+降维分析引擎：PCA；特征矩阵过大时改用 IncrementalPCA 分块计算（见 api/outofcore.py）
+"""
+from sklearn.decomposition import PCA
+
+from ..sampling import pca_intervals
+from .base import AnalysisEngine
+
+
+class PCAEngine(AnalysisEngine):
+    label = '降维分析'
+    supports_out_of_core = True
+
+    def prepare(self, context):
+        # 从参数中获取降维后的组件数量，默认为2
+        n_components = int(context.parameters.get('n_components', 2))
+        print(f"执行降维分析，组件数: {n_components}, 特征数: {len(context.features)}")
+        return {'X': context.X, 'n_components': n_components}
+
+    def fit(self, context, prepared):
+        # 初始化PCA对象并进行降维分析
+        pca = PCA(n_components=prepared['n_components'])
+        return {'model': pca, 'components': pca.fit_transform(prepared['X'])}
+
+    def intervals(self, context, prepared, fitted):
+        sampling = context.sampling
+        return pca_intervals(prepared['X'], prepared['n_components'], sampling['n_bootstrap'], sampling['seed'])
+
+    def serialize(self, context, prepared, fitted):
+        print("降维分析完成")
+        return {
+            'components': fitted['components'],
+            'explained_variance_ratio': fitted['model'].explained_variance_ratio_,
+            'feature_names': context.features,
+        }
+
+    def run_out_of_core(self, request, data_file, file_path, plan, parameters):
+        from ..outofcore import run_pca
+
+        return run_pca(
+            file_path, data_file, plan['features'], int(parameters.get('n_components', 2)),
+            **self.out_of_core_hooks(request),
+        )
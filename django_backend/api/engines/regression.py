@@ -0,0 +1,155 @@
+"""
+回归分析引擎：随机森林回归（algorithm=random_forest）、直方图梯度提升（algorithm=hist_gradient_boosting，见 boosting.py）
+或线性回归（默认，linear_type 为 standard / ridge / lasso，可选多项式特征）
+"""
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import Lasso, LinearRegression, Ridge
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import PolynomialFeatures, StandardScaler
+
+from ..sampling import regression_intervals
+from .base import AnalysisEngine
+from .boosting import (
+    HIST_GRADIENT_BOOSTING, boosting_importances, boosting_info, boosting_model, fit_boosting, training_threads,
+)
+from .features import target_column
+from .selection import correlation_scores
+
+# 按与目标的相关性保留的特征数
+MAX_RANKED_FEATURES = 5
+
+
+class RegressionEngine(AnalysisEngine):
+    label = '回归分析'
+    requires_target = True
+    task = 'regression'
+
+    def fills_missing(self, parameters):
+        return parameters.get('algorithm') != HIST_GRADIENT_BOOSTING
+
+    def prepare(self, context):
+        print(f"执行回归分析，目标: {context.target}, 特征数: {len(context.features)}")
+        X = context.X
+        y = target_column(context.df, context.target, numeric=True)
+
+        # 用户指定的特征超过 MAX_RANKED_FEATURES 个时，只保留与目标相关性最高的几个
+        # （未指定特征时已在特征选择阶段按 top_k 选好，不再裁剪）
+        if context.selection is None and len(context.features) > MAX_RANKED_FEATURES:
+            # 梯度提升的特征矩阵保留了缺失值，排序时按列均值填充
+            scores = correlation_scores(X.fillna(X.mean()).to_numpy(), y.to_numpy())
+            sorted_features = [context.features[i] for i in np.argsort(-scores, kind='stable')]
+            print(f"特征按相关性排序: {sorted_features}")
+            X = X[sorted_features[:MAX_RANKED_FEATURES]]
+            print(f"使用相关性最高的{MAX_RANKED_FEATURES}个特征: {X.columns.tolist()}")
+
+        # 分割训练集和测试集
+        test_size = float(context.parameters.get('test_size', 0.2))
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=42)
+        return {
+            'feature_names': X.columns.tolist(),
+            'X_train': X_train, 'X_test': X_test, 'y_train': y_train, 'y_test': y_test,
+        }
+
+    def fit(self, context, prepared):
+        # 根据算法选择模型
+        algorithm = context.parameters.get('algorithm', 'linear')
+        if algorithm == 'random_forest':
+            return self._fit_forest(context, prepared)
+        if algorithm == HIST_GRADIENT_BOOSTING:
+            return self._fit_boosting(context, prepared)
+        return self._fit_linear(context, prepared)
+
+    def _fit_forest(self, context, prepared):
+        model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=training_threads())
+        # 训练模型（分批增加树并报告进度）
+        context.fit_forest(model, prepared['X_train'], prepared['y_train'])
+        print(f"随机森林回归分析完成")
+        return {
+            'y_pred': model.predict(prepared['X_test']),
+            # 随机森林没有系数和截距，用特征重要性代替系数
+            'coefficients': model.feature_importances_,
+            'intercept': 0.0,
+            'extra_info': {'scaled': False},
+        }
+
+    def _fit_boosting(self, context, prepared):
+        model = boosting_model(HistGradientBoostingRegressor, context.parameters)
+        fit_boosting(context, model, prepared['X_train'], prepared['y_train'])
+        return {
+            'y_pred': model.predict(prepared['X_test']),
+            # 梯度提升没有系数和截距，用置换重要性代替系数
+            'coefficients': boosting_importances(model, prepared['X_test'], prepared['y_test']),
+            'intercept': 0.0,
+            'extra_info': {'scaled': False, 'boosting': boosting_info(model)},
+        }
+
+    def _fit_linear(self, context, prepared):
+        parameters = context.parameters
+        # 应用特征缩放，对线性模型很重要
+        scaler = StandardScaler()
+        X_train = scaler.fit_transform(prepared['X_train'])
+        X_test = scaler.transform(prepared['X_test'])
+
+        # 检查是否应用多项式特征
+        use_poly = parameters.get('use_polynomial', False)
+        poly_degree = int(parameters.get('polynomial_degree', 2))
+        if use_poly:
+            poly = PolynomialFeatures(degree=poly_degree, include_bias=False)
+            X_train = poly.fit_transform(X_train)
+            X_test = poly.transform(X_test)
+            print(f"应用多项式特征，阶数: {poly_degree}")
+
+        # 选择适当的线性回归变体
+        linear_type = parameters.get('linear_type', 'standard')
+        if linear_type == 'ridge':
+            alpha = float(parameters.get('alpha', 1.0))
+            model = Ridge(alpha=alpha)
+            print(f"使用岭回归，alpha={alpha}")
+        elif linear_type == 'lasso':
+            alpha = float(parameters.get('alpha', 0.1))
+            model = Lasso(alpha=alpha)
+            print(f"使用Lasso回归，alpha={alpha}")
+        else:
+            model = LinearRegression()
+            print("使用标准线性回归")
+
+        model.fit(X_train, prepared['y_train'])
+
+        extra_info = {'scaled': True, 'linear_type': linear_type}
+        if use_poly:
+            extra_info['polynomial'] = {'applied': True, 'degree': poly_degree}
+        print(f"线性回归分析完成")
+        return {
+            'y_pred': model.predict(X_test),
+            'coefficients': model.coef_ if model.coef_.ndim == 1 else model.coef_[0],
+            'intercept': float(model.intercept_),
+            'extra_info': extra_info,
+        }
+
+    def intervals(self, context, prepared, fitted):
+        sampling = context.sampling
+        return regression_intervals(prepared['y_test'], fitted['y_pred'], sampling['n_bootstrap'], sampling['seed'])
+
+    def serialize(self, context, prepared, fitted):
+        y_test, y_pred = prepared['y_test'], fitted['y_pred']
+        # 计算通用的评估指标
+        r2 = r2_score(y_test, y_pred)
+        mae = mean_absolute_error(y_test, y_pred)
+        mse = mean_squared_error(y_test, y_pred)
+        print(f"分析指标 - R²: {r2:.4f}, MAE: {mae:.4f}, MSE: {mse:.4f}")
+        return {
+            'coefficients': fitted['coefficients'],
+            'intercept': fitted['intercept'],
+            'feature_names': prepared['feature_names'],
+            'target': context.target,
+            # 为了前端可视化，生成预测值与实际值比较
+            'predictions': [
+                {'actual': actual, 'predicted': predicted}
+                for actual, predicted in zip(np.asarray(y_test)[:20], y_pred[:20])
+            ],
+            'metrics': {'r2': float(r2), 'mae': float(mae), 'mse': float(mse)},
+            'algorithm': context.parameters.get('algorithm', 'linear'),
+            'extra_info': fitted['extra_info'],
+        }
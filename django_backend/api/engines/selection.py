@@ -0,0 +1,196 @@
+"""
+回归 / 分类的特征选择
+
+未指定特征时，对数据中的所有数值列（不含 DATE、MONTH 和目标列）打分，选出得分最高的 top_k 列：
+- 方差过滤：方差不超过 min_variance（默认 0，即常数列）或全为缺失值的列不参与打分；
+- correlation：与目标的皮尔逊相关系数的绝对值，整个特征矩阵一次矩阵运算得到所有列的得分；
+- mutual_info：互信息（sklearn.feature_selection），能发现非线性关系，
+  按 settings.FEATURE_SELECTION_JOBS（默认 CPU 核数）个进程并行计算各列。
+
+回归默认使用 correlation，分类默认使用 mutual_info（分类目标的相关系数按类别编码计算，只对二分类有意义）。
+得分按 (数据来源, 目标列, 方法, min_variance) 缓存在进程内和 MEDIA_ROOT/cache/features/{key}.json 中，
+数据来源由文件内容的 SHA-256（以及连接文件、抽样参数）确定；修改 top_k 不需要重新打分。
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from ..loading import export_frame
+from ..storage import record_access
+from .features import EXCLUDED_COLUMNS
+
+SELECTION_METHODS = ('correlation', 'mutual_info')
+DEFAULT_TOP_K = 5
+# 结果中返回得分的列数（按得分从高到低）
+RANKING_SIZE = 20
+SCORES_MEMORY_CACHE_SIZE = 64
+# 得分计算方式变化时递增，使旧的缓存失效
+SELECTION_VERSION = 1
+
+_scores_cache = OrderedDict()
+_scores_lock = threading.Lock()
+
+
+def selection_options(parameters, task):
+    """
+    解析特征选择参数：selection_method（correlation / mutual_info）、top_k、min_variance。
+    参数不合法时抛出 ValueError。
+    """
+    method = parameters.get('selection_method') or ('mutual_info' if task == 'classification' else 'correlation')
+    if method not in SELECTION_METHODS:
+        raise ValueError(f'不支持的特征选择方法: {method}，可选：{", ".join(SELECTION_METHODS)}')
+    top_k = int(parameters.get('top_k', DEFAULT_TOP_K))
+    if top_k < 1:
+        raise ValueError('top_k 必须是正整数')
+    min_variance = float(parameters.get('min_variance', 0.0))
+    return {'method': method, 'top_k': top_k, 'min_variance': min_variance}
+
+
+def candidate_columns(df, target):
+    """参与打分的列：数值列和布尔列，不含 DATE、MONTH、目标列以及由目标列派生的列"""
+    return [
+        col for col in df.columns
+        if df[col].dtype.kind in 'biuf' and col not in EXCLUDED_COLUMNS
+        and col != target and not str(col).startswith(f'{target}_')
+    ]
+
+
+def candidate_matrix(df, columns):
+    """候选列的 float64 矩阵（还原为文件中的原始数值），缺失值用列均值填充；全为缺失值的列保持 NaN"""
+    X = export_frame(df[columns]).to_numpy(dtype=np.float64, copy=True)
+    X[~np.isfinite(X)] = np.nan
+    means = np.nanmean(X, axis=0) if len(X) else np.full(len(columns), np.nan)
+    missing = np.isnan(X)
+    if missing.any():
+        X[missing] = np.take(means, np.nonzero(missing)[1])
+    return X
+
+
+def target_vector(y, task):
+    """目标列转换为数值：分类目标按类别编码，回归目标转换为 float64"""
+    if task == 'classification':
+        codes, _ = pd.factorize(export_frame(y.to_frame())[y.name])
+        # 缺失的类别编码为 -1，当作缺失值不参与打分
+        return np.where(codes >= 0, codes, np.nan), codes
+    return export_frame(y.to_frame())[y.name].to_numpy(dtype=np.float64), None
+
+
+def correlation_scores(X, y):
+    """各列与 y 的皮尔逊相关系数的绝对值（一次矩阵运算），方差为 0 的列得分为 0"""
+    Xc = X - X.mean(axis=0)
+    yc = y - y.mean()
+    denominator = np.sqrt(np.einsum('ij,ij->j', Xc, Xc) * yc.dot(yc))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = np.abs(Xc.T.dot(yc) / denominator)
+    return np.nan_to_num(scores)
+
+
+def mutual_info_scores(X, y, labels=None, seed=42):
+    """各列与目标的互信息；labels 不为 None 时为分类目标"""
+    from sklearn.feature_selection import mutual_info_classif, mutual_info_regression
+
+    n_jobs = getattr(settings, 'FEATURE_SELECTION_JOBS', None) or os.cpu_count() or 1
+    if labels is not None:
+        return mutual_info_classif(X, labels, random_state=seed, n_jobs=n_jobs)
+    return mutual_info_regression(X, y, random_state=seed, n_jobs=n_jobs)
+
+
+def _cache_path(key):
+    return os.path.join(settings.MEDIA_ROOT, 'cache', 'features', f'{key}.json')
+
+
+def scores_cache_key(source, target, method, min_variance):
+    raw = json.dumps([SELECTION_VERSION, source, target, method, min_variance], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def compute_scores(df, target, task, method, min_variance=0.0):
+    """对所有候选列打分，返回 {'scores': {列: 得分}, 'low_variance': [被过滤的列]}"""
+    columns = candidate_columns(df, target)
+    X = candidate_matrix(df, columns)
+    variances = np.var(X, axis=0) if len(X) else np.zeros(len(columns))
+    keep = np.isfinite(variances) & (variances > min_variance)
+    kept = [col for col, ok in zip(columns, keep) if ok]
+    X = X[:, keep]
+
+    y, labels = target_vector(df[target], task)
+    finite = np.isfinite(y)
+    if not finite.all():
+        X, y = X[finite], y[finite]
+        labels = labels[finite] if labels is not None else None
+
+    if not kept or len(y) < 2:
+        values = np.zeros(len(kept))
+    elif method == 'mutual_info':
+        values = mutual_info_scores(X, y, labels)
+    else:
+        values = correlation_scores(X, y)
+    return {
+        'scores': {col: float(score) for col, score in zip(kept, values)},
+        'low_variance': [col for col, ok in zip(columns, keep) if not ok],
+    }
+
+
+def feature_scores(df, target, task, method, min_variance=0.0, source=None):
+    """
+    带缓存的 compute_scores，返回 (得分, 来源)。来源为 memory / disk / built；
+    source 为 None（数据来源无法确定）时不使用缓存。
+    """
+    if source is None:
+        return compute_scores(df, target, task, method, min_variance), 'built'
+    key = scores_cache_key(source, target, method, min_variance)
+    with _scores_lock:
+        if key in _scores_cache:
+            _scores_cache.move_to_end(key)
+            return _scores_cache[key], 'memory'
+
+    path = _cache_path(key)
+    origin = 'disk'
+    try:
+        with open(path, encoding='utf-8') as f:
+            scored = json.load(f)
+        record_access(path)
+    except (OSError, ValueError):
+        origin = 'built'
+        scored = compute_scores(df, target, task, method, min_variance)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.part'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(scored, f)
+        os.replace(tmp_path, path)
+
+    with _scores_lock:
+        _scores_cache[key] = scored
+        _scores_cache.move_to_end(key)
+        while len(_scores_cache) > SCORES_MEMORY_CACHE_SIZE:
+            _scores_cache.popitem(last=False)
+    return scored, origin
+
+
+def rank(scores):
+    return sorted(scores, key=lambda col: scores[col], reverse=True)
+
+
+def select_features(df, target, task, options, source=None):
+    """按得分选出 top_k 个特征，返回 (特征列表, 选择信息)；没有可用的候选列时特征列表为空"""
+    scored, origin = feature_scores(df, target, task, options['method'], options['min_variance'], source)
+    scores = scored['scores']
+    ranking = rank(scores)
+    selected = ranking[:options['top_k']]
+    info = {
+        'method': options['method'],
+        'top_k': options['top_k'],
+        'candidates': len(scores) + len(scored['low_variance']),
+        'low_variance': scored['low_variance'],
+        'selected': selected,
+        'scores': {col: scores[col] for col in ranking[:max(RANKING_SIZE, len(selected))]},
+        'cache': origin,
+    }
+    print(f"特征选择（{options['method']}，{info['candidates']} 个候选列，缓存: {origin}）: {selected}")
+    return selected, info
@@ -0,0 +1,179 @@
+"""
+数据文件的格式：CSV、gzip / zstd 压缩的 CSV、Parquet、Arrow IPC
+
+格式由文件开头的魔数判断，不看扩展名，也不信任客户端提交的 file_type（上传后 DataFile.file_type 记录检测到的格式）：
+
+- csv.gz（1f 8b）、csv.zst（28 b5 2f fd）：由 pandas 边读边解压（流式，不写临时文件），
+  分块读取时内存只与块大小有关；zstd 需要安装 zstandard 包；
+- parquet（PAR1）：按列读取（列投影），只读需要的列；分块读取时按批次读取；
+- arrow（ARROW1 文件格式，或以 ff ff ff ff 开头的流格式）：文件格式通过内存映射读取，选出的列零拷贝，
+  没选到的列不会从磁盘读入；
+- 其他都按 CSV 读取。
+
+Parquet / Arrow 需要安装 pyarrow。读取结果与按默认类型读取 CSV 一致（整数列有缺失值时为浮点列），
+日期类型的列读为 datetime64；类型计划和分布摘要等都基于这里读出的 DataFrame（见 api/loading.py）。
+"""
+import os
+from functools import lru_cache
+
+import pandas as pd
+
+CSV = 'csv'
+CSV_GZIP = 'csv.gz'
+CSV_ZSTD = 'csv.zst'
+PARQUET = 'parquet'
+ARROW = 'arrow'
+COLUMNAR_FORMATS = (PARQUET, ARROW)
+
+# 魔数 → 格式（按顺序匹配）
+MAGIC_NUMBERS = (
+    (b'\x1f\x8b', CSV_GZIP),
+    (b'\x28\xb5\x2f\xfd', CSV_ZSTD),
+    (b'PAR1', PARQUET),
+    (b'ARROW1', ARROW),
+    # Arrow IPC 流格式：每条消息以 0xFFFFFFFF 续接标记开头
+    (b'\xff\xff\xff\xff', ARROW),
+)
+MAGIC_BYTES = max(len(magic) for magic, _ in MAGIC_NUMBERS)
+# 压缩 CSV 对应 pandas read_csv 的 compression 参数
+CSV_COMPRESSION = {CSV: None, CSV_GZIP: 'gzip', CSV_ZSTD: 'zstd'}
+# 批量上传的压缩包中接受的文件扩展名
+EXTENSIONS = ('.csv', '.csv.gz', '.csv.zst', '.parquet', '.arrow', '.feather', '.ipc')
+
+
+class UnsupportedFormat(ValueError):
+    """缺少读取该格式需要的可选依赖"""
+
+
+def detect_bytes(head):
+    """由文件开头的若干字节判断格式"""
+    for magic, name in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return name
+    return CSV
+
+
+@lru_cache(maxsize=1024)
+def _detect(path, size, mtime_ns):
+    with open(path, 'rb') as f:
+        return detect_bytes(f.read(MAGIC_BYTES))
+
+
+def detect_format(path):
+    """文件的格式，按 (路径, 大小, 修改时间) 缓存"""
+    stat = os.stat(path)
+    return _detect(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:  # pyarrow 是可选依赖
+        raise UnsupportedFormat('读取 Parquet / Arrow 文件需要安装 pyarrow')
+    return pyarrow
+
+
+def _to_pandas(table):
+    # 日期读为 datetime64（默认是 datetime.date 对象），与 CSV 的 DATE 列解析后的类型一致
+    return table.to_pandas(date_as_object=False)
+
+
+def _missing_columns(names, usecols):
+    missing = [col for col in usecols or [] if col not in names]
+    if missing:
+        raise ValueError(f'列不存在: {missing}')
+
+
+def _arrow_table(path, usecols=None):
+    pa = _pyarrow()
+    # 读出的表引用映射的内存，映射在表不再使用后随之释放
+    source = pa.memory_map(path, 'r')
+    head = source.read(MAGIC_BYTES)
+    source.seek(0)
+    reader = pa.ipc.open_file(source) if head.startswith(b'ARROW1') else pa.ipc.open_stream(source)
+    table = reader.read_all()
+    _missing_columns(table.column_names, usecols)
+    return table.select(usecols) if usecols is not None else table
+
+
+def _parquet_batches(path, batch_size, usecols=None):
+    pa = _pyarrow()
+    parquet = pa.parquet.ParquetFile(path)
+    _missing_columns(parquet.schema_arrow.names, usecols)
+    return parquet.iter_batches(batch_size=batch_size, columns=usecols)
+
+
+def _csv_options(path):
+    name = detect_format(path)
+    if name == CSV_ZSTD:
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:  # zstandard 是可选依赖
+            raise UnsupportedFormat('读取 zstd 压缩的 CSV 需要安装 zstandard')
+    return {'compression': CSV_COMPRESSION[name]}
+
+
+def read_table(path, usecols=None, nrows=None, dtype=None):
+    """读取为 DataFrame（参数与 pd.read_csv 的同名参数相同，不指定 dtype 时按默认类型；列式文件只读取 usecols 中的列）"""
+    name = detect_format(path)
+    if name == PARQUET:
+        pa = _pyarrow()
+        frames = []
+        if nrows is not None:
+            # 只读取前面几个批次
+            for batch in _parquet_batches(path, max(nrows, 1), usecols):
+                frames.append(_to_pandas(batch))
+                if sum(len(frame) for frame in frames) >= nrows:
+                    break
+        if frames:
+            df = pd.concat(frames, ignore_index=True).iloc[:nrows]
+        else:
+            _missing_columns(pa.parquet.read_schema(path).names, usecols)
+            df = _to_pandas(pa.parquet.read_table(path, columns=usecols))
+    elif name == ARROW:
+        table = _arrow_table(path, usecols)
+        df = _to_pandas(table.slice(0, nrows) if nrows is not None else table)
+    else:
+        return pd.read_csv(path, usecols=usecols, nrows=nrows, dtype=dtype, **_csv_options(path))
+    return df.astype(dtype) if dtype else df
+
+
+def iter_tables(path, chunksize, usecols=None, dtype=None):
+    """分块读取，每块最多 chunksize 行（参数同 read_table）"""
+    name = detect_format(path)
+    if name == PARQUET:
+        batches = _parquet_batches(path, chunksize, usecols)
+    elif name == ARROW:
+        batches = _arrow_table(path, usecols).to_batches(max_chunksize=chunksize)
+    else:
+        yield from pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=chunksize, **_csv_options(path))
+        return
+    for batch in batches:
+        chunk = _to_pandas(batch)
+        yield chunk.astype(dtype) if dtype else chunk
+
+
+def read_columns(path):
+    """列名（不读取数据）"""
+    name = detect_format(path)
+    if name == PARQUET:
+        return list(_pyarrow().parquet.read_schema(path).names)
+    if name == ARROW:
+        return _arrow_table(path).column_names
+    return pd.read_csv(path, nrows=0, **_csv_options(path)).columns.tolist()
+
+
+def row_count(path):
+    """数据行数：列式文件读取元数据，压缩的 CSV 边解压边数行（不写临时文件），普通 CSV 返回 None（由调用方估算）"""
+    name = detect_format(path)
+    if name == PARQUET:
+        return _pyarrow().parquet.ParquetFile(path).metadata.num_rows
+    if name == ARROW:
+        return _arrow_table(path).num_rows
+    if name == CSV:
+        return None
+    return sum(len(chunk) for chunk in pd.read_csv(
+        path, usecols=[0], chunksize=100000, **_csv_options(path),
+    ))
@@ -0,0 +1,184 @@
+"""
+批量上传与导入（POST /api/datafiles/bulk_upload/）
+
+一次请求上传多个数据文件（表单字段 files，可重复），或者一个 zip 压缩包（字段 archive），
+也可以同时提供。文件可以是 CSV、gzip / zstd 压缩的 CSV、Parquet 或 Arrow IPC（见 api/formats.py）。
+每个文件在有界线程池中并行处理：
+
+1. 保存到存储（与单文件上传相同的 uploads/{uuid}.{扩展名}）；
+2. 按文件内容检测格式，解析并校验（能解析、至少有一列一行）；
+3. 生成概况（行数、列数、数值列、缺失值数量）和各数值列的分布摘要。
+
+全部处理完后，在一个事务中批量创建成功文件的 DataFile 记录和分布摘要；
+失败的文件不创建记录，已保存的文件会被删除。响应中给出每个文件的状态和整体吞吐量。
+"""
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .formats import EXTENSIONS, detect_format, read_table
+from .loading import save_plan
+from .models import DataFile, DistributionSketch, get_file_path
+from .sketches import build_sketches, sketch_rows
+
+# 默认线程数上限；实际线程数还受 CPU 核数和文件数限制
+DEFAULT_WORKERS = 4
+# 单次请求最多的文件数（与 Django 的 DATA_UPLOAD_MAX_NUMBER_FILES 默认值一致）
+MAX_FILES = 100
+# 压缩包解压后的总大小上限，防止压缩炸弹
+DEFAULT_MAX_ARCHIVE_BYTES = 1024 * 1024 * 1024
+
+
+class BulkUploadError(ValueError):
+    """整个请求不合法（没有文件、文件过多、压缩包损坏等）"""
+
+
+class _Upload:
+    """待导入的一个文件：名称、大小和打开方式"""
+
+    def __init__(self, name, size, open_file):
+        self.name = name
+        self.size = size
+        self.open = open_file
+
+
+def worker_count(n_files):
+    limit = getattr(settings, 'BULK_UPLOAD_WORKERS', DEFAULT_WORKERS)
+    return max(1, min(limit, os.cpu_count() or 1, n_files))
+
+
+def collect_uploads(files, archive=None):
+    """把上传的文件和压缩包中的数据文件（扩展名见 formats.EXTENSIONS）整理为 _Upload 列表"""
+    uploads = [_Upload(f.name, f.size, lambda f=f: f) for f in files]
+
+    if archive is not None:
+        try:
+            zf = zipfile.ZipFile(archive)
+        except zipfile.BadZipFile:
+            raise BulkUploadError(f'{archive.name} 不是有效的 zip 压缩包')
+        members = [
+            info for info in zf.infolist()
+            if not info.is_dir()
+            and not os.path.basename(info.filename).startswith('.')
+            and not info.filename.startswith('__MACOSX/')
+            and info.filename.lower().endswith(EXTENSIONS)
+        ]
+        limit = getattr(settings, 'BULK_UPLOAD_MAX_ARCHIVE_BYTES', DEFAULT_MAX_ARCHIVE_BYTES)
+        if sum(info.file_size for info in members) > limit:
+            raise BulkUploadError(f'压缩包解压后超过 {limit} 字节')
+        uploads += [
+            _Upload(os.path.basename(info.filename), info.file_size, lambda info=info: zf.open(info))
+            for info in members
+        ]
+
+    if not uploads:
+        raise BulkUploadError('没有上传文件：请使用 files 字段上传数据文件，或使用 archive 字段上传 zip 压缩包')
+    if len(uploads) > MAX_FILES:
+        raise BulkUploadError(f'单次最多上传 {MAX_FILES} 个文件')
+    return uploads
+
+
+def profile_frame(df):
+    """文件概况：行数、列数、数值列和缺失值数量"""
+    return {
+        'rows': len(df),
+        'columns': len(df.columns),
+        'numeric_columns': int(sum(df[col].dtype.kind in 'iuf' for col in df.columns)),
+        'missing_values': int(df.isna().sum().sum()),
+        'column_names': [str(col) for col in df.columns],
+    }
+
+
+def _ingest(upload):
+    """在工作线程中保存、解析并分析一个文件，返回处理结果（不访问数据库）"""
+    start = time.perf_counter()
+    result = {'name': upload.name, 'bytes': upload.size}
+    stored = None
+    try:
+        handle = upload.open()
+        if hasattr(handle, 'seek'):
+            handle.seek(0)
+        stored = default_storage.save(get_file_path(None, upload.name), File(handle, name=upload.name))
+        path = default_storage.path(stored)
+        df = read_table(path)
+        if df.empty or len(df.columns) == 0:
+            raise ValueError('文件中没有数据')
+        save_plan(path, df)
+        result.update({
+            'status': 'created',
+            'stored': stored,
+            'format': detect_format(path),
+            'profile': profile_frame(df),
+            'sketches': build_sketches(df),
+        })
+    except Exception as e:
+        if stored:
+            default_storage.delete(stored)
+        result.update({'status': 'error', 'error': str(e)})
+    result['seconds'] = round(time.perf_counter() - start, 6)
+    return result
+
+
+def bulk_ingest(user, uploads, description=''):
+    """
+    并行处理所有文件并在一个事务中创建记录。
+
+    返回 (每个文件的结果列表, 汇总)。结果中成功的文件带有 id 和 profile，失败的带有 error。
+    """
+    start = time.perf_counter()
+    workers = worker_count(len(uploads))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_ingest, uploads))
+    ingest_seconds = time.perf_counter() - start
+
+    succeeded = [result for result in results if result['status'] == 'created']
+    try:
+        with transaction.atomic():
+            data_files = DataFile.objects.bulk_create([
+                DataFile(
+                    user=user,
+                    file=result['stored'],
+                    name=result['name'],
+                    description=description,
+                    file_type=result['format'],
+                )
+                for result in succeeded
+            ])
+            sketches = []
+            for data_file, result in zip(data_files, succeeded):
+                sketches += sketch_rows(data_file, result['sketches'])
+            DistributionSketch.objects.bulk_create(sketches)
+    except Exception:
+        # 事务回滚后，已保存的文件不再被任何记录引用
+        for result in succeeded:
+            default_storage.delete(result['stored'])
+        raise
+
+    for data_file, result in zip(data_files, succeeded):
+        result['id'] = data_file.id
+    files = [
+        {key: value for key, value in result.items() if key not in ('stored', 'sketches')}
+        for result in results
+    ]
+
+    elapsed = time.perf_counter() - start
+    total_bytes = sum(result['bytes'] for result in results)
+    total_rows = sum(result['profile']['rows'] for result in succeeded)
+    summary = {
+        'created': len(succeeded),
+        'failed': len(results) - len(succeeded),
+        'workers': workers,
+        'total_bytes': total_bytes,
+        'total_rows': total_rows,
+        'ingest_seconds': round(ingest_seconds, 6),
+        'elapsed_seconds': round(elapsed, 6),
+        'bytes_per_second': total_bytes / elapsed if elapsed else None,
+        'rows_per_second': total_rows / elapsed if elapsed else None,
+    }
+    return files, summary
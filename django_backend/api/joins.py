@@ -0,0 +1,146 @@
+"""
+按键列（默认 DATE）连接两个数据文件
+
+特征和标签经常分在两个文件中（weather_prediction_dataset.csv 与
+weather_prediction_bbq_labels.csv）。analyze 和 preview 可以指定一个连接文件，
+在键列上与主文件连接后再处理，不必先离线合并再重新上传。
+
+连接索引（主文件行号数组 + 连接文件行号数组）只依赖两个文件的键列，
+按 (主文件内容哈希, 连接文件内容哈希, 键列, 连接方式) 缓存：
+- 进程内保留最近使用的 INDEX_MEMORY_CACHE_SIZE 个；
+- 同时写入 MEDIA_ROOT/cache/joins/{key}.npz，进程重启或其他进程也可以复用。
+对同一对文件重复分析时不再读取键列和重新计算连接。
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .caching import file_digest
+from .formats import read_table
+from .loading import export_frame, read_frame
+from .storage import record_access
+
+DEFAULT_JOIN_KEY = 'DATE'
+JOIN_TYPES = ('inner', 'left')
+# 连接文件中与主文件同名的列加上的后缀
+RIGHT_SUFFIX = '_right'
+# 连接索引格式版本，修改索引结构时递增
+JOIN_INDEX_VERSION = 1
+INDEX_MEMORY_CACHE_SIZE = 32
+
+_index_cache = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def join_options(key=None, how=None):
+    """校验连接参数，返回 (键列, 连接方式)；不合法时抛出 ValueError"""
+    key = key or DEFAULT_JOIN_KEY
+    how = how or 'inner'
+    if how not in JOIN_TYPES:
+        raise ValueError(f'不支持的连接方式: {how}，可选：{", ".join(JOIN_TYPES)}')
+    return key, how
+
+
+def join_cache_key(left_path, right_path, key, how):
+    parts = (JOIN_INDEX_VERSION, file_digest(left_path), file_digest(right_path), key, how)
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def _cache_path(cache_key):
+    return os.path.join(settings.MEDIA_ROOT, 'cache', 'joins', f'{cache_key}.npz')
+
+
+def build_join_index(left_keys, right_keys, how='inner'):
+    """
+    哈希连接两组键，返回 (主文件行号, 连接文件行号)。
+
+    结果保持主文件的行顺序；left 连接时没有匹配的行在连接文件行号中为 -1。
+    键不唯一时按多对多展开，与 pandas.merge 一致。
+    """
+    left = pd.DataFrame({'key': left_keys, 'left': np.arange(len(left_keys))})
+    right = pd.DataFrame({'key': right_keys, 'right': np.arange(len(right_keys))})
+    merged = left.merge(right, on='key', how=how, sort=False)
+    return (
+        merged['left'].to_numpy(dtype=np.int64),
+        merged['right'].fillna(-1).to_numpy(dtype=np.int64),
+    )
+
+
+def _read_keys(path, key):
+    try:
+        # 列式文件的 DATE 读为日期，统一还原为 YYYYMMDD 整数，不同格式的文件也能按日期连接
+        return export_frame(read_table(path, usecols=[key]))[key].to_numpy()
+    except ValueError:
+        raise ValueError(f'连接列 {key} 不存在于文件 {os.path.basename(path)} 中')
+
+
+def join_index(left_path, right_path, key=DEFAULT_JOIN_KEY, how='inner'):
+    """
+    获取连接索引，返回 (主文件行号, 连接文件行号, 来源)。
+    来源为 memory（进程内缓存）、disk（缓存文件）或 built（新计算）。
+    """
+    cache_key = join_cache_key(left_path, right_path, key, how)
+    with _index_lock:
+        if cache_key in _index_cache:
+            _index_cache.move_to_end(cache_key)
+            left_rows, right_rows = _index_cache[cache_key]
+            return left_rows, right_rows, 'memory'
+
+    path = _cache_path(cache_key)
+    source = 'disk'
+    try:
+        with np.load(path) as saved:
+            left_rows, right_rows = saved['left'], saved['right']
+        record_access(path)
+    except (OSError, KeyError, ValueError):
+        source = 'built'
+        left_rows, right_rows = build_join_index(_read_keys(left_path, key), _read_keys(right_path, key), how)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.part'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, left=left_rows, right=right_rows)
+        os.replace(tmp_path, path)
+
+    with _index_lock:
+        _index_cache[cache_key] = (left_rows, right_rows)
+        _index_cache.move_to_end(cache_key)
+        while len(_index_cache) > INDEX_MEMORY_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return left_rows, right_rows, source
+
+
+def join_frames(left, right, left_rows, right_rows, key=DEFAULT_JOIN_KEY):
+    """按连接索引拼接两个 DataFrame；连接文件的键列去掉，同名列加 RIGHT_SUFFIX 后缀"""
+    right = right.drop(columns=[key]).reset_index(drop=True)
+    right = right.rename(columns={col: f'{col}{RIGHT_SUFFIX}' for col in right.columns if col in left.columns})
+
+    left_part = left.reset_index(drop=True).take(left_rows).reset_index(drop=True)
+    if (right_rows < 0).any():
+        # -1 不在索引中，reindex 后该行为缺失值
+        right_part = right.reindex(right_rows)
+    else:
+        right_part = right.take(right_rows)
+    return pd.concat([left_part, right_part.reset_index(drop=True)], axis=1)
+
+
+def read_joined(left_path, right_path, key=DEFAULT_JOIN_KEY, how='inner'):
+    """读取两个文件并在键列上连接，返回 (DataFrame, 连接信息)"""
+    left_rows, right_rows, source = join_index(left_path, right_path, key, how)
+    left = read_frame(left_path)
+    right = read_frame(right_path)
+    df = join_frames(left, right, left_rows, right_rows, key)
+    info = {
+        'key': key,
+        'how': how,
+        'rows': len(df),
+        'left_rows': len(left),
+        'right_rows': len(right),
+        'unmatched_rows': int((right_rows < 0).sum()),
+        'index': source,
+    }
+    return df, info
@@ -0,0 +1,356 @@
+"""
+按列类型计划（dtype plan）读取 CSV，减少内存占用
+
+pandas 默认把数值列读成 float64 / int64。天气数据的观测值最多 4 位小数、7 位有效数字以内，
+云量、月份只有个位数，按默认类型读取会浪费大部分内存。每个文件第一次读取时生成类型计划：
+
+- 浮点列：找出列中数值的小数位数，float32 能无损表示这些小数（转回 float64 并按小数位数舍入后
+  与原值完全相同）时使用 float32，否则保持 float64；
+- 整数列：按取值范围使用 int8 / int16 / int32；
+- 布尔列（BBQ_weather 标签）保持 bool；取值不多的字符串列使用 category；
+- DATE 列为 YYYYMMDD 形式的整数时，读取时解析为 datetime64（只解析一次），
+  各接口不再各自调用 pd.to_datetime。
+
+类型计划由各列的可合并统计（column_stats）得出，分块上传时逐块统计、合并后在上传完成时直接生成（见 api/uploads.py）。
+类型计划按文件内容的 SHA-256 缓存在进程内和 MEDIA_ROOT/cache/dtypes/{digest}.json 中，
+之后读取同一文件时直接按计划解析。所有读取数据文件的接口都通过 read_frame / iter_frames 读取，
+除 CSV 外也支持压缩的 CSV、Parquet 和 Arrow IPC 文件（见 api/formats.py），列式文件只读取 usecols 中的列。
+
+需要保持原始表示的输出（preview、清洗结果 CSV）用 export_frame 还原：float32 列转回 float64
+并舍入到原来的小数位数，DATE 还原为 YYYYMMDD 整数，输出与按默认类型读取时完全相同。
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .caching import file_digest
+from .formats import UnsupportedFormat, iter_tables, read_table
+from .storage import record_access
+
+# 类型计划格式版本，修改推断规则时递增
+PLAN_VERSION = 1
+DATE_COLUMN = 'DATE'
+# 浮点列最多检查的小数位数；超过时保持 float64
+MAX_DECIMALS = 6
+# 字符串列不同取值数不超过行数的该比例（且不超过 CATEGORY_MAX_VALUES 个）时使用 category
+CATEGORY_MAX_RATIO = 0.5
+CATEGORY_MAX_VALUES = 10000
+# 标签列转换为数值时视为 1 的取值（不区分大小写）
+LABEL_TRUE_VALUES = ('1', 'true', 't', 'yes', 'y', 'good')
+PLAN_MEMORY_CACHE_SIZE = 256
+
+_INT_TYPES = (np.int8, np.int16, np.int32)
+
+_plan_cache = OrderedDict()
+_plan_lock = threading.Lock()
+
+
+def _int_plan(values):
+    if not len(values):
+        return 'int8'
+    low, high = values.min(), values.max()
+    for dtype in _INT_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype).name
+    return 'int64'
+
+
+def _is_yyyymmdd(values):
+    """整数列是否都是合法的 YYYYMMDD 日期"""
+    if not len(values) or values.min() < 10000101 or values.max() > 99991231:
+        return False
+    month, day = values // 100 % 100, values % 100
+    if ((month < 1) | (month > 12) | (day < 1) | (day > 31)).any():
+        return False
+    try:
+        _parse_yyyymmdd(values)
+    except (ValueError, OverflowError):
+        return False
+    return True
+
+
+def _parse_yyyymmdd(values):
+    # 返回 ndarray：分块读取时块的索引不从 0 开始，不能按索引对齐赋值
+    return pd.to_datetime(
+        pd.DataFrame({'year': values // 10000, 'month': values // 100 % 100, 'day': values % 100})
+    ).to_numpy()
+
+
+def column_stats(df):
+    """
+    按默认类型读取的数据（或其中一块）各列的可合并统计，由 plan_from_stats 得出类型计划。
+    分块上传时逐块统计并用 merge_column_stats 合并（见 api/uploads.py），不需要再读一遍整个文件。
+    """
+    stats = {}
+    for col in df.columns:
+        series = df[col]
+        kind = series.dtype.kind
+        spec = {
+            'dtype': str(series.dtype),
+            'kind': kind,
+            'rows': len(series),
+            'bytes': float(series.memory_usage(index=False, deep=True)),
+            'nulls': int(series.isna().sum()),
+        }
+        if kind in 'iuf':
+            values = series.to_numpy()
+            finite = values[np.isfinite(values)].astype(np.float64)
+            decimals = next(
+                (d for d in range(MAX_DECIMALS + 1) if np.array_equal(np.round(finite, d), finite)), None,
+            )
+            spec['decimals'] = decimals
+            # 各小数位数下 float32 能否无损表示：合并时逐位取与，得到的结果与整列一起判断相同。
+            # 少于本块所需小数位数时必然不能表示，不用计算
+            restored = finite.astype(np.float32).astype(np.float64) if decimals is not None else None
+            spec['float32'] = [
+                decimals is not None and d >= decimals and bool(np.array_equal(np.round(restored, d), finite))
+                for d in range(MAX_DECIMALS + 1)
+            ]
+        if kind in 'iu':
+            values = series.to_numpy()
+            spec['min'], spec['max'] = int(values.min()), int(values.max())
+            spec['yyyymmdd'] = col == DATE_COLUMN and _is_yyyymmdd(values)
+        elif kind == 'O':
+            distinct = series.dropna().astype(str).unique()
+            spec['values'] = sorted(distinct.tolist()) if len(distinct) <= CATEGORY_MAX_VALUES else None
+        stats[str(col)] = spec
+    return stats
+
+
+def _merged_dtype(a, b):
+    """两块中同一列的 (dtype, kind) 合并后的 (dtype, kind)"""
+    if a == b:
+        return a
+    if {a[1], b[1]} <= set('iuf'):
+        return 'float64', 'f'
+    return 'object', 'O'
+
+
+def _as_strings(empty, other):
+    return {**empty, 'dtype': other['dtype'], 'kind': 'O', 'values': []}
+
+
+def merge_column_stats(base, addition):
+    """合并两块数据的 column_stats；某列在两块中类型不同时按 pandas 读取整个文件的结果处理（整数 + 浮点为浮点，其他为 object）"""
+    merged = dict(base)
+    for col, b in addition.items():
+        a = merged.get(col)
+        if a is None:
+            merged[col] = b
+            continue
+        # 某一块中整列为空时 pandas 按浮点读取，与字符串列合并后仍是字符串列
+        if a['nulls'] == a['rows'] and b['kind'] == 'O':
+            a = _as_strings(a, b)
+        if b['nulls'] == b['rows'] and a['kind'] == 'O':
+            b = _as_strings(b, a)
+        dtype, kind = _merged_dtype((a['dtype'], a['kind']), (b['dtype'], b['kind']))
+        spec = {
+            'dtype': dtype,
+            'kind': kind,
+            'rows': a['rows'] + b['rows'],
+            'bytes': a['bytes'] + b['bytes'],
+            'nulls': a['nulls'] + b['nulls'],
+        }
+        if 'float32' in a and 'float32' in b:
+            spec['decimals'] = None if None in (a['decimals'], b['decimals']) else max(a['decimals'], b['decimals'])
+            spec['float32'] = [x and y for x, y in zip(a['float32'], b['float32'])]
+        if 'min' in a and 'min' in b:
+            spec['min'], spec['max'] = min(a['min'], b['min']), max(a['max'], b['max'])
+            spec['yyyymmdd'] = a['yyyymmdd'] and b['yyyymmdd']
+        if 'values' in a and 'values' in b and a['values'] is not None and b['values'] is not None:
+            values = sorted(set(a['values']) | set(b['values']))
+            spec['values'] = values if len(values) <= CATEGORY_MAX_VALUES else None
+        elif kind == 'O':
+            # 两块中有一块不是字符串列（类型混杂），或不同取值过多
+            spec['values'] = None
+        merged[col] = spec
+    return merged
+
+
+def plan_from_stats(stats, rows):
+    """由 column_stats（可以是多块合并后的）得出类型计划"""
+    columns = {}
+    for col, stat in stats.items():
+        kind = stat['kind']
+        spec = {'default': stat['dtype'], 'bytes_per_row': stat['bytes'] / max(rows, 1)}
+        if kind == 'f':
+            decimals = stat['decimals']
+            if decimals is not None and stat['float32'][decimals]:
+                spec['dtype'], spec['decimals'] = 'float32', decimals
+            else:
+                spec['dtype'], spec['decimals'] = 'float64', None
+        elif kind in 'iu':
+            if stat['yyyymmdd']:
+                spec['dtype'] = 'date'
+            else:
+                spec['dtype'] = _int_plan(np.array([stat['min'], stat['max']]))
+        elif kind == 'b':
+            spec['dtype'] = 'bool'
+        elif (kind == 'O' and col != DATE_COLUMN and stat.get('values') is not None
+              and len(stat['values']) <= CATEGORY_MAX_RATIO * rows):
+            spec['dtype'] = 'category'
+        else:
+            spec['dtype'] = 'object'
+        columns[col] = spec
+    return {'version': PLAN_VERSION, 'columns': columns}
+
+
+def infer_plan(df):
+    """根据按默认类型读取的完整 DataFrame 推断类型计划"""
+    return plan_from_stats(column_stats(df), len(df))
+
+
+def _cache_path(digest):
+    return os.path.join(settings.MEDIA_ROOT, 'cache', 'dtypes', f'{digest}.json')
+
+
+def _remember(digest, plan):
+    with _plan_lock:
+        _plan_cache[digest] = plan
+        _plan_cache.move_to_end(digest)
+        while len(_plan_cache) > PLAN_MEMORY_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+
+
+def store_plan(path, plan, digest=None):
+    """保存文件的类型计划（digest 为文件内容的 SHA-256，不指定时计算）"""
+    digest = digest or file_digest(path)
+    cache_path = _cache_path(digest)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f'{cache_path}.{os.getpid()}.{threading.get_ident()}.part'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(plan, f)
+    os.replace(tmp_path, cache_path)
+    _remember(digest, plan)
+    return plan
+
+
+def save_plan(path, df):
+    """由已读入内存的（默认类型）数据推断并保存类型计划，上传、清洗时使用，避免之后再读一遍文件"""
+    return store_plan(path, infer_plan(df))
+
+
+def get_plan(path):
+    """文件的类型计划：依次查找进程内缓存、缓存文件，都没有时按默认类型读取整个文件推断"""
+    digest = file_digest(path)
+    with _plan_lock:
+        if digest in _plan_cache:
+            _plan_cache.move_to_end(digest)
+            return _plan_cache[digest]
+    try:
+        with open(_cache_path(digest), encoding='utf-8') as f:
+            plan = json.load(f)
+        if plan.get('version') == PLAN_VERSION:
+            record_access(_cache_path(digest))
+            _remember(digest, plan)
+            return plan
+    except (OSError, ValueError):
+        pass
+    return save_plan(path, read_table(path))
+
+
+def _read_options(plan, usecols):
+    columns = plan['columns']
+    selected = usecols if usecols is not None else list(columns)
+    dtype = {
+        col: columns[col]['dtype'] for col in selected
+        if col in columns and columns[col]['dtype'] not in ('date', 'object')
+    }
+    dates = [col for col in selected if col in columns and columns[col]['dtype'] == 'date']
+    return dtype, dates
+
+
+def _finish(df, dates):
+    for col in dates:
+        if col in df.columns:
+            df[col] = _parse_yyyymmdd(df[col].to_numpy())
+    return df
+
+
+def read_frame(path, usecols=None, nrows=None):
+    """按类型计划读取数据文件（参数与 pd.read_csv 的同名参数相同，支持的格式见 api/formats.py）"""
+    record_access(path)
+    plan = get_plan(path)
+    dtype, dates = _read_options(plan, usecols)
+    try:
+        df = read_table(path, usecols=usecols, nrows=nrows, dtype=dtype)
+    except (ValueError, TypeError, OverflowError) as e:
+        if isinstance(e, UnsupportedFormat):
+            raise
+        # 计划与文件内容不符（例如缓存文件来自旧版本的推断规则）时按默认类型读取
+        return read_table(path, usecols=usecols, nrows=nrows)
+    return _finish(df, dates)
+
+
+def iter_frames(path, chunksize, usecols=None):
+    """按类型计划分块读取数据文件"""
+    record_access(path)
+    plan = get_plan(path)
+    dtype, dates = _read_options(plan, usecols)
+    for chunk in iter_tables(path, chunksize, usecols=usecols, dtype=dtype):
+        yield _finish(chunk, dates)
+
+
+def memory_report(df, path):
+    """按类型计划读取的 df 与按默认类型读取相比的内存占用（字节）"""
+    columns = get_plan(path)['columns']
+    typed = int(df.memory_usage(index=False, deep=True).sum())
+    baseline = int(sum(
+        columns[col]['bytes_per_row'] * len(df) if col in columns else df[col].memory_usage(index=False, deep=True)
+        for col in df.columns
+    ))
+    dtypes = {}
+    for dtype in df.dtypes:
+        dtypes[str(dtype)] = dtypes.get(str(dtype), 0) + 1
+    return {
+        'bytes': typed,
+        'default_bytes': baseline,
+        'saved_bytes': baseline - typed,
+        'saved_ratio': round(1 - typed / baseline, 4) if baseline else 0.0,
+        'dtypes': dtypes,
+    }
+
+
+def _restore_float32(values):
+    """float32 列转回 float64：找到能与 float32 互相转换的最少小数位数并舍入"""
+    wide = values.astype(np.float64)
+    finite = np.isfinite(values)
+    for decimals in range(MAX_DECIMALS + 1):
+        rounded = np.round(wide, decimals)
+        if np.array_equal(rounded[finite].astype(np.float32), values[finite]):
+            return rounded
+    return wide
+
+
+def export_frame(df):
+    """还原为按默认类型读取时的表示：float32 → float64（原小数位数），小整数 → int64，category → object，
+    datetime64 的 DATE → YYYYMMDD 整数"""
+    out = df.copy(deep=False)
+    for col in df.columns:
+        dtype = df[col].dtype
+        if dtype == np.float32:
+            out[col] = _restore_float32(df[col].to_numpy())
+        elif dtype.kind in 'iu' and dtype.itemsize < 8:
+            out[col] = df[col].astype(np.int64)
+        elif isinstance(dtype, pd.CategoricalDtype):
+            out[col] = df[col].astype(object)
+        elif dtype.kind == 'M' and col == DATE_COLUMN:
+            dates = df[col].dt
+            values = dates.year * 10000 + dates.month * 100 + dates.day
+            # 没有缺失日期时与原文件一样是整数列
+            out[col] = values if values.isna().any() else values.astype(np.int64)
+    return out
+
+
+def label_numeric(series):
+    """标签列（bool / 字符串 / category）转换为 0/1 的 int8 列"""
+    if series.dtype == bool:
+        return series.astype(np.int8)
+    values = series.astype(str).str.lower()
+    return values.isin(LABEL_TRUE_VALUES).astype(np.int8)
@@ -0,0 +1,475 @@
+"""
+基于场景的本地负载测试
+
+对运行中的开发服务器（python manage.py runserver 或 ASGI 服务器）发送 HTTP 请求，按场景重放用户操作：
+
+- full：login → upload → preview → clean_data → analyze → visualize
+- explore：login → list_files → preview → distribution
+- analyze：login → preview → analyze
+
+准备阶段为每个虚拟用户注册一个账号并上传一份夹具数据（用 api/benchmark.py 的天气数据生成器生成），
+不计入统计。之后按两种模型之一产生负载：
+
+- 闭环（默认）：concurrency 个虚拟用户各自循环执行场景；
+- 开环（指定 rate）：按泊松过程以每秒 rate 个场景的速率到达，最多 concurrency 个同时执行，
+  执行槽都被占用时到达的场景排队，排队时间单独统计。
+
+报告按接口给出请求数、吞吐量、错误率和 p50 / p95 / p99 延迟；可以设置延迟预算，
+超出时命令以非零状态退出。命令行入口见 api/management/commands/loadtest.py。
+"""
+import datetime
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .benchmark import _git_commit, cached_weather_dataset, weather_columns
+
+# 报告格式版本，修改报告结构时递增
+REPORT_SCHEMA_VERSION = 1
+
+SCENARIOS = {
+    'full': ('login', 'upload', 'preview', 'clean_data', 'analyze', 'visualize'),
+    'explore': ('login', 'list_files', 'preview', 'distribution'),
+    'analyze': ('login', 'preview', 'analyze'),
+}
+
+PERCENTILES = (50, 95, 99)
+BUDGET_METRICS = tuple(f'p{p}' for p in PERCENTILES) + ('mean', 'max')
+# 预算中表示所有接口的名称，以及所有请求合并统计的名称
+ALL_ENDPOINTS = '*'
+OVERALL = 'overall'
+
+DEFAULT_TIMEOUT = 300
+
+
+class LoadTestError(Exception):
+    """准备阶段失败（服务器不可达、注册或上传失败）等使负载测试无法进行的错误"""
+
+
+def parse_mix(values):
+    """解析场景权重，例如 ['full=1', 'explore=3']；只写场景名时权重为 1"""
+    mix = {}
+    for value in values or ['full']:
+        name, _, weight = value.partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f'未知场景: {name}，可选：{", ".join(SCENARIOS)}')
+        mix[name] = float(weight) if weight else 1.0
+        if mix[name] <= 0:
+            raise ValueError(f'场景 {name} 的权重必须大于 0')
+    return mix
+
+
+def parse_budget(value):
+    """解析延迟预算，例如 preview:p95=500（毫秒）；接口名 * 表示每个接口，overall 表示全部请求"""
+    endpoint, _, rest = value.partition(':')
+    metric, _, limit = rest.partition('=')
+    if not endpoint or metric not in BUDGET_METRICS or not limit:
+        raise ValueError(f'预算格式应为 接口:指标=毫秒（指标可选 {", ".join(BUDGET_METRICS)}），收到: {value}')
+    return {'endpoint': endpoint, 'metric': metric, 'limit_ms': float(limit)}
+
+
+def _multipart(fields, files):
+    """编码 multipart/form-data 请求体，files 为 {字段名: (文件名, bytes)}"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8'))
+    for name, (filename, content) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: text/csv\r\n\r\n'.encode('utf-8') + content + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class Recorder:
+    """线程安全地收集每个请求的 (接口, 耗时, 是否出错)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+        self.errors = {}
+        self.queue_delays = []
+        self.flows = {'completed': 0, 'failed': 0}
+
+    def record(self, endpoint, seconds, ok, error=None):
+        with self._lock:
+            self.samples.append((endpoint, seconds, ok))
+            if error:
+                key = f'{endpoint}: {error}'
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def flow_done(self, ok, queue_delay=None):
+        with self._lock:
+            self.flows['completed' if ok else 'failed'] += 1
+            if queue_delay is not None:
+                self.queue_delays.append(queue_delay)
+
+
+class Client:
+    """一个虚拟用户的 HTTP 客户端：保存 token 和场景中产生的 ID"""
+
+    def __init__(self, base_url, username, password, recorder, timeout=DEFAULT_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.recorder = recorder
+        self.timeout = timeout
+        self.token = None
+        # 准备阶段上传的夹具文件；每次场景开始时 file_id 重置为它
+        self.fixture_file_id = None
+        self.file_id = None
+        self.cleaned_data_id = None
+        self.analysis_id = None
+
+    def request(self, endpoint, method, path, json_body=None, body=None, content_type=None, record=True):
+        """发送请求并记录耗时；返回 (状态码, 解析后的 JSON 或 None)。网络错误的状态码为 0"""
+        headers = {'Accept': 'application/json', 'Accept-Encoding': 'identity'}
+        if self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        if json_body is not None:
+            body = json.dumps(json_body).encode('utf-8')
+            content_type = 'application/json'
+        if content_type:
+            headers['Content-Type'] = content_type
+
+        request = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status, payload = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, payload = e.code, e.read()
+        except (urllib.error.URLError, OSError) as e:
+            if record:
+                self.recorder.record(endpoint, time.perf_counter() - start, False, type(e).__name__)
+            return 0, None
+        elapsed = time.perf_counter() - start
+
+        ok = status < 400
+        if record:
+            self.recorder.record(endpoint, elapsed, ok, None if ok else f'HTTP {status}')
+        try:
+            data = json.loads(payload) if payload else None
+        except ValueError:
+            data = None
+        return status, data
+
+
+class LoadTest:
+    """
+    负载测试运行器。
+
+    base_url 指向 API 根路径（例如 http://localhost:8000/api）。
+    """
+
+    def __init__(self, base_url, mix=None, concurrency=4, rate=None, duration=None, flows=None,
+                 rows=3654, cols=20, data_dir=None, analysis_type='clustering', seed=42,
+                 timeout=DEFAULT_TIMEOUT, log=None):
+        if not duration and not flows:
+            raise ValueError('需要指定 duration（秒）或 flows（场景次数）')
+        self.base_url = base_url.rstrip('/')
+        self.mix = mix or {'full': 1.0}
+        self.concurrency = max(1, int(concurrency))
+        self.rate = rate
+        self.duration = duration
+        self.max_flows = flows
+        self.rows = rows
+        self.cols = cols
+        self.data_dir = data_dir
+        self.analysis_type = analysis_type
+        self.seed = seed
+        self.timeout = timeout
+        self.log = log or (lambda message: None)
+        self.recorder = Recorder()
+        self.features, labels = weather_columns(cols)
+        self.label = labels[0] if labels else None
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._flows_lock = threading.Lock()
+        self._flows_started = 0
+
+    # ---- 准备阶段 ----
+
+    def _fixture(self):
+        path = cached_weather_dataset(self.data_dir, self.rows, self.cols, seed=self.seed)
+        with open(path, 'rb') as f:
+            return os.path.basename(path), f.read()
+
+    def setup_users(self):
+        """注册 concurrency 个虚拟用户，各上传一份夹具数据；准备阶段的请求不计入统计"""
+        filename, content = self._fixture()
+        run_id = uuid.uuid4().hex[:8]
+        self.clients = []
+        for i in range(self.concurrency):
+            client = Client(self.base_url, f'loadtest_{run_id}_{i}', uuid.uuid4().hex, self.recorder, self.timeout)
+            status, data = client.request('register', 'POST', '/register/', json_body={
+                'username': client.username, 'password': client.password,
+            }, record=False)
+            if status == 0:
+                raise LoadTestError(f'无法连接 {self.base_url}，服务器是否已经启动？')
+            if status != 200 and status != 201:
+                raise LoadTestError(f'注册虚拟用户失败（HTTP {status}）：{data}')
+            client.token = data['token']
+            status, data = self._upload(client, filename, content, record=False)
+            if not 0 < status < 400:
+                raise LoadTestError(f'上传夹具数据失败（HTTP {status}）：{data}')
+            client.fixture_file_id = client.file_id
+            self.clients.append(client)
+        self.fixture = (filename, content)
+        self.log(f'已准备 {len(self.clients)} 个虚拟用户，夹具数据 {filename}（{len(content)} 字节）')
+
+    def cleanup(self):
+        """删除虚拟用户上传的文件（清洗结果、分析结果随之级联删除）"""
+        for client in getattr(self, 'clients', []):
+            status, data = client.request('cleanup', 'GET', '/datafiles/', record=False)
+            for item in data if isinstance(data, list) else []:
+                client.request('cleanup', 'DELETE', f'/datafiles/{item["id"]}/', record=False)
+
+    # ---- 场景步骤：返回 False 表示失败，场景中止 ----
+
+    def _upload(self, client, filename, content, record=True):
+        """上传文件，返回 (状态码, 响应)；成功时更新 client.file_id"""
+        body, content_type = _multipart(
+            {'name': filename, 'description': 'loadtest', 'file_type': 'text/csv'}, {'file': (filename, content)}
+        )
+        status, data = client.request('upload', 'POST', '/datafiles/', body=body, content_type=content_type, record=record)
+        if 0 < status < 400 and data:
+            client.file_id = data['id']
+        return status, data
+
+    def step_login(self, client):
+        client.token = None
+        status, data = client.request('login', 'POST', '/login/', json_body={
+            'username': client.username, 'password': client.password,
+        })
+        client.token = data.get('token') if status == 200 and data else None
+        return client.token is not None
+
+    def step_upload(self, client):
+        status, _ = self._upload(client, *self.fixture)
+        return 0 < status < 400
+
+    def step_list_files(self, client):
+        status, _ = client.request('list_files', 'GET', '/datafiles/')
+        return 0 < status < 400
+
+    def step_preview(self, client):
+        status, _ = client.request('preview', 'GET', f'/datafiles/{client.file_id}/preview/')
+        return 0 < status < 400
+
+    def step_distribution(self, client):
+        status, _ = client.request('distribution', 'GET', f'/datafiles/{client.file_id}/distribution/')
+        return 0 < status < 400
+
+    def step_clean_data(self, client):
+        status, data = client.request('clean_data', 'POST', '/cleaneddata/clean_data/', json_body={
+            'file_id': client.file_id, 'cleaning_method': 'missing_values', 'parameters': {'strategy': 'mean'},
+        })
+        if not 0 < status < 400:
+            return False
+        client.cleaned_data_id = data['id']
+        return True
+
+    def step_analyze(self, client):
+        parameters = {'features': self.features[:5], 'n_clusters': 3, 'n_components': 2}
+        if self.analysis_type in ('regression', 'classification'):
+            target = self.features[0] if self.analysis_type == 'regression' else self.label
+            parameters = {'features': self.features[1:6], 'target': target}
+        status, data = client.request('analyze', 'POST', '/analysisresults/analyze/', json_body={
+            'file_id': client.file_id,
+            'cleaned_data_id': client.cleaned_data_id,
+            'analysis_type': self.analysis_type,
+            'parameters': parameters,
+        })
+        if not 0 < status < 400:
+            return False
+        client.analysis_id = data['id']
+        return True
+
+    def step_visualize(self, client):
+        status, _ = client.request('visualize', 'POST', '/visualizations/visualize/', json_body={
+            'data_file_id': client.file_id,
+            'analysis_result_id': client.analysis_id,
+            'chart_type': 'scatter',
+            'title': 'loadtest',
+            'configuration': {},
+        })
+        return 0 < status < 400
+
+    # ---- 负载生成 ----
+
+    def _choose_scenario(self):
+        with self._random_lock:
+            names = list(self.mix)
+            return self._random.choices(names, weights=[self.mix[name] for name in names])[0]
+
+    def run_flow(self, client, scenario):
+        """执行一次场景；场景内各步骤依次进行，某一步失败时中止"""
+        client.file_id = client.fixture_file_id
+        client.cleaned_data_id = None
+        client.analysis_id = None
+        for step in SCENARIOS[scenario]:
+            if not getattr(self, f'step_{step}')(client):
+                return False
+        return True
+
+    def _claim_flow(self):
+        """场景次数达到上限时返回 False"""
+        with self._flows_lock:
+            if self.max_flows is not None and self._flows_started >= self.max_flows:
+                return False
+            self._flows_started += 1
+            return True
+
+    def _closed_loop(self, client, deadline):
+        while (deadline is None or time.perf_counter() < deadline) and self._claim_flow():
+            self.recorder.flow_done(self.run_flow(client, self._choose_scenario()))
+
+    def _open_loop(self, deadline):
+        idle = list(self.clients)
+        idle_lock = threading.Lock()
+
+        def flow(scheduled):
+            with idle_lock:
+                client = idle.pop()
+            try:
+                queue_delay = time.perf_counter() - scheduled
+                self.recorder.flow_done(self.run_flow(client, self._choose_scenario()), queue_delay)
+            finally:
+                with idle_lock:
+                    idle.append(client)
+
+        # 线程数等于虚拟用户数，任一时刻每个虚拟用户最多执行一个场景
+        rng = np.random.default_rng(self.seed)
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='loadtest') as executor:
+            next_arrival = time.perf_counter()
+            while (deadline is None or next_arrival < deadline) and self._claim_flow():
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(flow, next_arrival)
+                next_arrival += rng.exponential(1.0 / self.rate)
+
+    def run(self):
+        """执行负载测试，返回报告（不含预算检查）"""
+        self.setup_users()
+        started_at = datetime.datetime.now(datetime.timezone.utc)
+        start = time.perf_counter()
+        deadline = start + self.duration if self.duration else None
+        try:
+            if self.rate:
+                self._open_loop(deadline)
+            else:
+                threads = [
+                    threading.Thread(target=self._closed_loop, args=(client, deadline), name=f'loadtest-{i}')
+                    for i, client in enumerate(self.clients)
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            elapsed = time.perf_counter() - start
+        return build_report(self, started_at, elapsed)
+
+
+def latency_summary(seconds):
+    """一组耗时（秒）的统计，单位毫秒"""
+    values = np.asarray(seconds, dtype=np.float64) * 1000
+    if not len(values):
+        return {'mean_ms': None, 'max_ms': None, **{f'p{p}_ms': None for p in PERCENTILES}}
+    quantiles = np.percentile(values, PERCENTILES)
+    return {
+        **{f'p{p}_ms': round(float(q), 3) for p, q in zip(PERCENTILES, quantiles)},
+        'mean_ms': round(float(values.mean()), 3),
+        'max_ms': round(float(values.max()), 3),
+    }
+
+
+def summarize(samples, elapsed):
+    """按接口汇总请求数、错误率、吞吐量和延迟分位数，另加 overall 合并统计"""
+    groups = {}
+    for endpoint, seconds, ok in samples:
+        groups.setdefault(endpoint, []).append((seconds, ok))
+    groups[OVERALL] = [(seconds, ok) for _, seconds, ok in samples]
+
+    endpoints = {}
+    for endpoint, values in groups.items():
+        errors = sum(1 for _, ok in values if not ok)
+        endpoints[endpoint] = {
+            'requests': len(values),
+            'errors': errors,
+            'error_rate': errors / len(values) if values else 0.0,
+            'throughput_per_s': len(values) / elapsed if elapsed else None,
+            # 延迟只统计成功的请求，失败请求（连接错误、4xx/5xx）计入错误率
+            **latency_summary([seconds for seconds, ok in values if ok]),
+        }
+    return endpoints
+
+
+def build_report(load_test, started_at, elapsed):
+    recorder = load_test.recorder
+    flows = dict(recorder.flows)
+    report = {
+        'schema': REPORT_SCHEMA_VERSION,
+        'created_at': started_at.isoformat(),
+        'git_commit': _git_commit(),
+        'base_url': load_test.base_url,
+        'config': {
+            'mix': load_test.mix,
+            'concurrency': load_test.concurrency,
+            'rate': load_test.rate,
+            'duration': load_test.duration,
+            'flows': load_test.max_flows,
+            'rows': load_test.rows,
+            'cols': load_test.cols,
+            'analysis_type': load_test.analysis_type,
+            'cpu_count': os.cpu_count(),
+        },
+        'elapsed_s': round(elapsed, 3),
+        'flows': {**flows, 'per_second': (flows['completed'] + flows['failed']) / elapsed if elapsed else None},
+        'endpoints': summarize(recorder.samples, elapsed),
+        'errors': recorder.errors,
+    }
+    if load_test.rate:
+        report['queue_delay'] = latency_summary(recorder.queue_delays)
+    return report
+
+
+def check_budgets(report, budgets, max_error_rate=None):
+    """检查延迟预算和错误率上限，返回每条检查的结果列表（passed 为 False 表示超出）"""
+    endpoints = report['endpoints']
+    checks = []
+    for budget in budgets:
+        names = [name for name in endpoints if name != OVERALL] if budget['endpoint'] == ALL_ENDPOINTS else [budget['endpoint']]
+        for name in names:
+            stats = endpoints.get(name)
+            actual = stats.get(f'{budget["metric"]}_ms') if stats else None
+            checks.append({
+                'endpoint': name,
+                'metric': budget['metric'],
+                'limit_ms': budget['limit_ms'],
+                'actual_ms': actual,
+                # 没有成功请求的接口无法判断延迟，视为超出预算
+                'passed': actual is not None and actual <= budget['limit_ms'],
+            })
+    if max_error_rate is not None:
+        for name, stats in endpoints.items():
+            checks.append({
+                'endpoint': name,
+                'metric': 'error_rate',
+                'limit': max_error_rate,
+                'actual': stats['error_rate'],
+                'passed': stats['error_rate'] <= max_error_rate,
+            })
+    return checks
@@ -0,0 +1,94 @@
+"""
+运行性能基准测试
+
+示例：
+    python manage.py benchmark                                  # 默认 3654 行 x 165 列
+    python manage.py benchmark --rows 3654 100000 --cols 20 165 2000
+    python manage.py benchmark --cases preview analyze.clustering --repeat 3
+    python manage.py benchmark --output bench.json --compare baseline.json
+
+基准在独立的测试数据库和临时 MEDIA_ROOT 中运行，不会影响开发数据库和 media 目录。
+生成的数据文件缓存在 --data-dir 中，重复运行时直接复用。
+"""
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from api.benchmark import BenchmarkRunner, build_report, compare_reports, load_report
+
+
+class Command(BaseCommand):
+    help = '通过 DRF 测试客户端运行 preview / clean_data / analyze 的性能基准，输出 JSON 报告'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[3654], help='数据行数，可指定多个')
+        parser.add_argument('--cols', type=int, nargs='+', default=[165], help='数据列数（含 DATE、MONTH），可指定多个')
+        parser.add_argument('--cases', nargs='+', default=None, help='只运行名称以这些前缀开头的用例')
+        parser.add_argument('--repeat', type=int, default=1, help='每个用例重复次数，取最快的一次')
+        parser.add_argument('--seed', type=int, default=42, help='数据生成器随机种子')
+        parser.add_argument(
+            '--data-dir', default=os.path.join(tempfile.gettempdir(), 'weather_benchmark_data'),
+            help='生成数据的缓存目录',
+        )
+        parser.add_argument('--output', default=None, help='报告输出路径（JSON），默认打印到标准输出')
+        parser.add_argument('--compare', default=None, help='与之对比的历史报告路径')
+        parser.add_argument(
+            '--fail-over', type=float, default=None,
+            help='与 --compare 一起使用：任一用例耗时比值超过该值时以非零状态退出',
+        )
+
+    def handle(self, *args, **options):
+        from django.contrib.auth.models import User
+
+        sizes = [(rows, cols) for rows in options['rows'] for cols in options['cols']]
+        baseline = load_report(options['compare']) if options['compare'] else None
+
+        setup_test_environment()
+        old_db_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+                user = User.objects.create_user(username='benchmark', password='benchmark')
+                runner = BenchmarkRunner(
+                    user,
+                    data_dir=options['data_dir'],
+                    repeat=options['repeat'],
+                    case_filter=options['cases'],
+                    seed=options['seed'],
+                    log=lambda message: self.stderr.write(message),
+                )
+                results = runner.run(sizes)
+        finally:
+            connection.creation.destroy_test_db(old_db_name, verbosity=0)
+            teardown_test_environment()
+
+        report = build_report(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stderr.write(f'报告已写入 {options["output"]}')
+        else:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+
+        failed = [r for r in results if r['status'] >= 400]
+        if failed:
+            self.stderr.write(self.style.WARNING(f'{len(failed)} 个用例返回错误状态码'))
+
+        if baseline is not None:
+            self._print_comparison(baseline, report, options['fail_over'])
+
+    def _print_comparison(self, baseline, report, fail_over):
+        rows = compare_reports(baseline, report)
+        self.stderr.write(f'与基线 {baseline.get("git_commit") or "?"} 对比（耗时比值，>1 表示变慢）:')
+        for row in rows:
+            self.stderr.write(
+                f"  {row['case']:<36} {row['rows']:>9}x{row['cols']:<5} "
+                f"{row['baseline']:>9.3f}s -> {row['current']:>9.3f}s  x{row['ratio']:.2f}"
+            )
+        if fail_over is not None:
+            regressions = [row for row in rows if row['ratio'] > fail_over]
+            if regressions:
+                raise CommandError(f'{len(regressions)} 个用例耗时超过基线的 {fail_over} 倍')
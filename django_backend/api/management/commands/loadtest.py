@@ -0,0 +1,129 @@
+"""
+对本地开发服务器运行场景负载测试
+
+示例：
+    python manage.py runserver --noreload &                     # 先启动服务器
+    python manage.py loadtest --duration 60 --concurrency 8
+    python manage.py loadtest --scenario full=1 explore=4 --rate 2 --duration 120
+    python manage.py loadtest --flows 50 --budget preview:p95=300 --budget '*:p99=5000' --max-error-rate 0.01
+
+每个虚拟用户在服务器上注册一个 loadtest_ 开头的账号并上传夹具数据；结束后删除上传的文件
+（--keep-data 保留）。任一延迟预算或错误率上限被超出时以非零状态退出。
+"""
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.loadtest import (
+    OVERALL, SCENARIOS, LoadTest, LoadTestError, check_budgets, parse_budget, parse_mix,
+)
+
+
+class Command(BaseCommand):
+    help = '按场景（login → upload → preview → clean_data → analyze → visualize 等）对运行中的服务器施加负载，输出各接口的延迟分位数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8000/api', help='API 根路径')
+        parser.add_argument(
+            '--scenario', nargs='+', default=['full'],
+            help=f'场景及权重，例如 full=1 explore=3；可选场景：{", ".join(SCENARIOS)}',
+        )
+        parser.add_argument('--concurrency', type=int, default=4, help='虚拟用户数（同时执行的场景数上限）')
+        parser.add_argument('--rate', type=float, default=None, help='开环模式：每秒到达的场景数（泊松过程）；不指定时为闭环模式')
+        parser.add_argument('--duration', type=float, default=None, help='运行时长（秒）')
+        parser.add_argument('--flows', type=int, default=None, help='执行的场景总数')
+        parser.add_argument('--rows', type=int, default=3654, help='夹具数据行数')
+        parser.add_argument('--cols', type=int, default=20, help='夹具数据列数（含 DATE、MONTH）')
+        parser.add_argument(
+            '--analysis-type', default='clustering',
+            choices=['clustering', 'dimension_reduction', 'regression', 'classification'],
+            help='analyze 步骤的分析类型',
+        )
+        parser.add_argument('--seed', type=int, default=42, help='数据生成器和场景选择的随机种子')
+        parser.add_argument(
+            '--data-dir', default=os.path.join(tempfile.gettempdir(), 'weather_benchmark_data'),
+            help='夹具数据的缓存目录（与 benchmark 命令共用）',
+        )
+        parser.add_argument('--timeout', type=float, default=300, help='单个请求的超时时间（秒）')
+        parser.add_argument(
+            '--budget', action='append', default=[],
+            help='延迟预算（毫秒），格式 接口:指标=毫秒，例如 preview:p95=300；接口 * 表示每个接口，overall 表示全部请求',
+        )
+        parser.add_argument('--max-error-rate', type=float, default=None, help='任一接口的错误率上限（0~1）')
+        parser.add_argument('--output', default=None, help='报告输出路径（JSON），默认打印到标准输出')
+        parser.add_argument('--keep-data', action='store_true', help='结束后保留虚拟用户上传的文件')
+
+    def handle(self, *args, **options):
+        if not options['duration'] and not options['flows']:
+            raise CommandError('需要指定 --duration 或 --flows')
+        try:
+            mix = parse_mix(options['scenario'])
+            budgets = [parse_budget(value) for value in options['budget']]
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        load_test = LoadTest(
+            options['base_url'],
+            mix=mix,
+            concurrency=options['concurrency'],
+            rate=options['rate'],
+            duration=options['duration'],
+            flows=options['flows'],
+            rows=options['rows'],
+            cols=options['cols'],
+            data_dir=options['data_dir'],
+            analysis_type=options['analysis_type'],
+            seed=options['seed'],
+            timeout=options['timeout'],
+            log=lambda message: self.stderr.write(message),
+        )
+        try:
+            report = load_test.run()
+        except LoadTestError as e:
+            raise CommandError(str(e))
+        finally:
+            if not options['keep_data']:
+                load_test.cleanup()
+
+        checks = check_budgets(report, budgets, options['max_error_rate'])
+        report['budgets'] = checks
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stderr.write(f'报告已写入 {options["output"]}')
+        else:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+
+        self._print_summary(report)
+        failed = [check for check in checks if not check['passed']]
+        for check in failed:
+            if check['metric'] == 'error_rate':
+                self.stderr.write(self.style.ERROR(
+                    f"  {check['endpoint']} 错误率 {check['actual']:.2%} 超过上限 {check['limit']:.2%}"
+                ))
+            else:
+                self.stderr.write(self.style.ERROR(
+                    f"  {check['endpoint']} {check['metric']} {check['actual_ms']} ms 超过预算 {check['limit_ms']} ms"
+                ))
+        if failed:
+            raise CommandError(f'{len(failed)} 项超出预算')
+
+    def _print_summary(self, report):
+        flows = report['flows']
+        self.stderr.write(
+            f"{report['elapsed_s']:.1f}s 内完成 {flows['completed']} 个场景，失败 {flows['failed']} 个"
+            f"（{flows['per_second']:.2f} 个/秒）"
+        )
+        self.stderr.write(f"  {'接口':<14} {'请求数':>7} {'错误率':>7} {'请求/秒':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+        endpoints = sorted(report['endpoints'].items(), key=lambda item: item[0] == OVERALL)
+        for name, stats in endpoints:
+            def ms(key):
+                return f'{stats[key]:.1f}' if stats[key] is not None else '-'
+            self.stderr.write(
+                f"  {name:<14} {stats['requests']:>7} {stats['error_rate']:>7.1%} {stats['throughput_per_s']:>8.2f} "
+                f"{ms('p50_ms'):>9} {ms('p95_ms'):>9} {ms('p99_ms'):>9}"
+            )
+        if 'queue_delay' in report:
+            self.stderr.write(f"  到达后排队 p95: {report['queue_delay']['p95_ms']} ms")
@@ -0,0 +1,47 @@
+"""
+回收 MEDIA_ROOT 下的磁盘空间（见 api/storage.py）
+
+示例：
+    python manage.py storage_gc                          # 清理孤立文件，按 STORAGE_BUDGET_BYTES 回收
+    python manage.py storage_gc --budget 10G --dry-run   # 只报告将要删除的文件
+    python manage.py storage_gc --usage                  # 只扫描并输出各用户的用量
+
+适合由 cron 定期运行；设置了 STORAGE_BUDGET_BYTES 时服务器在上传、清洗后也会自动检查。
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.storage import ORPHAN_GRACE_SECONDS, collect, scan, usage
+
+_UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(value):
+    """字节数，可以带 K / M / G / T 后缀（1024 进制）"""
+    value = value.strip().upper().rstrip('B')
+    try:
+        if value and value[-1] in _UNITS:
+            return int(float(value[:-1]) * _UNITS[value[-1]])
+        return int(value)
+    except ValueError:
+        raise CommandError(f'无法解析的大小: {value}')
+
+
+class Command(BaseCommand):
+    help = '清理孤立文件，并在超出容量预算时按最近访问时间回收缓存和清洗结果'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budget', default=None, help='容量预算，例如 500M、10G；默认 settings.STORAGE_BUDGET_BYTES，0 表示不限制')
+        parser.add_argument('--grace', type=int, default=ORPHAN_GRACE_SECONDS, help='孤立文件超过该秒数未修改才删除')
+        parser.add_argument('--dry-run', action='store_true', help='只报告将要删除的文件')
+        parser.add_argument('--usage', action='store_true', help='只扫描磁盘并输出各用户的用量，不删除文件')
+
+    def handle(self, *args, **options):
+        if options['usage']:
+            scan()
+            self.stdout.write(json.dumps(usage(), ensure_ascii=False, indent=2))
+            return
+        budget = parse_size(options['budget']) if options['budget'] is not None else None
+        report = collect(budget=budget, dry_run=options['dry_run'], grace=options['grace'])
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
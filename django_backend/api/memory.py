@@ -0,0 +1,120 @@
+"""
+进程内存（RSS）的测量
+
+- current_rss：当前的常驻内存，读取 /proc（Linux），开销是一次文件读取；
+- peak_rss：进程生命周期内的峰值常驻内存（getrusage 的 ru_maxrss），开销是一次系统调用；
+- PeakRSSSampler：在后台线程中周期性采样 current_rss，得到某段代码执行期间的峰值。
+  每 5 毫秒读取一次 /proc，只用于基准测试（api/benchmark.py）；
+- TracedPeak：用 tracemalloc 统计某段代码执行期间新分配内存的峰值（NumPy 的数组缓冲区也会报告给 tracemalloc），
+  分析请求用它记录拟合占用的内存（见 api/engines/base.py）。
+
+ru_maxrss 是整个进程生命周期的峰值，长期运行的服务中拟合前后两次读取的差值几乎总是 0，
+还会计入并发请求的分配，所以不用于单次拟合的统计。
+"""
+import os
+import platform
+import threading
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+
+def peak_rss():
+    """进程的峰值常驻内存（字节）；不支持的平台返回 None"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 上单位是字节，Linux 上是 KB
+    return usage if platform.system() == 'Darwin' else usage * 1024
+
+
+def current_rss():
+    """当前进程的常驻内存（字节），优先读取 /proc，其他平台退回到 ru_maxrss"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return peak_rss() or 0
+
+
+class PeakRSSSampler:
+    """
+    在后台线程中周期性采样 RSS，记录某段代码执行期间的峰值内存。
+
+    ru_maxrss 是整个进程生命周期的峰值，无法区分单个用例，所以这里自己采样。
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start_rss = 0
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_rss = max(self.peak_rss, current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.start_rss = self.peak_rss = current_rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, current_rss())
+        return False
+
+
+_traced_lock = threading.Lock()
+# 正在统计的 TracedPeak；为空时停止 tracemalloc
+_traced_active = set()
+_traced_started = False
+
+
+class TracedPeak:
+    """
+    统计 with 块内新分配内存的峰值（字节），结果在 peak_bytes 中。
+
+    tracemalloc 是进程级的：统计期间有其他线程也在统计时（并发的拟合），
+    峰值无法归属到单次拟合，peak_bytes 为 None；没有使用 TracedPeak 的线程（例如同时进行的文件读取）的分配
+    仍会计入。tracemalloc 由第一个统计者启动、最后一个结束时停止
+    （进程启动时已用 -X tracemalloc 开启的不会被停止）。
+    """
+
+    def __init__(self):
+        self.peak_bytes = None
+        self.overlapped = False
+        self._start = 0
+
+    def __enter__(self):
+        global _traced_started
+        with _traced_lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _traced_started = True
+            for other in _traced_active:
+                other.overlapped = True
+            self.overlapped = bool(_traced_active)
+            _traced_active.add(self)
+            tracemalloc.reset_peak()
+            self._start = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _traced_started
+        with _traced_lock:
+            peak = tracemalloc.get_traced_memory()[1]
+            _traced_active.discard(self)
+            self.peak_bytes = None if self.overlapped else max(peak - self._start, 0)
+            if not _traced_active and _traced_started:
+                tracemalloc.stop()
+                _traced_started = False
+        return False
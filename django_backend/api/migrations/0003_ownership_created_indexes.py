@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0002_datafile_user_userprofile"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="analysisresult",
+            index=models.Index(fields=["data_file", "-created_at"], name="analysis_file_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="cleaneddata",
+            index=models.Index(fields=["original_file", "-created_at"], name="cleaned_file_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="datafile",
+            index=models.Index(fields=["user", "-created_at"], name="datafile_user_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="visualizationresult",
+            index=models.Index(fields=["data_file", "-created_at"], name="visual_file_created_idx"),
+        ),
+    ]
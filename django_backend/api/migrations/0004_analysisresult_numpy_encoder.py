@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:56
+
+import api.renderers
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0003_ownership_created_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="analysisresult",
+            name="result",
+            field=models.JSONField(default=dict, encoder=api.renderers.NumpyJSONEncoder),
+        ),
+    ]
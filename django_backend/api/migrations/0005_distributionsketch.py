@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:58
+
+import api.renderers
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0004_analysisresult_numpy_encoder"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DistributionSketch",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("column", models.CharField(max_length=255)),
+                ("sketch", models.JSONField(default=dict, encoder=api.renderers.NumpyJSONEncoder)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("cleaned_data", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name="sketches", to="api.cleaneddata")),
+                ("data_file", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="sketches", to="api.datafile")),
+            ],
+            options={
+                "indexes": [models.Index(fields=["data_file", "cleaned_data", "column"], name="sketch_source_column_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:07
+
+import api.renderers
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_distributionsketch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cleaneddata',
+            name='summary',
+            field=models.JSONField(blank=True, default=dict, encoder=api.renderers.NumpyJSONEncoder),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_cleaneddata_cache_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredArtifact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500, unique=True)),
+                ('kind', models.CharField(choices=[('upload', '上传文件'), ('cleaned', '清洗结果'), ('analysis', '分析结果文件'), ('cache', '缓存')], max_length=20)),
+                ('size', models.BigIntegerField(default=0)),
+                ('last_accessed', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='artifacts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'last_accessed'], name='artifact_kind_access_idx'), models.Index(fields=['user', 'kind'], name='artifact_user_kind_idx')],
+            },
+        ),
+    ]
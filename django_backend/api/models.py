@@ -3,6 +3,8 @@ from django.contrib.auth.models import User
 import uuid
 import os
 
+from .renderers import NumpyJSONEncoder
+
 def get_file_path(instance, filename):
     ext = filename.split('.')[-1]
     filename = f"{uuid.uuid4()}.{ext}"
@@ -28,6 +30,10 @@ class DataFile(models.Model):
     #
     file_type = models.CharField(max_length=50)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # 列表接口按用户过滤并按时间排序
+        indexes = [models.Index(fields=['user', '-created_at'], name='datafile_user_created_idx')]
     
     def __str__(self):
         return self.name
@@ -37,7 +43,14 @@ class CleanedData(models.Model):
     file = models.FileField(upload_to='cleaned/')
     cleaning_method = models.CharField(max_length=50)
     parameters = models.JSONField(default=dict)
+    # 清洗结果摘要，例如离群值处理时每列的离群值数量和上下界
+    summary = models.JSONField(default=dict, blank=True, encoder=NumpyJSONEncoder)
+    # 内容地址：(原始文件内容哈希, 清洗方法, 规范化参数) 的 SHA-256，相同的清洗请求复用同一个结果文件
+    cache_key = models.CharField(max_length=64, blank=True, default='', db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['original_file', '-created_at'], name='cleaned_file_created_idx')]
     
     def __str__(self):
         return f"清洗数据 - {self.original_file.name} - {self.cleaning_method}"
@@ -54,8 +67,12 @@ class AnalysisResult(models.Model):
     cleaned_data = models.ForeignKey(CleanedData, on_delete=models.SET_NULL, null=True, blank=True, related_name='analysis_results')
     analysis_type = models.CharField(max_length=50, choices=ANALYSIS_TYPES)
     parameters = models.JSONField(default=dict)
-    result = models.JSONField(default=dict)
+    # 分析结果可以直接包含 NumPy 数组和标量，保存时由 NumpyJSONEncoder 转换
+    result = models.JSONField(default=dict, encoder=NumpyJSONEncoder)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['data_file', '-created_at'], name='analysis_file_created_idx')]
     
     def __str__(self):
         return f"{self.get_analysis_type_display()} - {self.data_file.name}"
@@ -77,6 +94,82 @@ class VisualizationResult(models.Model):
     title = models.CharField(max_length=255)
     configuration = models.JSONField(default=dict)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['data_file', '-created_at'], name='visual_file_created_idx')]
     
     def __str__(self):
         return f"{self.get_chart_type_display()} - {self.title}"
+
+# 数值列的分布摘要（分位数摘要 + 直方图），在上传/清洗时生成，供箱线图和直方图接口使用
+class DistributionSketch(models.Model):
+    data_file = models.ForeignKey(DataFile, on_delete=models.CASCADE, related_name='sketches')
+    # 为空表示原始文件的摘要，否则是该清洗结果的摘要
+    cleaned_data = models.ForeignKey(CleanedData, on_delete=models.CASCADE, null=True, blank=True, related_name='sketches')
+    column = models.CharField(max_length=255)
+    sketch = models.JSONField(default=dict, encoder=NumpyJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['data_file', 'cleaned_data', 'column'], name='sketch_source_column_idx')]
+
+    def __str__(self):
+        return f"分布摘要 - {self.data_file.name} - {self.column}"
+
+# MEDIA_ROOT 下的文件（上传文件、清洗结果、分析结果文件、缓存），由存储管理器维护大小和最近访问时间（见 api/storage.py）
+class StoredArtifact(models.Model):
+    KINDS = (
+        ('upload', '上传文件'),
+        ('cleaned', '清洗结果'),
+        ('analysis', '分析结果文件'),
+        ('cache', '缓存'),
+    )
+
+    # 相对于 MEDIA_ROOT 的路径（分隔符为 /）
+    path = models.CharField(max_length=500, unique=True)
+    kind = models.CharField(max_length=20, choices=KINDS)
+    # 文件所属的用户；多个用户共用的缓存为空
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='artifacts')
+    size = models.BigIntegerField(default=0)
+    last_accessed = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'last_accessed'], name='artifact_kind_access_idx'),
+            models.Index(fields=['user', 'kind'], name='artifact_user_kind_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} - {self.path}"
+
+# 分块上传的会话：客户端按顺序上传各块，服务器边接收边解析（见 api/uploads.py），完成后创建 DataFile
+class UploadSession(models.Model):
+    STATUSES = (
+        ('open', '上传中'),
+        ('complete', '已完成'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True, default='')
+    # 正在写入的文件，完成后直接作为 DataFile 的文件
+    file = models.FileField(upload_to=get_file_path)
+    # 文件总字节数（创建会话时声明）、已接收的字节数、已解析到的位置（最后一个完整行之后）
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    parsed = models.BigIntegerField(default=0)
+    rows = models.BigIntegerField(default=0)
+    # 逐块解析的中间结果：表头长度、列统计（类型计划）、分布摘要、各块的校验和
+    state = models.JSONField(default=dict, encoder=NumpyJSONEncoder)
+    status = models.CharField(max_length=20, choices=STATUSES, default='open')
+    data_file = models.ForeignKey(DataFile, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'updated_at'], name='upload_status_updated_idx')]
+
+    def __str__(self):
+        return f"分块上传 - {self.name} - {self.received}/{self.size}"
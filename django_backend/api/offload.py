@@ -0,0 +1,104 @@
+"""
+ASGI 部署：耗时接口卸载到有界线程池
+
+ASGI 下 Django 把所有同步视图放到同一个共享线程中执行（sync_to_async(thread_sensitive=True)），
+一个慢的 preview / analyze 就会让后面所有请求排队。backend/asgi.py 启动时设置 API_ASGI_MODE，
+urls.py 用 offload_patterns 把 OFFLOADED_ROUTES 中的路由替换为异步视图：
+
+- 事件循环只负责把请求交给对应的线程池并等待结果，不被 pandas / sklearn 的计算阻塞；
+- read 池处理预览、分布、分析结果详情等读取接口，analysis 池处理分析、清洗和批量上传，
+  两个池分开限流，长时间的分析不会占满读取接口的线程；
+- 其他接口（列表、登录等）开销小，仍由共享线程执行，不会排在耗时接口后面。
+
+DRF 视图本身保持同步，认证、权限、ETag 等逻辑不变；JSON 渲染也在线程池中完成。
+NumPy / pandas / sklearn 的主要计算会释放 GIL，用线程池即可利用多核，
+不需要进程池（进程池还需要序列化请求和数据库连接）。
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern
+from django.views.decorators.csrf import csrf_exempt
+
+from .timing import stage
+
+# 路由名（DefaultRouter 生成的 {basename}-{url_name}）→ 线程池
+OFFLOADED_ROUTES = {
+    'datafile-preview': 'read',
+    'datafile-distribution': 'read',
+    'analysisresult-detail': 'read',
+    'cleaneddata-detail': 'read',
+    'datafile-bulk-upload': 'analysis',
+    'cleaneddata-clean-data': 'analysis',
+    'analysisresult-analyze': 'analysis',
+    'analysisresult-promote': 'analysis',
+    # 分块上传的每一块都要解析
+    'upload-detail': 'analysis',
+    'upload-finalize': 'analysis',
+}
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def pool_size(pool):
+    """
+    线程数：settings.ASGI_{POOL}_WORKERS，默认读取接口为 CPU 核数 + 2，分析接口为 CPU 核数。
+    启用准入控制（见 api/admission.py）时分析接口默认为槽位数 + 队列长度：并发由准入控制限制，
+    排队等待的请求占用的线程不会挡住其他用户已获得槽位的请求。
+    """
+    cpus = os.cpu_count() or 1
+    default = cpus + 2 if pool == 'read' else cpus
+    if pool == 'analysis' and getattr(settings, 'ADMISSION_ENABLED', True):
+        from .admission import get_controller
+
+        default = get_controller().slots + getattr(settings, 'ADMISSION_QUEUE', 64)
+    return max(1, getattr(settings, f'ASGI_{pool.upper()}_WORKERS', None) or default)
+
+
+def get_executor(pool):
+    with _executors_lock:
+        if pool not in _executors:
+            _executors[pool] = ThreadPoolExecutor(max_workers=pool_size(pool), thread_name_prefix=f'api-{pool}')
+        return _executors[pool]
+
+
+def _call(view, request, *args, **kwargs):
+    try:
+        response = view(request, *args, **kwargs)
+        # DRF 的 Response 在这里渲染，序列化大结果的开销也留在线程池中
+        if hasattr(response, 'render') and not response.is_rendered:
+            with stage(request, 'render'):
+                response.render()
+        return response
+    finally:
+        # 线程池中的线程不会收到 request_finished 信号，按 CONN_MAX_AGE 自行关闭数据库连接
+        close_old_connections()
+
+
+def offload(view, pool):
+    """把同步视图包装为异步视图，在 pool 线程池中执行"""
+    @functools.wraps(view)
+    async def async_view(request, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_executor(pool), functools.partial(_call, view, request, *args, **kwargs)
+        )
+
+    # DRF 视图自己处理 CSRF（SessionAuthentication），与 APIView.as_view 一样豁免 CsrfViewMiddleware
+    return csrf_exempt(async_view)
+
+
+def offload_patterns(patterns, routes=None):
+    """把 patterns 中路由名在 routes 里的 URLPattern 替换为卸载到线程池的异步视图"""
+    routes = OFFLOADED_ROUTES if routes is None else routes
+    return [
+        URLPattern(pattern.pattern, offload(pattern.callback, routes[pattern.name]), pattern.default_args, pattern.name)
+        if isinstance(pattern, URLPattern) and pattern.name in routes else pattern
+        for pattern in patterns
+    ]
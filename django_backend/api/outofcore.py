@@ -0,0 +1,246 @@
+"""
+聚类 / 降维的外存（out-of-core）计算
+
+analyze 的 clustering 和 dimension_reduction 默认把整个特征矩阵（float64）读入内存再调用
+KMeans / PCA。开始计算前先根据文件大小估算特征矩阵的字节数，超过 ANALYSIS_MEMORY_LIMIT
+（或参数 out_of_core 为 true）时改为分块处理：
+
+- 第一遍：按块读取特征列，统计每列的均值（用于填充缺失值，与内存路径一致）和总行数；
+- 拟合：MiniBatchKMeans.partial_fit / IncrementalPCA.partial_fit 逐块拟合；
+- 最后一遍：逐块预测聚类标签 / 计算主成分，写入 MEDIA_ROOT/analysis/ 下的 .npy 文件
+  （np.lib.format.open_memmap，边算边写，不在内存中保留完整结果）。
+
+分析结果中只保存前 PREVIEW_ROWS 行的标签/主成分作为预览，完整结果通过 *_file 中的 URL 下载。
+
+progress 回调在统计和拟合阶段每处理一块调用一次（参数为 0~1 的完成比例），可以在其中抛出异常取消计算；
+开始写结果文件之后不再调用，取消不会留下写了一半的 .npy 文件。
+"""
+import os
+import uuid
+
+import numpy as np
+from django.conf import settings
+
+from .formats import row_count
+from .loading import export_frame, iter_frames, read_frame
+
+# 默认的内存阈值：估算的特征矩阵超过该字节数时使用外存路径
+DEFAULT_MEMORY_LIMIT = 512 * 1024 * 1024
+# 每块读取的行数上限；实际块大小还受 CHUNK_BYTES 限制
+DEFAULT_CHUNK_ROWS = 100_000
+CHUNK_BYTES = 64 * 1024 * 1024
+# 分析结果中内联的标签/主成分行数
+PREVIEW_ROWS = 1000
+# MiniBatchKMeans 在整个文件上的拟合轮数
+KMEANS_PASSES = 2
+# 估算行数时读取的样本行数
+_ESTIMATE_ROWS = 1000
+# pandas 解析 CSV 和 astype(float) 会产生中间副本，按矩阵大小的倍数估算峰值内存
+_PARSE_OVERHEAD = 3
+
+
+def memory_limit():
+    return getattr(settings, 'ANALYSIS_MEMORY_LIMIT', DEFAULT_MEMORY_LIMIT)
+
+
+def estimate_rows(path, sample_rows=_ESTIMATE_ROWS):
+    """根据文件大小和前若干行的平均行长估算数据行数（压缩的 CSV 和列式文件返回实际行数）"""
+    rows = row_count(path)
+    if rows is not None:
+        return rows
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        lines = [line for line in (f.readline() for _ in range(sample_rows)) if line]
+    if not lines:
+        return 0
+    if len(lines) < sample_rows:
+        return len(lines)
+    return int((size - len(header)) / (sum(len(line) for line in lines) / len(lines)))
+
+
+def plan_out_of_core(path, parameters):
+    """
+    判断是否需要外存计算（只对支持分块计算的分析引擎调用）。需要时返回计划（特征列、估算的行数/字节数），否则返回 None。
+
+    特征列取请求中存在于文件的列；未指定时取前几行中前 5 个数值列（不含 DATE、MONTH）。
+    找不到数值特征时返回 None，由内存路径给出错误信息。
+    """
+    force = parameters.get('out_of_core')
+    if force is False:
+        return None
+
+    head = read_frame(path, nrows=_ESTIMATE_ROWS)
+    features = [f for f in parameters.get('features', []) if f in head.columns]
+    if not features:
+        features = [
+            col for col in head.select_dtypes(include=[np.number]).columns
+            if col not in ('DATE', 'MONTH')
+        ][:5]
+    if not features:
+        return None
+
+    rows = estimate_rows(path)
+    matrix_bytes = rows * len(features) * np.dtype(np.float64).itemsize
+    limit = memory_limit()
+    if not force and matrix_bytes * _PARSE_OVERHEAD <= limit:
+        return None
+    return {
+        'features': features,
+        'estimated_rows': rows,
+        'estimated_matrix_bytes': matrix_bytes,
+        'memory_limit': limit,
+    }
+
+
+def chunk_rows(n_features, minimum=1):
+    """每块的行数：不超过 DEFAULT_CHUNK_ROWS，且一块特征矩阵不超过 CHUNK_BYTES"""
+    limit = getattr(settings, 'ANALYSIS_CHUNK_ROWS', DEFAULT_CHUNK_ROWS)
+    return max(minimum, min(limit, CHUNK_BYTES // (n_features * 8)))
+
+
+def iter_chunks(path, features, rows, means=None):
+    """按块读取特征列（按列类型计划解析后还原为原始数值），返回 float64 矩阵；给出 means 时用它填充缺失值和无穷值"""
+    for chunk in iter_frames(path, rows, usecols=features):
+        X = export_frame(chunk[features]).to_numpy(dtype=np.float64)
+        if means is not None:
+            bad = ~np.isfinite(X)
+            if bad.any():
+                X[bad] = np.take(means, np.nonzero(bad)[1])
+        yield X
+
+
+def column_means(path, features, rows):
+    """第一遍：各列有限值的均值和总行数"""
+    total = np.zeros(len(features))
+    count = np.zeros(len(features))
+    n_rows = 0
+    for X in iter_chunks(path, features, rows):
+        finite = np.isfinite(X)
+        total += np.where(finite, X, 0).sum(axis=0)
+        count += finite.sum(axis=0)
+        n_rows += len(X)
+    means = np.divide(total, count, out=np.zeros_like(total), where=count > 0)
+    return means, n_rows
+
+
+def _output_path(data_file, suffix):
+    """结果文件的 (绝对路径, 相对于 MEDIA_ROOT 的路径)"""
+    relative = os.path.join('analysis', str(data_file.id), f'{uuid.uuid4().hex}_{suffix}.npy')
+    absolute = os.path.join(settings.MEDIA_ROOT, relative)
+    os.makedirs(os.path.dirname(absolute), exist_ok=True)
+    return absolute, relative
+
+
+def _file_info(relative, shape, dtype):
+    return {
+        'path': relative,
+        'url': settings.MEDIA_URL + relative.replace(os.sep, '/'),
+        'shape': list(shape),
+        'dtype': str(np.dtype(dtype)),
+        'format': 'npy',
+    }
+
+
+def run_clustering(path, data_file, features, n_clusters, stage=None, progress=None):
+    """MiniBatchKMeans 分块拟合，标签逐块写入 .npy 文件"""
+    from sklearn.cluster import MiniBatchKMeans
+
+    stage = stage or (lambda name: None)
+    progress = progress or (lambda fraction, **detail: None)
+    rows = chunk_rows(len(features), minimum=n_clusters)
+    means, n_rows = column_means(path, features, rows)
+    stage('scan')
+
+    # 统计一遍 + 拟合 KMEANS_PASSES 遍，按读取的块数计算进度
+    total_chunks = max(1, -(-n_rows // rows)) * (KMEANS_PASSES + 1)
+    progress(1 / (KMEANS_PASSES + 1), chunks=0)
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, n_init=3)
+    n_chunks = 0
+    done = total_chunks // (KMEANS_PASSES + 1)
+    for _ in range(KMEANS_PASSES):
+        for X in iter_chunks(path, features, rows, means):
+            if len(X) >= n_clusters:
+                kmeans.partial_fit(X)
+                n_chunks += 1
+            done += 1
+            progress(done / total_chunks, chunks=n_chunks)
+    stage('fit')
+
+    absolute, relative = _output_path(data_file, 'clusters')
+    labels = np.lib.format.open_memmap(absolute, mode='w+', dtype=np.int32, shape=(n_rows,))
+    counts = np.zeros(n_clusters, dtype=np.int64)
+    inertia = 0.0
+    offset = 0
+    for X in iter_chunks(path, features, rows, means):
+        chunk_labels = kmeans.predict(X)
+        labels[offset:offset + len(X)] = chunk_labels
+        counts += np.bincount(chunk_labels, minlength=n_clusters)
+        inertia += np.square(X - kmeans.cluster_centers_[chunk_labels]).sum()
+        offset += len(X)
+    labels.flush()
+    preview = np.array(labels[:PREVIEW_ROWS])
+    del labels
+    stage('predict')
+
+    return {
+        'clusters': preview,
+        'centers': kmeans.cluster_centers_,
+        'clusterCounts': counts,
+        'feature_names': features,
+        'inertia': inertia,
+        'clusters_file': _file_info(relative, (n_rows,), np.int32),
+        'out_of_core': {'rows': n_rows, 'chunk_rows': rows, 'partial_fits': n_chunks, 'preview_rows': len(preview)},
+    }
+
+
+def run_pca(path, data_file, features, n_components, stage=None, progress=None):
+    """IncrementalPCA 分块拟合，主成分逐块写入 .npy 文件"""
+    from sklearn.decomposition import IncrementalPCA
+
+    stage = stage or (lambda name: None)
+    progress = progress or (lambda fraction, **detail: None)
+    rows = chunk_rows(len(features), minimum=n_components)
+    means, n_rows = column_means(path, features, rows)
+    stage('scan')
+
+    # 统计一遍 + 拟合一遍
+    file_chunks = max(1, -(-n_rows // rows))
+    progress(0.5, chunks=0)
+    pca = IncrementalPCA(n_components=n_components)
+    n_chunks = 0
+    pending = None
+    for i, X in enumerate(iter_chunks(path, features, rows, means)):
+        # 每块开始前报告已完成的块数
+        progress(0.5 + 0.5 * i / file_chunks, chunks=n_chunks)
+        # partial_fit 要求每块至少 n_components 行：过短的块并入下一块，最后剩下的过短尾块不参与拟合（仍会计算主成分）
+        if pending is not None:
+            X = np.vstack((pending, X))
+            pending = None
+        if len(X) < n_components:
+            pending = X
+            continue
+        pca.partial_fit(X)
+        n_chunks += 1
+    if pending is not None and n_chunks == 0:
+        raise ValueError(f'数据行数少于主成分数量 {n_components}')
+    stage('fit')
+
+    absolute, relative = _output_path(data_file, 'components')
+    components = np.lib.format.open_memmap(absolute, mode='w+', dtype=np.float64, shape=(n_rows, n_components))
+    offset = 0
+    for X in iter_chunks(path, features, rows, means):
+        components[offset:offset + len(X)] = pca.transform(X)
+        offset += len(X)
+    components.flush()
+    preview = np.array(components[:PREVIEW_ROWS])
+    del components
+    stage('transform')
+
+    return {
+        'components': preview,
+        'explained_variance_ratio': pca.explained_variance_ratio_,
+        'feature_names': features,
+        'components_file': _file_info(relative, (n_rows, n_components), np.float64),
+        'out_of_core': {'rows': n_rows, 'chunk_rows': rows, 'partial_fits': n_chunks, 'preview_rows': len(preview)},
+    }
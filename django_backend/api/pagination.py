@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    按创建时间倒序的游标分页。
+
+    游标分页只按 created_at 定位下一页，翻页成本与总记录数无关；
+    客户端可通过 page_size 参数调整每页条数（最多 max_page_size 条）。
+    """
+    ordering = '-created_at'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,380 @@
+"""
+长时间运行的 analyze / clean_data 的进度事件（Server-Sent Events）
+
+analyze 和 clean_data 加上查询参数 progress 后在后台线程池中运行（进程内任务表，不依赖外部消息队列）：
+- ?progress=stream：响应为 text/event-stream，边运行边推送进度，结束时推送结果；
+  客户端断开连接时任务被取消。
+- ?progress=job：立即返回 202 和任务信息，之后通过 /api/jobs/{id}/events/ 订阅进度
+  （支持 Last-Event-ID 断点续传），/api/jobs/{id}/cancel/ 取消，/api/jobs/{id}/ 查询状态和结果。
+
+两种方式都先经过准入控制（见 api/admission.py）：队列已满时返回 429，获得槽位后任务才开始运行。
+
+事件格式（data 均为 JSON）：
+- progress：{stage, progress, ...}，stage 为 loading / feature_prep / fitting / cleaning / persisting，
+  progress 为 0~1 的整体进度；fitting 阶段带有已完成的树数 / 迭代次数等细节；
+- result：任务结束，{status, data}，与不带 progress 参数时的 HTTP 状态码和响应体相同；
+- cancelled：任务已取消。
+
+取消是协作式的：视图在各阶段之间、随机森林每拟合一批树、梯度提升每完成一批迭代、分块计算每处理一块时调用 report_progress，
+任务已取消时在这些检查点抛出 JobCancelled 结束计算，不再占用 CPU。
+"""
+import asyncio
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import exception_handler
+
+from .admission import admission_ticket, get_controller, run_admitted
+from .renderers import dumps
+
+PROGRESS_MODES = ('stream', 'job')
+# 同时运行的任务数；其余任务排队等待
+DEFAULT_WORKERS = 2
+# 结束的任务在任务表中保留的秒数，之后不能再查询结果
+JOB_TTL = 600
+# 没有新事件时发送注释行的间隔，既防止代理断开空闲连接，也能及时发现客户端已断开
+HEARTBEAT_SECONDS = 15
+# ASGI 下异步事件流检查新事件的间隔
+POLL_SECONDS = 0.2
+# 同一阶段内进度变化小于该值时不推送事件
+MIN_PROGRESS_STEP = 0.01
+# 随机森林每批拟合的树数
+FOREST_BATCH = 10
+# 梯度提升每批拟合的迭代次数
+BOOSTING_BATCH = 20
+
+FINISHED_STATES = ('succeeded', 'failed', 'cancelled')
+
+
+class JobCancelled(BaseException):
+    """
+    任务已被取消。
+
+    继承 BaseException 而不是 Exception，使视图中的 except Exception 不会把取消当作普通错误返回 400。
+    """
+
+
+class Job:
+    """一个后台任务：状态、当前阶段、进度和按顺序编号的事件列表"""
+
+    def __init__(self, user_id, kind):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.kind = kind
+        self.state = 'pending'
+        self.stage = 'queued'
+        self.progress = 0.0
+        self.created = time.time()
+        self.finished = None
+        self.result = None
+        # 准入控制的排队凭证（见 api/admission.py），获得槽位后才提交到线程池
+        self.ticket = None
+        self.events = []
+        self._cancel = threading.Event()
+        self._condition = threading.Condition()
+
+    @property
+    def done(self):
+        return self.state in FINISHED_STATES
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def _emit(self, event, data):
+        # 调用方持有 self._condition
+        self.events.append((len(self.events) + 1, event, data))
+        self._condition.notify_all()
+
+    def report(self, stage, fraction=None, **detail):
+        """更新阶段和进度；任务已被取消时抛出 JobCancelled"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        with self._condition:
+            previous = self.progress
+            if fraction is not None:
+                self.progress = max(self.progress, min(float(fraction), 1.0))
+            if stage == self.stage and self.progress - previous < MIN_PROGRESS_STEP:
+                return
+            self.stage = stage
+            self._emit('progress', {'stage': stage, 'progress': round(self.progress, 4), **detail})
+
+    def finish(self, state, result=None):
+        with self._condition:
+            self.state = state
+            self.result = result
+            self.finished = time.time()
+            if state == 'cancelled':
+                self._emit('cancelled', {'stage': self.stage, 'progress': round(self.progress, 4)})
+            else:
+                if state == 'succeeded':
+                    self.progress = 1.0
+                self._emit('result', result)
+
+    def cancel(self):
+        """请求取消。排队中的任务不会开始运行（还在准入队列中时立即结束），运行中的任务在下一个检查点结束"""
+        self._cancel.set()
+        if self.ticket is not None and self.ticket.cancel():
+            self.finish('cancelled')
+
+    def wait(self, after, timeout):
+        """等待编号大于 after 的事件，返回 (新事件列表, 是否已结束)"""
+        with self._condition:
+            self._condition.wait_for(lambda: len(self.events) > after or self.done, timeout)
+            return self.events[after:], self.done
+
+    def snapshot(self):
+        data = {
+            'id': self.id,
+            'kind': self.kind,
+            'state': self.state,
+            'stage': self.stage,
+            'progress': round(self.progress, 4),
+            'cancel_requested': self.cancel_requested,
+            'events': len(self.events),
+            'created': self.created,
+            'finished': self.finished,
+        }
+        if self.done and self.result is not None:
+            data['result'] = self.result
+        return data
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    with _jobs_lock:
+        if _executor is None:
+            # 任务获得准入槽位后才提交，线程数不少于槽位数，获得槽位的任务不会再排队
+            workers = getattr(settings, 'PROGRESS_JOB_WORKERS', DEFAULT_WORKERS)
+            if getattr(settings, 'ADMISSION_ENABLED', True):
+                workers = max(workers, get_controller().slots)
+            _executor = ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix='progress-job',
+            )
+        return _executor
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def _purge(now):
+    # 调用方持有 _jobs_lock
+    expired = [job_id for job_id, job in _jobs.items() if job.done and now - job.finished > JOB_TTL]
+    for job_id in expired:
+        del _jobs[job_id]
+
+
+def _run(job, func, ticket=None):
+    if job.cancel_requested:
+        job.finish('cancelled')
+        if ticket is not None:
+            ticket.release()
+        return
+    job.state = 'running'
+    try:
+        response = func()
+        job.finish(
+            'succeeded' if response.status_code < 400 else 'failed',
+            {'status': response.status_code, 'data': response.data},
+        )
+    except JobCancelled:
+        job.finish('cancelled')
+    except Exception as e:
+        # get_object_or_404 的 Http404、权限错误等按 DRF 的方式转换为响应，其他异常作为 500
+        response = exception_handler(e, {})
+        if response is None:
+            traceback.print_exc()
+            job.finish('failed', {'status': status.HTTP_500_INTERNAL_SERVER_ERROR, 'data': {'error': str(e)}})
+        else:
+            job.finish('failed', {'status': response.status_code, 'data': response.data})
+    finally:
+        if ticket is not None:
+            ticket.release()
+        # 工作线程有自己的数据库连接，任务结束后关闭
+        connections.close_all()
+
+
+def submit(request, kind, func):
+    """
+    创建任务，获得准入槽位后提交到线程池；func 在工作线程中运行，返回 DRF Response。
+    返回 (任务, None)；准入队列已满时返回 (None, 429 响应)。
+    """
+    # 请求体在返回响应前解析完，工作线程中的 request.data 不再读取输入流
+    request.data
+    job = Job(request.user.id, kind)
+    request.progress_job = job
+
+    def start(ticket):
+        _get_executor().submit(_run, job, func, ticket)
+
+    ticket, rejected = admission_ticket(request, kind, callback=start)
+    if rejected is not None:
+        return None, rejected
+    with _jobs_lock:
+        _purge(time.time())
+        _jobs[job.id] = job
+    job.ticket = ticket
+    if ticket is None:
+        _get_executor().submit(_run, job, func)
+    return job, None
+
+
+def report_progress(request, stage, fraction=None, **detail):
+    """视图中的进度检查点：没有关联任务时什么也不做；任务已取消时抛出 JobCancelled"""
+    job = getattr(request, 'progress_job', None)
+    if job is not None:
+        job.report(stage, fraction, **detail)
+
+
+def progress_callback(request, stage, start, end):
+    """返回 callback(done_fraction, **detail)，把子过程的进度映射到整体进度 [start, end]"""
+    def callback(fraction, **detail):
+        report_progress(request, stage, start + (end - start) * fraction, **detail)
+    return callback
+
+
+def fit_forest(request, model, X, y, start, end, batch=FOREST_BATCH):
+    """
+    拟合随机森林。有关联任务时用 warm_start 每次增加 batch 棵树，每批之后报告进度并检查取消。
+
+    sklearn 为每棵树预先生成随机种子，分批拟合的结果与一次拟合 n_estimators 棵树相同。
+    """
+    if getattr(request, 'progress_job', None) is None:
+        return model.fit(X, y)
+    total = model.n_estimators
+    model.set_params(warm_start=True)
+    for n_trees in range(min(batch, total), total + batch, batch):
+        n_trees = min(n_trees, total)
+        model.set_params(n_estimators=n_trees)
+        model.fit(X, y)
+        report_progress(request, 'fitting', start + (end - start) * n_trees / total, trees=n_trees, total_trees=total)
+        if n_trees == total:
+            break
+    model.set_params(warm_start=False)
+    return model
+
+
+def fit_boosting(request, model, X, y, start, end, batch=BOOSTING_BATCH):
+    """
+    拟合 HistGradientBoosting。有关联任务时用 warm_start 每次增加 batch 轮迭代，每批之后报告进度并检查取消；
+    早停（本批实际迭代次数不足）时结束。
+
+    warm_start 沿用第一次拟合划分的验证集和已记录的验证得分，分批拟合的结果与一次拟合相同。
+    """
+    if getattr(request, 'progress_job', None) is None:
+        return model.fit(X, y)
+    total = model.max_iter
+    model.set_params(warm_start=True)
+    for n_iter in range(min(batch, total), total + batch, batch):
+        n_iter = min(n_iter, total)
+        model.set_params(max_iter=n_iter)
+        model.fit(X, y)
+        report_progress(request, 'fitting', start + (end - start) * n_iter / total, iterations=model.n_iter_, max_iterations=total)
+        if n_iter == total or model.n_iter_ < n_iter:
+            break
+    model.set_params(warm_start=False, max_iter=total)
+    return model
+
+
+def format_event(seq, event, data):
+    return b'id: %d\nevent: %s\ndata: %s\n\n' % (seq, event.encode('ascii'), dumps(data))
+
+
+def event_stream(job, last_event_id=0, cancel_on_close=False):
+    """生成 SSE 字节流，直到任务结束；cancel_on_close 时客户端断开连接（生成器被关闭）会取消任务"""
+    sent = last_event_id
+    try:
+        yield b'retry: 3000\n\n'
+        while True:
+            events, done = job.wait(sent, HEARTBEAT_SECONDS)
+            for seq, event, data in events:
+                yield format_event(seq, event, data)
+                sent = seq
+            if done and sent >= len(job.events):
+                return
+            if not events:
+                yield b': keep-alive\n\n'
+    finally:
+        if cancel_on_close and not job.done:
+            job.cancel()
+
+
+async def async_event_stream(job, last_event_id=0, cancel_on_close=False):
+    """
+    event_stream 的异步版本，ASGI 部署时使用（ASGI 下同步迭代器会被整个读完后才发送）。
+
+    轮询任务的事件列表而不是在线程中阻塞等待，订阅者再多也不占用线程；
+    客户端断开时 Django 取消发送任务，生成器在 await 处收到 CancelledError。
+    """
+    sent = last_event_id
+    idle = 0.0
+    try:
+        yield b'retry: 3000\n\n'
+        while True:
+            events, done = job.wait(sent, 0)
+            for seq, event, data in events:
+                yield format_event(seq, event, data)
+                sent = seq
+            if done and sent >= len(job.events):
+                return
+            if events:
+                idle = 0.0
+                continue
+            await asyncio.sleep(POLL_SECONDS)
+            idle += POLL_SECONDS
+            if idle >= HEARTBEAT_SECONDS:
+                idle = 0.0
+                yield b': keep-alive\n\n'
+    finally:
+        if cancel_on_close and not job.done:
+            job.cancel()
+
+
+def event_response(job, last_event_id=0, cancel_on_close=False):
+    stream = async_event_stream if getattr(settings, 'API_ASGI_MODE', False) else event_stream
+    response = StreamingHttpResponse(
+        stream(job, last_event_id, cancel_on_close),
+        content_type='text/event-stream; charset=utf-8',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # 关闭 nginx 等反向代理的响应缓冲，事件才能及时送达
+    response['X-Accel-Buffering'] = 'no'
+    response['X-Job-Id'] = job.id
+    return response
+
+
+def run_with_progress(request, kind, func):
+    """
+    按查询参数 progress 运行 func：未指定时直接在当前请求中运行并返回其响应；
+    stream 返回进度事件流；job 返回 202 和任务信息。
+    """
+    mode = request.query_params.get('progress')
+    if not mode:
+        return run_admitted(request, kind, func)
+    if mode not in PROGRESS_MODES:
+        return Response(
+            {'error': f'不支持的 progress 参数: {mode}，可选：{", ".join(PROGRESS_MODES)}'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    job, rejected = submit(request, kind, func)
+    if rejected is not None:
+        return rejected
+    if mode == 'stream':
+        return event_response(job, cancel_on_close=True)
+    return Response(job.snapshot(), status=status.HTTP_202_ACCEPTED)
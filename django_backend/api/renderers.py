@@ -0,0 +1,155 @@
+"""
+支持 NumPy / pandas 的 JSON 序列化
+
+- NumpyJSONRenderer：项目默认的 DRF 渲染器。安装了 orjson 时直接序列化 NumPy 数组和标量
+  （快速路径），否则退回到标准库 json + NumpyJSONEncoder。
+- NumpyJSONEncoder：json.JSONEncoder 子类，供模型的 JSONField 使用，
+  使视图可以把 NumPy 数组直接放进分析结果，而不必先 .tolist()。
+
+两条路径的输出一致：NaN / inf 输出为 null，pandas Timestamp 输出为 ISO 8601 字符串。
+
+NumPy 和 pandas 只在已被导入时才会被识别（检查 sys.modules），
+因此登录等不涉及数据处理的请求不会因为这个模块而加载它们。
+"""
+import json
+import math
+import sys
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # orjson 是可选依赖
+    orjson = None
+
+_ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+# orjson 可以直接序列化的 NumPy 数组类型：布尔、整数、无符号整数、浮点
+_NATIVE_ARRAY_KINDS = 'biuf'
+# 其中 orjson 支持的浮点位宽（字节），float16 / longdouble 转换为 float64
+_NATIVE_FLOAT_SIZES = (4, 8)
+
+_drf_encoder = encoders.JSONEncoder()
+
+
+def _to_builtin(obj):
+    """
+    把 orjson / json 不能直接处理的对象转换成可序列化的对象。
+
+    返回值可能仍是 NumPy 数组（例如非连续数组被转成连续数组），由调用方再次序列化。
+    """
+    np = sys.modules.get('numpy')
+    pd = sys.modules.get('pandas')
+
+    if np is not None:
+        if isinstance(obj, np.ndarray):
+            if obj.dtype.kind == 'f' and obj.dtype.itemsize not in _NATIVE_FLOAT_SIZES:
+                # 与标准库路径（tolist 得到 Python float）的输出一致
+                return obj.astype(np.float64)
+            if obj.dtype.kind in _NATIVE_ARRAY_KINDS:
+                return np.ascontiguousarray(obj)
+            if obj.dtype.kind == 'M':
+                # 与 orjson 对 datetime64 的输出保持一致：精确到秒的 ISO 8601，NaT 输出为 null
+                strings = np.datetime_as_string(obj, unit='s')
+                return np.where(strings == 'NaT', None, strings).tolist()
+            return obj.tolist()
+        if isinstance(obj, np.generic):
+            return obj.item()
+
+    if pd is not None:
+        if obj is pd.NaT:
+            return None
+        if isinstance(obj, pd.Timestamp):
+            return obj.isoformat()
+        if isinstance(obj, (pd.Series, pd.Index)):
+            return obj.to_numpy()
+        if isinstance(obj, pd.DataFrame):
+            return {str(col): obj[col].to_numpy() for col in obj.columns}
+
+    # 其他类型（Decimal、UUID、延迟翻译字符串、timedelta 等）交给 DRF 的编码器
+    return _drf_encoder.default(obj)
+
+
+def _sanitize(obj):
+    """慢速路径：递归地把 NumPy/pandas 对象转换为内置类型，并把 NaN/inf 替换为 None"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, (str, int, bool)) or obj is None:
+        return obj
+    if isinstance(obj, dict):
+        return {key: _sanitize(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_sanitize(value) for value in obj]
+
+    np = sys.modules.get('numpy')
+    if np is not None and isinstance(obj, np.ndarray) and obj.dtype.kind in _NATIVE_ARRAY_KINDS:
+        return _sanitize(obj.tolist())
+    try:
+        converted = _to_builtin(obj)
+    except TypeError:
+        return obj
+    return _sanitize(converted)
+
+
+class NumpyJSONEncoder(encoders.JSONEncoder):
+    """
+    识别 NumPy/pandas 类型、把 NaN/inf 输出为 null 的 JSON 编码器。
+
+    可用于 models.JSONField(encoder=NumpyJSONEncoder)，保证数据库中保存的是严格 JSON。
+    """
+
+    def encode(self, o):
+        return super().encode(_sanitize(o))
+
+    def default(self, obj):
+        return _sanitize(_to_builtin(obj))
+
+
+def dumps(data):
+    """把数据序列化为 UTF-8 编码的 JSON bytes（可用于非 DRF 响应，如流式输出）"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_to_builtin, option=_ORJSON_OPTIONS)
+    return json.dumps(data, cls=NumpyJSONEncoder, ensure_ascii=False, allow_nan=False).encode('utf-8')
+
+
+class NumpyJSONRenderer(JSONRenderer):
+    """
+    项目默认的 JSON 渲染器。
+
+    视图可以直接在响应中返回 NumPy 数组、NumPy 标量和 pandas Timestamp。
+    客户端要求 indent 不为 2 的缩进格式时（orjson 只支持 2 格缩进）使用标准库 json。
+    """
+    encoder_class = NumpyJSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+
+        if orjson is not None and indent in (None, 2):
+            option = _ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0)
+            return orjson.dumps(data, default=_to_builtin, option=option)
+
+        # 标准库路径：NumpyJSONEncoder.encode 会先转换 NumPy 对象并把 NaN/inf 替换为 None
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    text/event-stream 渲染器。
+
+    进度事件流（api/progress.py）本身是 StreamingHttpResponse，不经过渲染器；
+    注册这个渲染器是为了让 EventSource（Accept: text/event-stream）的请求通过内容协商，
+    出错时（404、403 等）把错误信息渲染为一个 error 事件。
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return b'event: error\ndata: %s\n\n' % dumps(data)
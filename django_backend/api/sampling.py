@@ -0,0 +1,280 @@
+"""
+探索性分析的抽样模式
+
+analyze 的 parameters 中带有 sample 时，模型只在一个固定大小的样本上拟合，
+拟合耗时不再随文件行数增长；结果中附带样本信息和指标的 bootstrap 置信区间，
+之后可以通过 analysisresults/{id}/promote/ 用全量数据重新运行。
+
+sample 参数：
+    true                    使用默认设置
+    5000                    只指定样本大小
+    {"size": 5000,          样本大小（默认 DEFAULT_SAMPLE_SIZE）
+     "method": "stratified",  stratified（分层，默认）或 reservoir（蓄水池）
+     "stratify_by": "MONTH",  分层列，默认分类分析用目标列，其余用 MONTH
+     "seed": 42,
+     "n_bootstrap": 200}     bootstrap 重抽样次数，0 表示不计算置信区间
+
+两种方法都按块读取 CSV（内存占用与样本大小相关，与文件大小无关）：
+- reservoir：整个文件上的蓄水池抽样（Algorithm R），每行被选中的概率相同；
+- stratified：每个分层各自做蓄水池抽样，读完后按各层的行数比例分配样本量。
+  分层列不存在时退回到 reservoir。
+"""
+import numpy as np
+import pandas as pd
+
+from .formats import read_columns
+from .loading import iter_frames
+
+SAMPLE_METHODS = ('stratified', 'reservoir')
+DEFAULT_SAMPLE_SIZE = 5000
+MIN_SAMPLE_SIZE = 100
+DEFAULT_BOOTSTRAP = 200
+MAX_BOOTSTRAP = 2000
+# 置信水平
+CONFIDENCE = 0.95
+# 按块读取 CSV 时每块的行数
+CHUNK_SIZE = 50000
+# 分层列最多允许的取值个数（每层都要保留一个蓄水池）
+MAX_STRATA = 100
+
+
+def sample_options(value, analysis_type, target=None):
+    """
+    解析 parameters['sample']，未启用抽样时返回 None。
+    参数不合法时抛出 ValueError。
+    """
+    if value is None or value is False:
+        return None
+    if value is True:
+        value = {}
+    elif isinstance(value, (int, str)):
+        value = {'size': value}
+    elif not isinstance(value, dict):
+        raise ValueError('sample 参数必须是布尔值、整数或对象')
+
+    try:
+        size = int(value.get('size', DEFAULT_SAMPLE_SIZE))
+        seed = int(value.get('seed', 42))
+        n_bootstrap = int(value.get('n_bootstrap', DEFAULT_BOOTSTRAP))
+    except (TypeError, ValueError):
+        raise ValueError('sample 的 size、seed、n_bootstrap 必须是整数')
+    if size < MIN_SAMPLE_SIZE:
+        raise ValueError(f'样本大小不能小于 {MIN_SAMPLE_SIZE}')
+    if not 0 <= n_bootstrap <= MAX_BOOTSTRAP:
+        raise ValueError(f'n_bootstrap 必须在 0 到 {MAX_BOOTSTRAP} 之间')
+
+    method = value.get('method', 'stratified')
+    if method not in SAMPLE_METHODS:
+        raise ValueError(f'不支持的抽样方法: {method}，可选：{", ".join(SAMPLE_METHODS)}')
+
+    stratify_by = None
+    if method == 'stratified':
+        stratify_by = value.get('stratify_by') or (target if analysis_type == 'classification' and target else 'MONTH')
+
+    return {
+        'size': size,
+        'method': method,
+        'stratify_by': stratify_by,
+        'seed': seed,
+        'n_bootstrap': n_bootstrap,
+    }
+
+
+class _Reservoir:
+    """按块更新的蓄水池抽样；样本行保留原文件中的行号作为索引"""
+
+    def __init__(self, size, rng):
+        self.size = size
+        self.rng = rng
+        self.seen = 0
+        self.frame = None
+
+    def add(self, chunk):
+        n = len(chunk)
+        if n == 0:
+            return
+        if self.frame is None:
+            self.frame = chunk.iloc[:0]
+
+        # 蓄水池未满的部分直接放入
+        fill = min(max(self.size - len(self.frame), 0), n)
+        if fill:
+            self.frame = pd.concat([self.frame, chunk.iloc[:fill]])
+        rest = chunk.iloc[fill:]
+
+        if len(rest):
+            # 第 i 行（从 0 开始计数）以 size / (i + 1) 的概率替换蓄水池中随机的一个位置。
+            # 同一位置被块内多行选中时保留最后一行，与逐行处理的结果一致。
+            positions = self.seen + fill + np.arange(len(rest))
+            slots = self.rng.integers(0, positions + 1)
+            chosen = np.flatnonzero(slots < self.size)
+            if len(chosen):
+                slots = slots[chosen]
+                _, last = np.unique(slots[::-1], return_index=True)
+                keep = chosen[::-1][last]
+                slot_rows = np.arange(len(self.frame))
+                slot_rows[slots[::-1][last]] = len(self.frame) + np.arange(len(keep))
+                self.frame = pd.concat([self.frame, rest.iloc[keep]]).iloc[slot_rows]
+
+        self.seen += n
+
+    def result(self):
+        return self.frame.sort_index() if self.frame is not None else None
+
+
+def _read_chunks(path, chunksize):
+    start = 0
+    for chunk in iter_frames(path, chunksize):
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        yield chunk
+
+
+def _allocate(counts, size):
+    """按比例（最大余数法）把 size 分配到各层，每层不超过该层的行数"""
+    counts = np.asarray(counts, dtype=np.float64)
+    quota = counts / counts.sum() * size
+    alloc = np.minimum(np.floor(quota), counts).astype(np.int64)
+    remainder = size - alloc.sum()
+    for index in np.argsort(-(quota - np.floor(quota)), kind='stable'):
+        if remainder <= 0:
+            break
+        if alloc[index] < counts[index]:
+            alloc[index] += 1
+            remainder -= 1
+    return alloc
+
+
+def _sample_chunks(chunks, columns, size, method, stratify_by, seed):
+    """对按顺序给出的数据块（索引为原始行号）抽样，返回 (样本 DataFrame, 样本信息)"""
+    rng = np.random.default_rng(seed)
+    if method == 'stratified' and stratify_by not in columns:
+        method = 'reservoir'
+
+    info = {'method': method, 'requested_size': size, 'seed': seed}
+    if method == 'reservoir':
+        reservoir = _Reservoir(size, rng)
+        for chunk in chunks:
+            reservoir.add(chunk)
+        sample = reservoir.result()
+        population = reservoir.seen
+    else:
+        info['stratify_by'] = stratify_by
+        # 每层最多需要 size 行，各层的蓄水池容量都取 size
+        reservoirs = {}
+        for chunk in chunks:
+            keys = chunk[stratify_by].astype(str).where(chunk[stratify_by].notna(), '')
+            for key, group in chunk.groupby(keys, sort=False):
+                reservoirs.setdefault(key, _Reservoir(size, rng)).add(group)
+            if len(reservoirs) > MAX_STRATA:
+                raise ValueError(f'分层列 {stratify_by} 的取值超过 {MAX_STRATA} 个，请改用 reservoir 抽样')
+        keys = sorted(reservoirs)
+        counts = [reservoirs[key].seen for key in keys]
+        population = int(sum(counts))
+        alloc = _allocate(counts, min(size, population))
+        parts = []
+        for key, n in zip(keys, alloc):
+            frame = reservoirs[key].result()
+            if n < len(frame):
+                frame = frame.iloc[np.sort(rng.choice(len(frame), n, replace=False))]
+            parts.append(frame)
+        sample = pd.concat(parts).sort_index() if parts else pd.DataFrame(columns=columns)
+        info['strata'] = {key: {'population': int(count), 'sampled': int(n)} for key, count, n in zip(keys, counts, alloc)}
+
+    if sample is None:
+        sample = pd.DataFrame(columns=columns)
+    info.update({
+        'population': int(population),
+        'size': len(sample),
+        'sampled': len(sample) < population,
+        'row_index': sample.index.to_numpy(),
+    })
+    return sample.reset_index(drop=True), info
+
+
+def sample_csv(path, size, method='stratified', stratify_by='MONTH', seed=42, chunksize=CHUNK_SIZE, **_):
+    """
+    按块读取 CSV 并抽样，返回 (样本 DataFrame, 样本信息)。
+
+    样本信息中的 row_index 是样本行在原文件中的行号（从 0 开始），
+    行数不超过 size 时返回全部数据（sampled 为 False）。
+    """
+    columns = pd.Index(read_columns(path))
+    return _sample_chunks(_read_chunks(path, chunksize), columns, size, method, stratify_by, seed)
+
+
+def sample_frame(df, size, method='stratified', stratify_by='MONTH', seed=42, **_):
+    """对已在内存中的 DataFrame 抽样（例如与其他文件连接后的数据），参数和返回值同 sample_csv"""
+    df = df.reset_index(drop=True)
+    return _sample_chunks([df], df.columns, size, method, stratify_by, seed)
+
+
+def sample_report(sample_info, intervals):
+    """抽样分析结果中附加的字段；未抽样时为空"""
+    if sample_info is None:
+        return {}
+    return {'sample': sample_info, 'confidence_intervals': intervals}
+
+
+def bootstrap_interval(statistic, n, n_bootstrap, seed=42, confidence=CONFIDENCE):
+    """
+    对 n 个观测做 bootstrap：statistic(indices) 返回一个数或一维数组，
+    返回 {'estimate', 'low', 'high', 'confidence', 'n_bootstrap'}（百分位区间）。
+    """
+    estimate = np.asarray(statistic(np.arange(n)), dtype=np.float64)
+    if n_bootstrap <= 0 or n < 2:
+        return {'estimate': estimate, 'low': None, 'high': None, 'confidence': confidence, 'n_bootstrap': 0}
+    rng = np.random.default_rng(seed)
+    replicates = np.array([statistic(rng.integers(0, n, n)) for _ in range(n_bootstrap)], dtype=np.float64)
+    alpha = (1 - confidence) / 2
+    low, high = np.nanquantile(replicates, [alpha, 1 - alpha], axis=0)
+    return {'estimate': estimate, 'low': low, 'high': high, 'confidence': confidence, 'n_bootstrap': n_bootstrap}
+
+
+def regression_intervals(y_true, y_pred, n_bootstrap, seed=42):
+    """回归指标（R²、MAE、MSE）在测试集上的 bootstrap 置信区间"""
+    y_true = np.asarray(y_true, dtype=np.float64)
+    residual = y_true - np.asarray(y_pred, dtype=np.float64)
+
+    def r2(idx):
+        y = y_true[idx]
+        total = np.square(y - y.mean()).sum()
+        return 1 - np.square(residual[idx]).sum() / total if total else np.nan
+
+    return {
+        'r2': bootstrap_interval(r2, len(y_true), n_bootstrap, seed),
+        'mae': bootstrap_interval(lambda idx: np.abs(residual[idx]).mean(), len(y_true), n_bootstrap, seed),
+        'mse': bootstrap_interval(lambda idx: np.square(residual[idx]).mean(), len(y_true), n_bootstrap, seed),
+    }
+
+
+def classification_intervals(y_true, y_pred, n_bootstrap, seed=42):
+    """分类准确率在测试集上的 bootstrap 置信区间"""
+    correct = (np.asarray(y_true) == np.asarray(y_pred)).astype(np.float64)
+    return {'accuracy': bootstrap_interval(lambda idx: correct[idx].mean(), len(correct), n_bootstrap, seed)}
+
+
+def clustering_intervals(labels, n_clusters, n_bootstrap, seed=42):
+    """各聚类所占比例的 bootstrap 置信区间"""
+    labels = np.asarray(labels)
+    return {
+        'cluster_share': bootstrap_interval(
+            lambda idx: np.bincount(labels[idx], minlength=n_clusters) / len(idx),
+            len(labels), n_bootstrap, seed,
+        ),
+    }
+
+
+def pca_intervals(X, n_components, n_bootstrap, seed=42):
+    """
+    解释方差比例的 bootstrap 置信区间。
+    每次重抽样只需协方差矩阵的特征值，不必重新拟合 PCA。
+    """
+    X = np.asarray(X, dtype=np.float64)
+
+    def explained_variance_ratio(idx):
+        eigenvalues = np.linalg.eigvalsh(np.cov(X[idx], rowvar=False))[::-1]
+        total = eigenvalues.sum()
+        return eigenvalues[:n_components] / total if total else np.full(n_components, np.nan)
+
+    return {'explained_variance_ratio': bootstrap_interval(explained_variance_ratio, len(X), n_bootstrap, seed)}
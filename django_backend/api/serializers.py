@@ -38,18 +38,34 @@ class DataFileSerializer(serializers.ModelSerializer):
     class Meta:
         model = DataFile
         fields = '__all__'
-        read_only_fields = ('user',)
+        # file_type 由服务器按文件内容检测（见 api/formats.py）
+        read_only_fields = ('user', 'file_type')
 
 class CleanedDataSerializer(serializers.ModelSerializer):
     class Meta:
         model = CleanedData
         fields = '__all__'
 
+# 列表接口使用的精简序列化器：字段显式列出，以后模型新增的大字段不会自动出现在列表中
+class CleanedDataListSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CleanedData
+        fields = ('id', 'original_file', 'file', 'cleaning_method', 'parameters', 'created_at')
+
 class AnalysisResultSerializer(serializers.ModelSerializer):
     class Meta:
         model = AnalysisResult
         fields = '__all__'
 
+# 列表接口不返回 result（聚类标签、PCA 分量等可能很大），完整结果通过详情接口获取
+class AnalysisResultListSerializer(serializers.ModelSerializer):
+    analysis_type_display = serializers.CharField(source='get_analysis_type_display', read_only=True)
+
+    class Meta:
+        model = AnalysisResult
+        fields = ('id', 'data_file', 'cleaned_data', 'analysis_type', 'analysis_type_display',
+                  'parameters', 'created_at')
+
 class VisualizationResultSerializer(serializers.ModelSerializer):
     class Meta:
         model = VisualizationResult
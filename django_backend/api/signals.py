@@ -0,0 +1,46 @@
+"""
+删除记录时清理磁盘上的文件（见 api/storage.py）
+
+DataFile 的上传文件、CleanedData 的清洗结果（其他记录仍引用同一个结果文件时保留）、
+AnalysisResult 引用的分块计算结果文件、未完成的分块上传（UploadSession）已接收的数据，
+在删除记录的事务提交后删除；事务回滚时文件保持不变。
+级联删除时每条被删除的记录都会触发 post_delete。
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import AnalysisResult, CleanedData, DataFile, UploadSession
+
+
+def _release_on_commit(paths):
+    from .storage import release
+
+    paths = [path for path in paths if path]
+    if paths:
+        transaction.on_commit(partial(release, paths))
+
+
+@receiver(post_delete, sender=DataFile)
+def release_upload(sender, instance, **kwargs):
+    _release_on_commit([instance.file.name])
+
+
+@receiver(post_delete, sender=CleanedData)
+def release_cleaned(sender, instance, **kwargs):
+    _release_on_commit([instance.file.name])
+
+
+@receiver(post_delete, sender=AnalysisResult)
+def release_analysis_files(sender, instance, **kwargs):
+    from .storage import result_files
+
+    _release_on_commit(result_files(instance.result))
+
+
+@receiver(post_delete, sender=UploadSession)
+def release_partial_upload(sender, instance, **kwargs):
+    # 已完成的会话的文件属于 DataFile，release 时会跳过
+    _release_on_commit([instance.file.name])
@@ -0,0 +1,308 @@
+"""
+列分布摘要（sketch）：分位数摘要 + 固定分箱直方图
+
+在上传或清洗时对每个数值列扫描一遍，生成可合并的摘要并保存到 DistributionSketch 表，
+箱线图/直方图接口只读取摘要，计算量与分箱数相关，与数据行数无关。
+
+- TDigest：按 t-digest 的 k1 尺度把排好序的值分组成质心（两端的质心更小，尾部分位数更准），
+  可以估算任意分位数和累积分布；两个摘要合并后再压缩即可得到合并数据的摘要。
+- Histogram：在 [min, max] 上的 FINE_BINS 个等宽细分箱。请求更少的分箱时按细分箱重新分配
+  （假设细分箱内均匀分布）；合并时两个直方图都重新分配到并集范围上再相加。
+- ColumnSketch：某一列的 count / nulls / min / max / sum / sum_sq + 上面两个摘要。
+"""
+import numpy as np
+
+# t-digest 压缩参数：质心数量约为 compression / 2
+DEFAULT_COMPRESSION = 200
+# 保存的细分箱数量，也是接口允许请求的最大分箱数
+FINE_BINS = 256
+# 摘要格式版本，修改摘要结构时递增（旧摘要会被重新生成）
+SKETCH_VERSION = 1
+
+
+def _k_scale(q, compression):
+    """t-digest 的 k1 尺度函数，取值范围 [0, compression / 2]"""
+    return compression / (2 * np.pi) * np.arcsin(2 * q - 1) + compression / 4
+
+
+def _compress(means, weights, compression):
+    """把按均值排好序的 (均值, 权重) 分组压缩，返回新的质心"""
+    total = weights.sum()
+    q_mid = (np.cumsum(weights) - weights / 2) / total
+    bucket = np.floor(_k_scale(q_mid, compression)).astype(np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bucket)) + 1))
+    grouped_weights = np.add.reduceat(weights, starts)
+    grouped_means = np.add.reduceat(means * weights, starts) / grouped_weights
+    return grouped_means, grouped_weights
+
+
+class TDigest:
+    """可合并的分位数摘要"""
+
+    def __init__(self, means, weights, minimum, maximum, compression=DEFAULT_COMPRESSION):
+        self.means = np.asarray(means, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.min = float(minimum)
+        self.max = float(maximum)
+        self.compression = compression
+
+    @classmethod
+    def from_values(cls, values, compression=DEFAULT_COMPRESSION):
+        """从不含 NaN 的一维数组构建"""
+        values = np.sort(np.asarray(values, dtype=np.float64))
+        means, weights = _compress(values, np.ones(len(values)), compression)
+        return cls(means, weights, values[0], values[-1], compression)
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def merge(self, other):
+        means = np.concatenate((self.means, other.means))
+        weights = np.concatenate((self.weights, other.weights))
+        order = np.argsort(means, kind='mergesort')
+        compression = max(self.compression, other.compression)
+        means, weights = _compress(means[order], weights[order], compression)
+        return TDigest(means, weights, min(self.min, other.min), max(self.max, other.max), compression)
+
+    def _curve(self):
+        """分位数曲线上的插值点：(累积权重, 值)，两端固定为最小值和最大值"""
+        centers = np.cumsum(self.weights) - self.weights / 2
+        positions = np.concatenate(([0.0], centers, [self.count]))
+        values = np.concatenate(([self.min], self.means, [self.max]))
+        return positions, values
+
+    def quantile(self, q):
+        """估算分位数，q 可以是标量或数组"""
+        positions, values = self._curve()
+        return np.interp(np.asarray(q, dtype=np.float64) * self.count, positions, values)
+
+    def cdf(self, x):
+        """估算 P(X <= x)"""
+        positions, values = self._curve()
+        return np.interp(np.asarray(x, dtype=np.float64), values, positions) / self.count
+
+    def to_dict(self):
+        return {
+            'compression': self.compression,
+            'min': self.min,
+            'max': self.max,
+            'means': self.means,
+            'weights': self.weights,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['means'], data['weights'], data['min'], data['max'], data['compression'])
+
+
+class Histogram:
+    """[min, max] 上的等宽直方图"""
+
+    def __init__(self, edges, counts):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.asarray(counts, dtype=np.float64)
+
+    @classmethod
+    def from_values(cls, values, bins=FINE_BINS):
+        values = np.asarray(values, dtype=np.float64)
+        low, high = float(values.min()), float(values.max())
+        if low == high:
+            counts = np.zeros(bins)
+            counts[0] = len(values)
+            return cls(np.full(bins + 1, low), counts)
+        counts, edges = np.histogram(values, bins=bins, range=(low, high))
+        return cls(edges, counts)
+
+    def rebin_to(self, edges):
+        """把计数重新分配到新的分箱边界上（假设每个细分箱内均匀分布）"""
+        edges = np.asarray(edges, dtype=np.float64)
+        if self.edges[0] == self.edges[-1]:
+            # 所有值都相同：整体放入包含该值的分箱
+            counts = np.zeros(len(edges) - 1)
+            index = min(max(np.searchsorted(edges, self.edges[0], side='right') - 1, 0), len(counts) - 1)
+            counts[index] = self.counts.sum()
+            return Histogram(edges, counts)
+        cumulative = np.concatenate(([0.0], np.cumsum(self.counts)))
+        return Histogram(edges, np.diff(np.interp(edges, self.edges, cumulative)))
+
+    def rebin(self, bins):
+        """合并为 bins 个等宽分箱（bins 不超过细分箱数量时结果没有额外误差以外的损失）"""
+        return self.rebin_to(np.linspace(self.edges[0], self.edges[-1], bins + 1))
+
+    def merge(self, other):
+        low = min(self.edges[0], other.edges[0])
+        high = max(self.edges[-1], other.edges[-1])
+        bins = max(len(self.counts), len(other.counts))
+        edges = np.linspace(low, high, bins + 1)
+        return Histogram(edges, self.rebin_to(edges).counts + other.rebin_to(edges).counts)
+
+    def to_dict(self):
+        return {'edges': self.edges, 'counts': self.counts}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['edges'], data['counts'])
+
+
+class ColumnSketch:
+    """单列的分布摘要"""
+
+    def __init__(self, count, nulls, total, total_sq, digest=None, histogram=None):
+        self.count = int(count)
+        self.nulls = int(nulls)
+        self.total = float(total)
+        self.total_sq = float(total_sq)
+        self.digest = digest
+        self.histogram = histogram
+
+    @classmethod
+    def from_values(cls, values, compression=DEFAULT_COMPRESSION):
+        values = np.asarray(values, dtype=np.float64)
+        finite = values[np.isfinite(values)]
+        nulls = len(values) - len(finite)
+        if len(finite) == 0:
+            return cls(0, nulls, 0.0, 0.0)
+        return cls(
+            len(finite), nulls, finite.sum(), np.square(finite).sum(),
+            TDigest.from_values(finite, compression), Histogram.from_values(finite),
+        )
+
+    def merge(self, other):
+        """合并两段数据（例如追加的数据块）的摘要"""
+        if self.digest is None or other.digest is None:
+            digest = self.digest or other.digest
+            histogram = self.histogram or other.histogram
+        else:
+            digest = self.digest.merge(other.digest)
+            histogram = self.histogram.merge(other.histogram)
+        return ColumnSketch(
+            self.count + other.count, self.nulls + other.nulls,
+            self.total + other.total, self.total_sq + other.total_sq, digest, histogram,
+        )
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def std(self):
+        """样本标准差（与 pandas 的 std 一致，ddof=1）"""
+        if self.count < 2:
+            return None
+        variance = (self.total_sq - self.total ** 2 / self.count) / (self.count - 1)
+        return float(np.sqrt(max(variance, 0.0)))
+
+    def box(self):
+        """箱线图数据：四分位数和按 1.5 IQR 规则计算的须，以及估算的离群值比例"""
+        if self.digest is None:
+            return None
+        q1, median, q3 = self.digest.quantile([0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        low_fence, high_fence = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+        outside = self.digest.cdf(low_fence) + (1 - self.digest.cdf(high_fence))
+        return {
+            'min': self.digest.min,
+            'q1': float(q1),
+            'median': float(median),
+            'q3': float(q3),
+            'max': self.digest.max,
+            'iqr': float(iqr),
+            'whisker_low': max(self.digest.min, float(low_fence)),
+            'whisker_high': min(self.digest.max, float(high_fence)),
+            'outlier_fraction': float(max(outside, 0.0)),
+        }
+
+    def histogram_data(self, bins):
+        if self.histogram is None:
+            return None
+        histogram = self.histogram.rebin(bins)
+        # 对累积计数取整再差分，保证各分箱计数之和等于总数
+        cumulative = np.rint(np.concatenate(([0.0], np.cumsum(histogram.counts))))
+        return {'edges': histogram.edges, 'counts': np.diff(cumulative).astype(np.int64)}
+
+    def quantiles(self, qs):
+        if self.digest is None:
+            return None
+        return dict(zip((str(q) for q in qs), self.digest.quantile(qs).tolist()))
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'nulls': self.nulls,
+            'mean': self.mean,
+            'std': self.std,
+            'min': self.digest.min if self.digest else None,
+            'max': self.digest.max if self.digest else None,
+        }
+
+    def to_dict(self):
+        return {
+            'version': SKETCH_VERSION,
+            'count': self.count,
+            'nulls': self.nulls,
+            'sum': self.total,
+            'sum_sq': self.total_sq,
+            'digest': self.digest.to_dict() if self.digest else None,
+            'histogram': self.histogram.to_dict() if self.histogram else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['count'], data['nulls'], data['sum'], data['sum_sq'],
+            TDigest.from_dict(data['digest']) if data.get('digest') else None,
+            Histogram.from_dict(data['histogram']) if data.get('histogram') else None,
+        )
+
+
+def sketch_columns(df):
+    """DataFrame 中可生成摘要的列：数值列（不含布尔列）"""
+    return [col for col in df.columns if df[col].dtype.kind in 'iuf']
+
+
+def build_sketches(df):
+    """对每个数值列生成 ColumnSketch，返回 {列名: ColumnSketch}"""
+    return {str(col): ColumnSketch.from_values(df[col].to_numpy()) for col in sketch_columns(df)}
+
+
+def merge_sketches(base, addition):
+    """合并两组 {列名: ColumnSketch}（例如原有数据与追加的数据），只出现在一组中的列原样保留"""
+    merged = dict(base)
+    for column, sketch in addition.items():
+        merged[column] = merged[column].merge(sketch) if column in merged else sketch
+    return merged
+
+
+def sketch_rows(data_file, sketches, cleaned_data=None):
+    """把 {列名: ColumnSketch} 转换为未保存的 DistributionSketch 实例（用于批量写入）"""
+    from .models import DistributionSketch
+
+    return [
+        DistributionSketch(data_file=data_file, cleaned_data=cleaned_data, column=column, sketch=sketch.to_dict())
+        for column, sketch in sketches.items()
+    ]
+
+
+def save_sketches(data_file, sketches, cleaned_data=None):
+    """用新的摘要替换 DataFile（或其某个清洗结果）已保存的摘要"""
+    from django.db import transaction
+    from .models import DistributionSketch
+
+    with transaction.atomic():
+        DistributionSketch.objects.filter(data_file=data_file, cleaned_data=cleaned_data).delete()
+        DistributionSketch.objects.bulk_create(sketch_rows(data_file, sketches, cleaned_data))
+
+
+def load_sketches(data_file, cleaned_data=None, columns=None):
+    """读取已保存的摘要，返回 {列名: ColumnSketch}；columns 为 None 时读取所有列"""
+    from .models import DistributionSketch
+
+    queryset = DistributionSketch.objects.filter(data_file=data_file, cleaned_data=cleaned_data)
+    if columns is not None:
+        queryset = queryset.filter(column__in=columns)
+    return {
+        row.column: ColumnSketch.from_dict(row.sketch)
+        for row in queryset
+        if row.sketch.get('version') == SKETCH_VERSION
+    }
@@ -0,0 +1,285 @@
+"""
+磁盘存储管理：跟踪 MEDIA_ROOT 下的文件，清理孤立文件，超出容量预算时按 LRU 回收可以重新生成的文件
+
+文件按顶层目录分类（StoredArtifact.kind）：
+- upload：uploads/ 下的上传文件，属于 DataFile（分块上传未完成时属于未过期的 UploadSession，见 api/uploads.py）；
+- cleaned：cleaned/ 下的清洗结果，可以由原始文件和清洗参数重新生成（见 cleaning.restore_cleaned）；
+- analysis：analysis/{文件 ID}/ 下分块计算的结果文件（.npy），属于 AnalysisResult；
+- cache：cache/ 下的类型计划、特征得分、连接索引，随时可以重新计算。
+
+记录的维护：
+- scan 对比磁盘与 StoredArtifact 表：新文件建立记录，大小、访问时间或所属用户变化的更新，已不存在的删除记录。
+  所属用户由引用文件的记录确定；多个文件共用的清洗结果算在最早创建它的用户名下，缓存不属于任何用户；
+- 读取文件时调用 record_access 把文件的 atime 设为当前时间（不改 mtime，文件哈希的缓存以 mtime 为键），
+  不写数据库，scan 时以 atime 作为最近访问时间；
+- 删除 DataFile / CleanedData / AnalysisResult 时，不再被任何记录引用的文件在事务提交后删除（见 api/signals.py）。
+
+collect（manage.py storage_gc、管理员 POST /api/storage/，或设置了容量预算时上传 / 清洗后自动触发）依次：
+1. scan；
+2. 删除孤立文件：uploads/、cleaned/、analysis/ 下没有记录引用的文件，以及写入中断留下的 .part 临时文件，
+   都只删除超过 ORPHAN_GRACE_SECONDS 未修改的（正在写入、还没建立记录的文件不受影响）；
+3. 总大小超过 settings.STORAGE_BUDGET_BYTES 时，按最近访问时间从旧到新删除缓存和清洗结果，直到不超过预算。
+   上传文件、分析结果文件和没有缓存键（无法重新生成）的旧清洗结果不会被回收。
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.utils import timezone as django_timezone
+
+from .models import AnalysisResult, CleanedData, DataFile, StoredArtifact, UploadSession
+
+# 顶层目录 → 文件类型
+KIND_DIRECTORIES = {'uploads': 'upload', 'cleaned': 'cleaned', 'analysis': 'analysis', 'cache': 'cache'}
+# 可以重新生成、超出预算时可以回收的类型
+REGENERABLE_KINDS = ('cleaned', 'cache')
+# 分块计算的分析结果中引用结果文件的键（见 api/outofcore.py）
+RESULT_FILE_KEYS = ('clusters_file', 'components_file')
+# 孤立文件超过该时间未修改才删除
+ORPHAN_GRACE_SECONDS = 3600
+# 距上次记录的访问时间不足该秒数时不再更新 atime
+ACCESS_RESOLUTION_SECONDS = 60
+# SQLite 单条语句的参数个数有限，按批查询 / 删除
+BATCH_SIZE = 500
+
+_collect_lock = threading.Lock()
+_last_collect = 0.0
+
+
+def relative_path(path):
+    """MEDIA_ROOT 下文件的相对路径（分隔符为 /）；不在 MEDIA_ROOT 下时返回 None"""
+    root = os.path.abspath(settings.MEDIA_ROOT)
+    path = os.path.abspath(path)
+    try:
+        if os.path.commonpath([root, path]) != root:
+            return None
+    except ValueError:
+        return None
+    return os.path.relpath(path, root).replace(os.sep, '/')
+
+
+def artifact_kind(relative):
+    return KIND_DIRECTORIES.get(relative.split('/', 1)[0])
+
+
+def record_access(path):
+    """记录文件被读取：atime 设为当前时间，mtime 不变；文件不存在时忽略"""
+    try:
+        stat = os.stat(path)
+        if time.time() - stat.st_atime > ACCESS_RESOLUTION_SECONDS:
+            os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+    except OSError:
+        pass
+
+
+def result_files(result):
+    """分析结果引用的文件（相对于 MEDIA_ROOT 的路径）"""
+    if not isinstance(result, dict):
+        return []
+    return [
+        result[key]['path'].replace(os.sep, '/') for key in RESULT_FILE_KEYS
+        if isinstance(result.get(key), dict) and result[key].get('path')
+    ]
+
+
+def _walk():
+    """MEDIA_ROOT 下各类型目录中的文件：{相对路径: stat}"""
+    files = {}
+    for directory in KIND_DIRECTORIES:
+        for dirpath, _, filenames in os.walk(os.path.join(settings.MEDIA_ROOT, directory)):
+            for name in filenames:
+                absolute = os.path.join(dirpath, name)
+                try:
+                    files[relative_path(absolute)] = os.stat(absolute)
+                except OSError:
+                    # 遍历期间被删除
+                    continue
+    return files
+
+
+def _references():
+    """
+    被记录引用的文件：返回 ({相对路径: 所属用户 ID}, 不能重新生成的清洗结果路径集合)
+    """
+    owners = {}
+    fixed = set()
+    for name, user_id in DataFile.objects.values_list('file', 'user_id'):
+        owners[name.replace(os.sep, '/')] = user_id
+    # 未过期的分块上传正在写入的文件
+    cutoff = django_timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+    sessions = UploadSession.objects.filter(status='open', updated_at__gte=cutoff)
+    for name, user_id in sessions.values_list('file', 'user_id'):
+        owners.setdefault(name.replace(os.sep, '/'), user_id)
+    # 共用的清洗结果算在最早创建它的用户名下
+    cleaned = CleanedData.objects.order_by('created_at').values_list('file', 'cache_key', 'original_file__user_id')
+    for name, cache_key, user_id in cleaned:
+        name = name.replace(os.sep, '/')
+        owners.setdefault(name, user_id)
+        if not cache_key:
+            fixed.add(name)
+    with_files = Q()
+    for key in RESULT_FILE_KEYS:
+        with_files |= Q(result__has_key=key)
+    paths = [f'result__{key}__path' for key in RESULT_FILE_KEYS]
+    for row in AnalysisResult.objects.filter(with_files).values_list(*paths, 'data_file__user_id'):
+        for path in row[:-1]:
+            if path:
+                owners[path.replace(os.sep, '/')] = row[-1]
+    return owners, fixed
+
+
+def _accessed_at(stat):
+    return datetime.fromtimestamp(max(stat.st_atime, stat.st_mtime), tz=dt_timezone.utc)
+
+
+def _batches(items):
+    items = list(items)
+    for start in range(0, len(items), BATCH_SIZE):
+        yield items[start:start + BATCH_SIZE]
+
+
+def scan():
+    """
+    对比磁盘与 StoredArtifact 表，返回 (磁盘上的文件 {相对路径: stat}, 引用的文件 {相对路径: 用户 ID},
+    不能重新生成的清洗结果路径集合)
+    """
+    on_disk = _walk()
+    owners, fixed = _references()
+    existing = {artifact.path: artifact for artifact in StoredArtifact.objects.all()}
+    created, updated = [], []
+    for path, stat in on_disk.items():
+        kind = artifact_kind(path)
+        user_id = owners.get(path) if kind != 'cache' else None
+        accessed = _accessed_at(stat)
+        artifact = existing.get(path)
+        if artifact is None:
+            created.append(StoredArtifact(path=path, kind=kind, user_id=user_id, size=stat.st_size, last_accessed=accessed))
+        elif (artifact.size, artifact.last_accessed, artifact.user_id) != (stat.st_size, accessed, user_id):
+            artifact.size, artifact.last_accessed, artifact.user_id = stat.st_size, accessed, user_id
+            updated.append(artifact)
+    StoredArtifact.objects.bulk_create(created, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    StoredArtifact.objects.bulk_update(updated, ['size', 'last_accessed', 'user'], batch_size=BATCH_SIZE)
+    for batch in _batches(path for path in existing if path not in on_disk):
+        StoredArtifact.objects.filter(path__in=batch).delete()
+    return on_disk, owners, fixed
+
+
+def remove(relative):
+    """删除文件和它的记录，并删除因此变空的子目录（各类型的顶层目录保留）"""
+    absolute = os.path.join(settings.MEDIA_ROOT, *relative.split('/'))
+    try:
+        os.remove(absolute)
+    except FileNotFoundError:
+        pass
+    StoredArtifact.objects.filter(path=relative).delete()
+    top = os.path.join(os.path.abspath(settings.MEDIA_ROOT), relative.split('/', 1)[0])
+    parent = os.path.dirname(os.path.abspath(absolute))
+    while parent != top and parent.startswith(top):
+        try:
+            os.rmdir(parent)
+        except OSError:
+            break
+        parent = os.path.dirname(parent)
+
+
+def release(paths):
+    """删除不再被任何记录引用的文件（删除记录的事务提交后调用）"""
+    for path in paths:
+        path = path.replace(os.sep, '/')
+        kind = artifact_kind(path)
+        if kind == 'upload' and DataFile.objects.filter(file=path).exists():
+            continue
+        if kind == 'cleaned' and CleanedData.objects.filter(file=path).exists():
+            continue
+        if kind in ('upload', 'cleaned', 'analysis'):
+            remove(path)
+
+
+def collect(budget=None, dry_run=False, grace=ORPHAN_GRACE_SECONDS):
+    """
+    清理孤立文件，并在总大小超过预算（字节，默认 settings.STORAGE_BUDGET_BYTES，0 表示不限制）时
+    按 LRU 回收缓存和清洗结果。dry_run 时只报告将要删除的文件。
+    """
+    global _last_collect
+    budget = settings.STORAGE_BUDGET_BYTES if budget is None else budget
+    with _collect_lock:
+        _last_collect = time.monotonic()
+        on_disk, owners, fixed = scan()
+        now = time.time()
+        orphans = sorted(
+            path for path, stat in on_disk.items()
+            if (path.endswith('.part') or (artifact_kind(path) != 'cache' and path not in owners))
+            and now - stat.st_mtime > grace
+        )
+        total = sum(stat.st_size for stat in on_disk.values())
+        freed = 0
+        for path in orphans:
+            if not dry_run:
+                remove(path)
+            freed += on_disk[path].st_size
+        total -= freed
+
+        evicted = []
+        if budget and total > budget:
+            skipped = fixed | set(orphans)
+            candidates = StoredArtifact.objects.filter(kind__in=REGENERABLE_KINDS).order_by('last_accessed', 'id')
+            for artifact in candidates.iterator():
+                if total <= budget:
+                    break
+                if artifact.path in skipped or artifact.path.endswith('.part'):
+                    continue
+                if not dry_run:
+                    remove(artifact.path)
+                evicted.append(artifact.path)
+                total -= artifact.size
+                freed += artifact.size
+
+    report = {
+        # 回收后（dry_run 时为假设回收后）剩余的文件数和总大小
+        'files': len(on_disk) - len(orphans) - len(evicted),
+        'total_bytes': total,
+        'budget_bytes': budget,
+        'orphans': orphans,
+        'evicted': evicted,
+        'freed_bytes': freed,
+        'dry_run': dry_run,
+    }
+    print(f"存储回收：孤立文件 {len(orphans)} 个，回收 {len(evicted)} 个，释放 {freed} 字节，剩余 {total} 字节")
+    return report
+
+
+def maybe_collect():
+    """设置了容量预算且距上次回收超过 STORAGE_GC_INTERVAL 秒时运行 collect；失败不影响调用方"""
+    if not settings.STORAGE_BUDGET_BYTES or time.monotonic() - _last_collect < settings.STORAGE_GC_INTERVAL:
+        return None
+    if _collect_lock.locked():
+        return None
+    try:
+        return collect()
+    except Exception as e:
+        print(f"存储回收失败: {str(e)}")
+        return None
+
+
+def usage(user=None):
+    """按用户和类型汇总文件的大小和数量（来自最近一次 scan）；user 为 None 时返回所有用户，共用的缓存 user_id 为 None"""
+    artifacts = StoredArtifact.objects.all()
+    if user is not None:
+        artifacts = artifacts.filter(user=user)
+    rows = (
+        artifacts.values('user_id', 'user__username', 'kind')
+        .annotate(bytes=Sum('size'), files=Count('id'))
+        .order_by('user_id', 'kind')
+    )
+    users = {}
+    for row in rows:
+        entry = users.setdefault(row['user_id'], {
+            'user_id': row['user_id'], 'username': row['user__username'], 'bytes': 0, 'files': 0, 'kinds': {},
+        })
+        entry['kinds'][row['kind']] = {'bytes': row['bytes'], 'files': row['files']}
+        entry['bytes'] += row['bytes']
+        entry['files'] += row['files']
+    return sorted(users.values(), key=lambda entry: -entry['bytes'])
@@ -1,3 +1,1505 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from importlib.util import find_spec
+from unittest import skipUnless
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .benchmark import (
+    BenchmarkRunner, build_report, compare_reports, generate_weather_dataset, weather_columns,
+)
+from .engines.base import AnalysisEngine
+from .models import AnalysisResult, CleanedData, DataFile, VisualizationResult
+from .sketches import ColumnSketch
+
+
+class MediaRootMixin:
+    """
+    每个测试使用临时的 MEDIA_ROOT（测试结束后删除）；设置了 username 时创建该用户，
+    并提供以该用户登录的 self.client。settings_overrides 为额外覆盖的设置。
+    """
+    username = None
+    settings_overrides = {}
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, **self.settings_overrides)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        if self.username:
+            self.user = User.objects.create_user(username=self.username, password=self.username)
+            self.client = APIClient()
+            self.client.force_authenticate(user=self.user)
+
+
+class MediaRootTestCase(MediaRootMixin, TestCase):
+    pass
+
+
+class BenchmarkSmokeTest(MediaRootTestCase):
+    """用很小的数据跑一遍基准用例，保证所有接口都能通过测试客户端正常调用"""
+
+    username = 'bench'
+
+    def setUp(self):
+        super().setUp()
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir, ignore_errors=True)
+
+    def test_column_layout(self):
+        features, labels = weather_columns(2000)
+        self.assertEqual(len(features) + len(labels) + 2, 2000)
+        features, labels = weather_columns(20, with_labels=False)
+        self.assertEqual(len(features), 18)
+        self.assertEqual(labels, [])
+
+    def test_all_cases_succeed(self):
+        runner = BenchmarkRunner(self.user, data_dir=self.data_dir)
+        results = runner.run([(200, 20)])
+
+        self.assertEqual(len(results), 19)
+        for record in results:
+            self.assertEqual(record['status'], 200, record['case'])
+            self.assertGreater(record['response_bytes'], 0)
+
+        report = build_report(results)
+        comparison = compare_reports(report, report)
+        self.assertTrue(all(row['ratio'] == 1 for row in comparison))
+
+
+class ServerTimingTest(MediaRootTestCase):
+    """分阶段计时：Server-Timing 响应头、延迟直方图与 /api/metrics/"""
+
+    username = 'timer'
+
+    def setUp(self):
+        from django.core.files.base import ContentFile
+
+        from .timing import registry
+
+        super().setUp()
+        registry.reset()
+        self.data_file = DataFile.objects.create(
+            user=self.user, name='t.csv', file=ContentFile(b'DATE,a\n20000101,1.5\n20000102,2.5\n', name='t.csv'),
+        )
+
+    def test_header_format_and_stages(self):
+        from .timing import StageTimer
+
+        timer = StageTimer()
+        timer.add('read csv', 0.0123)
+        timer.add('fit', 0.5)
+        timer.total = 0.6
+        # 指标名中的非法字符替换为下划线，耗时为毫秒、保留一位小数
+        self.assertEqual(timer.header_value(), 'read_csv;dur=12.3, fit;dur=500.0, total;dur=600.0')
+
+        response = self.client.get(f'/api/datafiles/{self.data_file.id}/preview/')
+        header = response['Server-Timing']
+        self.assertRegex(header, r'^[A-Za-z0-9_.\-]+;dur=\d+\.\d(, [A-Za-z0-9_.\-]+;dur=\d+\.\d)*$')
+        names = [part.split(';')[0] for part in header.split(', ')]
+        for name in ('etag', 'read_csv', 'serialize', 'render'):
+            self.assertIn(name, names)
+        self.assertEqual(names[-1], 'total')
+
+    def test_histogram_buckets_and_quantiles(self):
+        from .timing import LatencyHistogram
+
+        histogram = LatencyHistogram(buckets=(1, 5, 10))
+        self.assertIsNone(histogram.quantile(0.5))
+        for value in (0.5, 3, 3, 7, 20):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [1, 2, 1, 1])
+        self.assertEqual(histogram.quantile(0.2), 1.0)
+        self.assertEqual(histogram.quantile(0.5), 5.0)
+        self.assertEqual(histogram.quantile(0.8), 10.0)
+        # 落在最后一个桶时返回最大值
+        self.assertEqual(histogram.quantile(0.99), 20)
+
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot['count'], 5)
+        self.assertEqual(snapshot['mean_ms'], 6.7)
+        self.assertEqual(snapshot['max_ms'], 20)
+        self.assertEqual(snapshot['buckets'], {'le_1': 1, 'le_5': 2, 'le_10': 1, 'le_inf': 1})
+
+    def test_metrics_admin_only(self):
+        self.client.get(f'/api/datafiles/{self.data_file.id}/preview/')
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+        admin = User.objects.create_user(username='timer-admin', password='admin', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        body = self.client.get('/api/metrics/').json()
+        self.assertTrue(body['enabled'])
+        preview = body['endpoints']['GET datafile-preview']
+        self.assertEqual(preview['total']['count'], 1)
+        self.assertIn('read_csv', preview)
+
+        self.assertEqual(self.client.delete('/api/metrics/').status_code, 204)
+        self.assertNotIn('GET datafile-preview', self.client.get('/api/metrics/').json()['endpoints'])
+
+    @override_settings(API_TIMING_ENABLED=False)
+    def test_disabled(self):
+        from django.core.exceptions import MiddlewareNotUsed
+
+        from .timing import ServerTimingMiddleware
+
+        with self.assertRaises(MiddlewareNotUsed):
+            ServerTimingMiddleware(lambda request: None)
+
+        # 中间件未加载时 stage()/mark() 不做任何事，响应没有 Server-Timing
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.get(f'/api/datafiles/{self.data_file.id}/preview/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class ResultListPaginationTest(TestCase):
+    """结果列表按创建时间游标分页，列表项不含大字段"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='pager', password='pager')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.data_file = DataFile.objects.create(user=self.user, file='uploads/p.csv', name='p.csv')
+        AnalysisResult.objects.bulk_create([
+            AnalysisResult(data_file=self.data_file, analysis_type='clustering', result={'labels': [i] * 10})
+            for i in range(105)
+        ])
+
+    def test_cursor_pages(self):
+        body = self.client.get('/api/analysisresults/').json()
+        self.assertEqual(set(body), {'next', 'previous', 'results'})
+        self.assertEqual(len(body['results']), 20)
+        self.assertIsNone(body['previous'])
+        self.assertIsNotNone(body['next'])
+
+        # page_size 最多 100
+        body = self.client.get('/api/analysisresults/', {'page_size': 500}).json()
+        self.assertEqual(len(body['results']), 100)
+        last = self.client.get(body['next']).json()
+        self.assertEqual(len(last['results']), 5)
+        self.assertIsNone(last['next'])
+        self.assertIsNotNone(last['previous'])
+        ids = [item['id'] for item in body['results'] + last['results']]
+        self.assertEqual(sorted(ids), sorted(AnalysisResult.objects.values_list('id', flat=True)))
+
+    def test_list_omits_large_fields(self):
+        item = self.client.get('/api/analysisresults/').json()['results'][0]
+        self.assertNotIn('result', item)
+        self.assertEqual(item['analysis_type_display'], '聚类分析')
+        detail = self.client.get(f'/api/analysisresults/{item["id"]}/').json()
+        self.assertEqual(len(detail['result']['labels']), 10)
+
+        cleaned = CleanedData.objects.create(
+            original_file=self.data_file, file='cleaned/p.csv', cleaning_method='outliers', summary={'total_outliers': 3},
+        )
+        listed = self.client.get('/api/cleaneddata/').json()
+        self.assertEqual(set(listed), {'next', 'previous', 'results'})
+        self.assertNotIn('summary', listed['results'][0])
+        self.assertEqual(self.client.get(f'/api/cleaneddata/{cleaned.id}/').json()['summary'], {'total_outliers': 3})
+
+
+class OwnershipQueryCountTest(TestCase):
+    """列表接口的查询次数不应随记录数增长（防止 N+1 查询回归）"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='owner')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _create_records(self, count):
+        for i in range(count):
+            data_file = DataFile.objects.create(
+                user=self.user, file=f'uploads/{i}.csv', name=f'{i}.csv', file_type='text/csv'
+            )
+            CleanedData.objects.create(original_file=data_file, file=f'cleaned/{i}.csv', cleaning_method='outliers')
+            result = AnalysisResult.objects.create(data_file=data_file, analysis_type='clustering')
+            VisualizationResult.objects.create(
+                data_file=data_file, analysis_result=result, chart_type='bar', title=str(i)
+            )
+
+    def _query_counts(self):
+        counts = {}
+        for url in ('/api/datafiles/', '/api/cleaneddata/', '/api/analysisresults/', '/api/visualizations/'):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            counts[url] = len(context.captured_queries)
+        return counts
+
+    def test_list_query_count_is_constant(self):
+        self._create_records(2)
+        small = self._query_counts()
+        self._create_records(10)
+        self.assertEqual(self._query_counts(), small)
+
+    def test_datafile_list_query_count(self):
+        self._create_records(5)
+        with self.assertNumQueries(1):
+            self.client.get('/api/datafiles/')
+
+
+class ConditionalGetTest(MediaRootTestCase):
+    """ETag 与 If-None-Match：匹配时返回 304，压缩后的弱 ETag 同样匹配"""
+
+    username = 'etag'
+
+    def setUp(self):
+        from django.core.files.base import ContentFile
+
+        super().setUp()
+        # 预览的 JSON 超过 COMPRESSION_MIN_SIZE，会被压缩
+        content = 'DATE,a,b\n' + ''.join(f'{20000101 + i},{i * 0.5},{i % 7}\n' for i in range(200))
+        self.data_file = DataFile.objects.create(
+            user=self.user, name='etag.csv', file=ContentFile(content.encode(), name='etag.csv'),
+        )
+
+    def test_preview_not_modified(self):
+        url = f'/api/datafiles/{self.data_file.id}/preview/'
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        self.assertTrue(etag.startswith('"'))
+
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+        self.assertEqual(again['ETag'], etag)
+
+        # 不同的查询参数是不同的表示
+        columnar = self.client.get(url, {'layout': 'columnar'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(columnar.status_code, 200)
+        self.assertNotEqual(columnar['ETag'], etag)
+
+    def test_weak_etag_matches_when_compressed(self):
+        url = f'/api/datafiles/{self.data_file.id}/preview/'
+        compressed = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        weak = compressed['ETag']
+        self.assertTrue(weak.startswith('W/"'))
+
+        # 客户端回传弱 ETag 时，无论是否压缩都视为匹配
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=weak).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=weak, HTTP_ACCEPT_ENCODING='gzip').status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='W/"other"').status_code, 200)
+
+    def test_list_etag_changes_with_rows(self):
+        url = '/api/analysisresults/'
+        first = AnalysisResult.objects.create(data_file=self.data_file, analysis_type='clustering')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        added = AnalysisResult.objects.create(data_file=self.data_file, analysis_type='regression')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        after_add = response['ETag']
+
+        # 详情按记录生成 ETag
+        detail = self.client.get(f'{url}{added.id}/')
+        self.assertEqual(self.client.get(f'{url}{added.id}/', HTTP_IF_NONE_MATCH=detail['ETag']).status_code, 304)
+
+        self.assertEqual(self.client.delete(f'{url}{added.id}/').status_code, 204)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=after_add)
+        self.assertEqual(response.status_code, 200)
+        # 结果集回到新增之前
+        self.assertEqual(response['ETag'], etag)
+
+        self.assertEqual(self.client.delete(f'{url}{first.id}/').status_code, 204)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(response['ETag'], (etag, after_add))
+
+    def test_result_etag_follows_deleted_cleaned_data(self):
+        cleaned = CleanedData.objects.create(original_file=self.data_file, file='cleaned/x.csv', cleaning_method='outliers')
+        result = AnalysisResult.objects.create(data_file=self.data_file, cleaned_data=cleaned, analysis_type='clustering')
+        AnalysisResult.objects.create(data_file=self.data_file, analysis_type='regression')
+        list_url, detail_url = '/api/analysisresults/', f'/api/analysisresults/{result.id}/'
+        listed = self.client.get(list_url)
+        detail = self.client.get(detail_url)
+        # 结果会随清洗结果的删除而改变，不能作为不可变资源缓存
+        self.assertNotIn('immutable', detail['Cache-Control'])
+        self.assertIn('no-cache', detail['Cache-Control'])
+
+        # 删除清洗结果把 cleaned_data 置空（SET_NULL）
+        self.assertEqual(self.client.delete(f'/api/cleaneddata/{cleaned.id}/').status_code, 204)
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()['cleaned_data'])
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=listed['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['cleaned_data'] for item in response.json()['results']], [None, None])
+
+    def test_results_cannot_be_modified(self):
+        result = AnalysisResult.objects.create(data_file=self.data_file, analysis_type='clustering')
+        cleaned = CleanedData.objects.create(original_file=self.data_file, file='cleaned/x.csv', cleaning_method='outliers')
+        for url in (f'/api/analysisresults/{result.id}/', f'/api/cleaneddata/{cleaned.id}/'):
+            self.assertEqual(self.client.put(url, {}, format='json').status_code, 405)
+            self.assertEqual(self.client.patch(url, {}, format='json').status_code, 405)
+
+
+class NumpyRendererTest(TestCase):
+    """orjson 快速路径与标准库 json 路径的输出一致"""
+
+    def render_both(self, data):
+        from unittest import mock
+
+        from . import renderers
+
+        outputs = []
+        for orjson in (renderers.orjson, None):
+            with mock.patch.object(renderers, 'orjson', orjson):
+                outputs.append(json.loads(renderers.NumpyJSONRenderer().render(data)))
+        self.assertEqual(outputs[0], outputs[1])
+        return outputs[0]
+
+    @skipUnless(find_spec('orjson'), 'orjson 未安装')
+    def test_paths_agree(self):
+        import pandas as pd
+
+        self.assertEqual(self.render_both({
+            'array': np.array([1.5, np.nan, np.inf, -np.inf]),
+            'scalar': np.float64('nan'),
+            'ints': np.arange(3, dtype=np.int8),
+        }), {'array': [1.5, None, None, None], 'scalar': None, 'ints': [0, 1, 2]})
+
+        self.assertEqual(self.render_both({
+            'timestamp': pd.Timestamp('2020-01-02 03:04:05'),
+            'nat': pd.NaT,
+            'dates': np.array(['2020-01-02', '2020-01-03'], dtype='datetime64[ns]'),
+        }), {'timestamp': '2020-01-02T03:04:05', 'nat': None, 'dates': ['2020-01-02T00:00:00', '2020-01-03T00:00:00']})
+
+        # 非连续数组（切片、转置）
+        matrix = np.arange(12, dtype=np.float64).reshape(3, 4)
+        self.assertEqual(self.render_both({'column': matrix[:, 1], 'transposed': matrix.T})['column'], [1.0, 5.0, 9.0])
+
+        # float16 不能由 orjson 直接序列化，按 float64 输出
+        self.assertEqual(
+            self.render_both({'half': np.array([0.5, np.nan, 2.0], dtype=np.float16)}),
+            {'half': [0.5, None, 2.0]},
+        )
+
+
+def columnar_to_rows(data, length):
+    """按 vue3Project/src/utils/api.js 的 columnarToRows 解码列式数据"""
+    import base64
+
+    columns = {}
+    for name, column in data.items():
+        if 'validity' in column:
+            bits = np.frombuffer(base64.b64decode(column['validity']), dtype=np.uint8)
+            valid = np.unpackbits(bits, bitorder='little')[:length].astype(bool)
+        else:
+            valid = np.ones(length, dtype=bool)
+        if column['type'] == 'dictionary':
+            columns[name] = [column['dictionary'][code] if code >= 0 else None for code in column['codes']]
+        else:
+            columns[name] = [value if ok else None for value, ok in zip(column['values'], valid)]
+    return [{name: values[i] for name, values in columns.items()} for i in range(length)]
+
+
+class ColumnarCompressionTest(MediaRootTestCase):
+    """列式预览格式与响应压缩"""
+
+    username = 'columnar'
+
+    def setUp(self):
+        from django.core.files.base import ContentFile
+
+        super().setUp()
+        rows = ''.join(
+            f'{20000101 + i},{"" if i % 5 == 0 else i * 0.25},{["sun", "rain", ""][i % 3]},{i % 2 == 0}\n'
+            for i in range(200)
+        )
+        self.data_file = DataFile.objects.create(
+            user=self.user, name='c.csv', file=ContentFile(f'DATE,temp,weather,bbq\n{rows}'.encode(), name='c.csv'),
+        )
+
+    def test_encode_column(self):
+        import base64
+
+        import pandas as pd
+
+        from .columnar import encode_column
+
+        column = encode_column(pd.Series(['a', None, 'b', 'a', None, None, 'b', 'a', 'c']))
+        self.assertEqual(column['type'], 'dictionary')
+        self.assertEqual(column['dictionary'], ['a', 'b', 'c'])
+        self.assertEqual(column['codes'].tolist(), [0, -1, 1, 0, -1, -1, 1, 0, 2])
+        # 有效位图低位在前：第 0、2、3、6、7 行有值 → 0b11001101，第 8 行 → 0b1
+        self.assertEqual(base64.b64decode(column['validity']), bytes([0b11001101, 0b1]))
+
+        numeric = encode_column(pd.Series([1.5, np.nan, 3.0]))
+        self.assertEqual(numeric['type'], 'float64')
+        self.assertEqual(numeric['values'].tolist(), [1.5, 0.0, 3.0])
+        self.assertEqual(base64.b64decode(numeric['validity']), bytes([0b101]))
+        self.assertNotIn('validity', encode_column(pd.Series([1, 2, 3])))
+
+        flags = encode_column(pd.Series([True, False, True]))
+        self.assertEqual([flags['dictionary'][code] for code in flags['codes']], ['true', 'false', 'true'])
+
+    def test_columnar_round_trips_to_rows(self):
+        url = f'/api/datafiles/{self.data_file.id}/preview/'
+        rows = self.client.get(url).json()
+        columnar = self.client.get(url, {'layout': 'columnar'}).json()
+        self.assertEqual(columnar['layout'], 'columnar')
+        self.assertEqual(columnar_to_rows(columnar['data'], len(rows['data'])), rows['data'])
+        self.assertIn('validity', columnar['data']['temp'])
+        self.assertEqual(columnar['data']['weather']['type'], 'dictionary')
+
+    def test_accept_encoding_negotiation(self):
+        import gzip
+        from unittest import mock
+
+        from . import compression
+
+        url = f'/api/datafiles/{self.data_file.id}/preview/'
+        plain = self.client.get(url, HTTP_ACCEPT_ENCODING='identity')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+
+        gzipped = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', gzipped['Vary'])
+        self.assertEqual(gzip.decompress(gzipped.content), plain.content)
+
+        # q=0 表示不接受该编码
+        self.assertFalse(self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0').has_header('Content-Encoding'))
+        self.assertEqual(compression.accepted_encodings(
+            type('Request', (), {'META': {'HTTP_ACCEPT_ENCODING': 'br;q=0.5, gzip;q=0, *;q=bad'}})(),
+        ), {'br'})
+
+        # 没有安装 brotli 时退回 gzip
+        with mock.patch.object(compression, 'brotli', None):
+            fallback = self.client.get(url, HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(fallback['Content-Encoding'], 'gzip')
+
+    @skipUnless(find_spec('brotli'), 'brotli 未安装')
+    def test_brotli(self):
+        import brotli
+
+        url = f'/api/datafiles/{self.data_file.id}/preview/'
+        plain = self.client.get(url)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+    def test_small_bodies_stay_uncompressed(self):
+        url = f'/api/datafiles/{self.data_file.id}/preview/'
+        size = len(self.client.get(url).content)
+        with override_settings(COMPRESSION_MIN_SIZE=size + 1):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(len(response.content), size)
+        with override_settings(COMPRESSION_MIN_SIZE=size):
+            self.assertEqual(self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')['Content-Encoding'], 'gzip')
+
+
+class ColumnSketchTest(TestCase):
+    def test_merged_sketch_matches_full_data(self):
+        rng = np.random.default_rng(0)
+        first = rng.normal(size=50000)
+        second = np.concatenate((rng.exponential(size=50000) + 3, [np.nan] * 10))
+        values = np.concatenate((first, second))
+        finite = values[np.isfinite(values)]
+
+        sketch = ColumnSketch.from_values(first).merge(ColumnSketch.from_values(second))
+        sketch = ColumnSketch.from_dict(ColumnSketch.to_dict(sketch))
+
+        self.assertEqual(sketch.count, len(finite))
+        self.assertEqual(sketch.nulls, 10)
+        self.assertAlmostEqual(sketch.mean, finite.mean())
+        self.assertAlmostEqual(sketch.std, finite.std(ddof=1))
+        box = sketch.box()
+        # 分位数的误差按排名衡量：估计值在全量数据中的实际排名与目标分位数相差不超过 0.5%
+        for key, q in (('q1', 0.25), ('median', 0.5), ('q3', 0.75)):
+            self.assertAlmostEqual(np.mean(finite <= box[key]), q, delta=0.005)
+        self.assertEqual(box['min'], finite.min())
+        self.assertEqual(box['max'], finite.max())
+        histogram = sketch.histogram_data(10)
+        self.assertEqual(int(histogram['counts'].sum()), len(finite))
+
+
+class SampledAnalysisTest(MediaRootTestCase):
+    username = 'sampler'
+
+    def setUp(self):
+        from django.core.files import File
+
+        super().setUp()
+
+        path = generate_weather_dataset(f'{self.media_root}/weather.csv', n_rows=3000, n_cols=20)
+        with open(path, 'rb') as f:
+            self.data_file = DataFile.objects.create(user=self.user, name='weather.csv', file=File(f, name='weather.csv'))
+        self.features, _ = weather_columns(20)
+
+    def test_sampled_clustering_and_promote(self):
+        response = self.client.post('/api/analysisresults/analyze/', {
+            'file_id': self.data_file.id,
+            'analysis_type': 'clustering',
+            'parameters': {'features': self.features[:4], 'n_clusters': 3, 'sample': {'size': 600, 'n_bootstrap': 50}},
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        result = response.json()['result']
+        sample = result['sample']
+        self.assertEqual((sample['size'], sample['population'], sample['method']), (600, 3000, 'stratified'))
+        self.assertEqual(len(result['clusters']), 600)
+        self.assertEqual(len(set(sample['row_index'])), 600)
+        # 按 MONTH 分层：各层按比例分配
+        for stratum in sample['strata'].values():
+            self.assertAlmostEqual(stratum['sampled'], stratum['population'] / 5, delta=1)
+        share = result['confidence_intervals']['cluster_share']
+        for low, estimate, high in zip(share['low'], share['estimate'], share['high']):
+            self.assertLessEqual(low, estimate)
+            self.assertLessEqual(estimate, high)
+
+        promoted = self.client.post(f'/api/analysisresults/{response.json()["id"]}/promote/')
+        self.assertEqual(promoted.status_code, 200)
+        self.assertNotIn('sample', promoted.json()['result'])
+        self.assertEqual(len(promoted.json()['result']['clusters']), 3000)
+        self.assertEqual(promoted.json()['parameters']['promoted_from'], response.json()['id'])
+
+        again = self.client.post(f'/api/analysisresults/{promoted.json()["id"]}/promote/')
+        self.assertEqual(again.status_code, 400)
+
+    def test_out_of_core_clustering_and_pca(self):
+        import os
+
+        from django.conf import settings
+
+        for analysis_type, key, shape in (('clustering', 'clusters_file', [3000]), ('dimension_reduction', 'components_file', [3000, 2])):
+            with self.settings(ANALYSIS_CHUNK_ROWS=700):
+                response = self.client.post('/api/analysisresults/analyze/', {
+                    'file_id': self.data_file.id,
+                    'analysis_type': analysis_type,
+                    'parameters': {'features': self.features[:4], 'n_clusters': 3, 'n_components': 2, 'out_of_core': True},
+                }, format='json')
+            self.assertEqual(response.status_code, 200, response.content)
+            result = response.json()['result']
+            self.assertEqual(result['out_of_core']['rows'], 3000)
+            self.assertEqual(result[key]['shape'], shape)
+            saved = np.load(os.path.join(settings.MEDIA_ROOT, result[key]['path']))
+            self.assertEqual(list(saved.shape), shape)
+            if analysis_type == 'clustering':
+                self.assertEqual(np.bincount(saved, minlength=3).tolist(), result['clusterCounts'])
+                self.assertEqual(saved[:1000].tolist(), result['clusters'])
+
+
+class OutlierCleaningTest(TestCase):
+    def test_only_outliers_are_replaced(self):
+        import pandas as pd
+
+        from .cleaning import remove_outliers
+
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame(rng.normal(size=(500, 3)), columns=['a', 'b', 'c'])
+        df.loc[0, 'a'] = 100.0
+        df.loc[1, 'b'] = -100.0
+        df.loc[2:4, 'c'] = np.nan
+        df['label'] = 'x'
+
+        for method in ('zscore', 'iqr', 'mad'):
+            cleaned, summary = remove_outliers(df, method=method)
+            self.assertGreaterEqual(summary['columns']['a']['outliers'], 1)
+            self.assertGreaterEqual(summary['columns']['b']['outliers'], 1)
+            self.assertLess(cleaned.loc[0, 'a'], 100.0)
+            self.assertGreater(cleaned.loc[1, 'b'], -100.0)
+            # 原有的缺失值保持不变
+            self.assertEqual(cleaned['c'].isna().sum(), 3)
+            self.assertEqual(summary['total_outliers'], sum(col['outliers'] for col in summary['columns'].values()))
+
+        clipped, summary = remove_outliers(df, method='iqr', replace='clip', n_jobs=2)
+        self.assertEqual(clipped.loc[0, 'a'], summary['columns']['a']['upper'])
+
+        # 按列分块并行与单线程结果一致
+        wide = pd.DataFrame(rng.standard_t(3, size=(300, 200)))
+        serial, serial_summary = remove_outliers(wide, method='mad')
+        parallel, parallel_summary = remove_outliers(wide, method='mad', n_jobs=3)
+        self.assertTrue(serial.equals(parallel))
+        self.assertEqual(serial_summary['total_outliers'], parallel_summary['total_outliers'])
+
+
+class CleanedArtifactCacheTest(MediaRootTestCase):
+    username = 'cleaner'
+
+    def setUp(self):
+        from django.core.files.base import ContentFile
+
+        super().setUp()
+        content = b'DATE,a,b\n1,1.0,\n2,2.0,5\n3,,6\n4,100.0,7\n'
+        self.files = [
+            DataFile.objects.create(user=self.user, name='same.csv', file=ContentFile(content, name='same.csv'))
+            for _ in range(2)
+        ]
+
+    def clean(self, data_file, cleaning_method, parameters):
+        return self.client.post('/api/cleaneddata/clean_data/', {
+            'file_id': data_file.id, 'cleaning_method': cleaning_method, 'parameters': parameters,
+        }, format='json')
+
+    def test_identical_requests_reuse_artifact(self):
+        first = self.clean(self.files[0], 'missing_values', {})
+        self.assertEqual(first['X-Cleaned-Cache'], 'miss')
+        # 补全默认值后参数相同
+        again = self.clean(self.files[0], 'missing_values', {'strategy': 'mean'})
+        self.assertEqual(again['X-Cleaned-Cache'], 'hit')
+        self.assertEqual(again.json()['id'], first.json()['id'])
+
+        # 内容相同的另一个文件：新记录指向同一个结果文件
+        other = self.clean(self.files[1], 'missing_values', {})
+        self.assertEqual(other['X-Cleaned-Cache'], 'hit')
+        self.assertNotEqual(other.json()['id'], first.json()['id'])
+        self.assertEqual(other.json()['file'], first.json()['file'])
+
+        # 不同的参数写入不同的文件，之前的结果文件不受影响
+        median = self.clean(self.files[0], 'missing_values', {'strategy': 'median'})
+        self.assertEqual(median['X-Cleaned-Cache'], 'miss')
+        self.assertNotEqual(median.json()['file'], first.json()['file'])
+        paths = {CleanedData.objects.get(id=response.json()['id']).file.path for response in (first, median)}
+        self.assertEqual(len(paths), 2)
+        for path in paths:
+            with open(path) as f:
+                self.assertTrue(f.read().startswith('DATE,a,b'))
+
+
+class BulkUploadTest(MediaRootTestCase):
+    username = 'bulk'
+
+    def test_files_and_archive(self):
+        import io
+        import os
+        import zipfile
+
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('season/oslo.csv', 'DATE,temp\n1,1.5\n2,2.5\n')
+            zf.writestr('season/notes.txt', 'ignored')
+        files = [
+            SimpleUploadedFile('basel.csv', b'DATE,temp,wind\n1,3.0,2\n2,4.0,\n3,5.0,1\n', content_type='text/csv'),
+            SimpleUploadedFile('empty.csv', b'', content_type='text/csv'),
+        ]
+        response = self.client.post('/api/datafiles/bulk_upload/', {
+            'files': files,
+            'archive': SimpleUploadedFile('season.zip', archive.getvalue(), content_type='application/zip'),
+        }, format='multipart')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        body = response.json()
+        self.assertEqual((body['created'], body['failed'], body['total_rows']), (2, 1, 5))
+        statuses = {item['name']: item for item in body['files']}
+        self.assertEqual(statuses['empty.csv']['status'], 'error')
+        self.assertEqual(statuses['basel.csv']['profile']['missing_values'], 1)
+
+        data_files = DataFile.objects.filter(user=self.user)
+        self.assertEqual(sorted(data_files.values_list('name', flat=True)), ['basel.csv', 'oslo.csv'])
+        basel = data_files.get(name='basel.csv')
+        self.assertEqual(basel.id, statuses['basel.csv']['id'])
+        self.assertEqual(sorted(basel.sketches.values_list('column', flat=True)), ['DATE', 'temp', 'wind'])
+        # 失败的文件不留在存储中
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'uploads'))), 2)
+
+        self.assertEqual(self.client.post('/api/datafiles/bulk_upload/', {}, format='multipart').status_code, 400)
+
+
+class InputFormatTest(MediaRootTestCase):
+    """压缩的 CSV 和列式文件：按魔数检测格式，读取结果与 CSV 相同"""
+
+    username = 'formats'
+
+    @skipUnless(find_spec('pyarrow') and find_spec('zstandard'), '需要安装 pyarrow 和 zstandard')
+    def test_compressed_and_columnar_uploads(self):
+        import gzip
+        import hashlib
+        import io
+
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.feather
+        import zstandard
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        from .loading import iter_frames, read_frame
+        from .outofcore import estimate_rows
+
+        path = generate_weather_dataset(f'{self.media_root}/weather.csv', n_rows=300, n_cols=8)
+        with open(path, 'rb') as f:
+            content = f.read()
+        df = pd.read_csv(path)
+        parquet, arrow = io.BytesIO(), io.BytesIO()
+        df.to_parquet(parquet, row_group_size=100)
+        pyarrow.feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), arrow)
+        encoded = {
+            'csv.gz': gzip.compress(content),
+            'csv.zst': zstandard.ZstdCompressor().compress(content),
+            'parquet': parquet.getvalue(),
+            'arrow': arrow.getvalue(),
+        }
+
+        def upload(name, data):
+            response = self.client.post('/api/datafiles/', {
+                'file': SimpleUploadedFile(name, data), 'name': name, 'file_type': 'text/csv',
+            }, format='multipart')
+            self.assertEqual(response.status_code, 201, response.content)
+            return DataFile.objects.get(id=response.json()['id'])
+
+        original = upload('weather.csv', content)
+        expected = self.client.get(f'/api/datafiles/{original.id}/preview/').json()
+        columns = df.columns[2:4].tolist()
+        for file_type, data in encoded.items():
+            # 扩展名不影响检测
+            data_file = upload('weather.bin', data)
+            self.assertEqual(data_file.file_type, file_type)
+            preview = self.client.get(f'/api/datafiles/{data_file.id}/preview/').json()
+            self.assertEqual(preview['data'], expected['data'], file_type)
+            projected = read_frame(data_file.file.path, usecols=columns)
+            self.assertEqual(projected.columns.tolist(), columns)
+            self.assertEqual(sum(len(chunk) for chunk in iter_frames(data_file.file.path, 70)), 300)
+            self.assertEqual(estimate_rows(data_file.file.path), 300)
+            self.assertEqual(data_file.sketches.count(), original.sketches.count())
+
+        response = self.client.post('/api/analysisresults/analyze/', {
+            'file_id': data_file.id, 'analysis_type': 'clustering',
+            'parameters': {'features': columns, 'n_clusters': 3},
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        # 分块上传压缩文件：接收时只写入，完成时整体读取
+        data = encoded['csv.gz']
+        session = self.client.post('/api/uploads/', {'name': 'weather.csv.gz', 'size': len(data)}, format='json').json()
+        for offset in range(0, len(data), 4096):
+            chunk = data[offset:offset + 4096]
+            self.client.put(f'/api/uploads/{session["id"]}/?offset={offset}', chunk, content_type='application/octet-stream',
+                            HTTP_X_CONTENT_SHA256=hashlib.sha256(chunk).hexdigest())
+        response = self.client.post(f'/api/uploads/{session["id"]}/finalize/')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual((response.json()['file_type'], response.json()['profile']['rows']), ('csv.gz', 300))
+
+
+class JoinTest(MediaRootTestCase):
+    """使用仓库自带的特征文件和标签文件测试按 DATE 连接"""
+
+    username = 'joiner'
+
+    def setUp(self):
+        import os
+
+        from django.conf import settings
+        from django.core.files import File
+
+        super().setUp()
+
+        data_dir = os.path.join(os.path.dirname(settings.BASE_DIR), 'data')
+        self.files = {}
+        for name in ('weather_prediction_dataset.csv', 'weather_prediction_bbq_labels.csv'):
+            with open(os.path.join(data_dir, name), 'rb') as f:
+                self.files[name] = DataFile.objects.create(user=self.user, name=name, file=File(f, name=name))
+
+    def test_preview_and_classification_on_joined_files(self):
+        import os
+
+        features = self.files['weather_prediction_dataset.csv']
+        labels = self.files['weather_prediction_bbq_labels.csv']
+
+        first = self.client.get(f'/api/datafiles/{features.id}/preview/', {'join_file_id': labels.id, 'layout': 'columnar'})
+        self.assertEqual(first.status_code, 200)
+        body = first.json()
+        self.assertEqual(body['join']['index'], 'built')
+        self.assertEqual(body['join']['rows'], body['join']['left_rows'])
+        self.assertIn('BASEL_BBQ_weather', body['columns'])
+        self.assertIn('BASEL_temp_mean', body['columns'])
+        self.assertEqual(body['columns'].count('DATE'), 1)
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'cache', 'joins'))), 1)
+
+        second = self.client.get(f'/api/datafiles/{features.id}/preview/', {'join_file_id': labels.id})
+        self.assertEqual(second.json()['join']['index'], 'memory')
+
+        response = self.client.post('/api/analysisresults/analyze/', {
+            'file_id': features.id,
+            'join_file_id': labels.id,
+            'analysis_type': 'classification',
+            'parameters': {'features': ['BASEL_temp_max', 'BASEL_sunshine', 'BASEL_precipitation'], 'target': 'BASEL_BBQ_weather'},
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertGreater(response.json()['result']['accuracy'], 0.9)
+        self.assertEqual(response.json()['parameters']['join_file_id'], labels.id)
+
+        bad = self.client.get(f'/api/datafiles/{features.id}/preview/', {'join_file_id': labels.id, 'join_key': 'NOPE'})
+        self.assertEqual(bad.status_code, 400)
+
+
+class TypedLoadingTest(MediaRootTestCase):
+    """按列类型计划读取：内存更小，输出与按默认类型读取完全相同"""
+
+    def setUp(self):
+        import os
+
+        from django.conf import settings
+
+        super().setUp()
+        self.path = os.path.join(os.path.dirname(settings.BASE_DIR), 'data', 'weather_prediction_dataset.csv')
+
+    def test_plan_saves_memory_and_round_trips(self):
+        import pandas as pd
+
+        from .loading import export_frame, get_plan, iter_frames, memory_report, read_frame
+
+        df = read_frame(self.path)
+        self.assertEqual(df['DATE'].dtype.kind, 'M')
+        self.assertEqual(str(df['MONTH'].dtype), 'int8')
+        self.assertEqual(str(df['BASEL_cloud_cover'].dtype), 'int8')
+        self.assertEqual(str(df['BASEL_temp_mean'].dtype), 'float32')
+        report = memory_report(df, self.path)
+        self.assertGreater(report['saved_ratio'], 0.4)
+
+        baseline = pd.read_csv(self.path)
+        pd.testing.assert_frame_equal(export_frame(df), baseline)
+        # 计划已写入缓存文件，分块读取与整体读取一致
+        self.assertEqual(get_plan(self.path)['columns']['DATE']['dtype'], 'date')
+        chunks = pd.concat(list(iter_frames(self.path, 1000)))
+        pd.testing.assert_frame_equal(chunks.reset_index(drop=True), df)
+
+    def test_cleaned_output_matches_default_dtypes(self):
+        import os
+
+        import pandas as pd
+        from django.conf import settings
+        from django.core.files import File
+
+        from .cleaning import clean_frame
+
+        user = User.objects.create_user(username='typed', password='typed')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        data_dir = os.path.join(os.path.dirname(settings.BASE_DIR), 'data')
+        cases = (
+            ('weather_prediction_dataset.csv', 'standardization', {}),
+            ('weather_prediction_dataset.csv', 'outliers', {}),
+            # 只有 DATE 和布尔列：DATE 按整数列标准化
+            ('weather_prediction_bbq_labels.csv', 'standardization', {}),
+        )
+        for name, cleaning_method, parameters in cases:
+            with open(os.path.join(data_dir, name), 'rb') as f:
+                data_file = DataFile.objects.create(user=user, name=name, file=File(f, name=name))
+            response = client.post('/api/cleaneddata/clean_data/', {
+                'file_id': data_file.id, 'cleaning_method': cleaning_method, 'parameters': parameters,
+            }, format='json')
+            self.assertEqual(response.status_code, 200, response.content)
+            # 与按默认类型（float64）读取后清洗的结果逐字节相同
+            expected, _ = clean_frame(pd.read_csv(data_file.file.path), cleaning_method, parameters)
+            with open(CleanedData.objects.get(id=response.json()['id']).file.path) as f:
+                self.assertEqual(f.read(), expected.to_csv(index=False), (name, cleaning_method))
+
+
+class FeatureSelectionTest(MediaRootTestCase):
+    username = 'selector'
+
+    def setUp(self):
+        import os
+
+        from django.conf import settings
+        from django.core.files import File
+
+        super().setUp()
+        self.path = os.path.join(os.path.dirname(settings.BASE_DIR), 'data', 'weather_prediction_dataset.csv')
+        with open(self.path, 'rb') as f:
+            self.data_file = DataFile.objects.create(user=self.user, name='weather.csv', file=File(f, name='weather.csv'))
+
+    def test_regression_scores_every_column(self):
+        import pandas as pd
+
+        df = pd.read_csv(self.path)
+        target = 'BASEL_temp_mean'
+        candidates = [col for col in df.columns if col not in ('DATE', 'MONTH', target)]
+        expected = sorted(candidates, key=lambda col: -abs(np.corrcoef(df[col], df[target])[0, 1]))[:5]
+
+        response = self.client.post('/api/analysisresults/analyze/', {
+            'file_id': self.data_file.id,
+            'analysis_type': 'regression',
+            'parameters': {'target': target},
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        selection = body['result']['feature_selection']
+        self.assertEqual((selection['method'], selection['candidates'], selection['cache']), ('correlation', len(candidates), 'built'))
+        self.assertEqual(selection['selected'], expected)
+        self.assertEqual(body['result']['feature_names'], expected)
+        self.assertEqual(body['parameters']['actual_features_used'], expected)
+
+        # 得分已缓存：改变 top_k 不需要重新打分
+        again = self.client.post('/api/analysisresults/analyze/', {
+            'file_id': self.data_file.id,
+            'analysis_type': 'regression',
+            'parameters': {'target': target, 'top_k': 8},
+        }, format='json')
+        selection = again.json()['result']['feature_selection']
+        self.assertEqual(selection['cache'], 'memory')
+        self.assertEqual(selection['selected'][:5], expected)
+        self.assertEqual(len(again.json()['result']['feature_names']), 8)
+
+    def test_mutual_info_finds_nonlinear_feature(self):
+        from .engines.selection import correlation_scores, mutual_info_scores
+
+        rng = np.random.default_rng(0)
+        X = rng.uniform(-1, 1, size=(2000, 3))
+        y = X[:, 1] ** 2 + 0.05 * rng.normal(size=2000)
+        self.assertLess(correlation_scores(X, y)[1], 0.1)
+        self.assertEqual(int(np.argmax(mutual_info_scores(X, y))), 1)
+
+
+class GradientBoostingTest(MediaRootTestCase):
+    username = 'booster'
+
+    def setUp(self):
+        import os
+
+        import pandas as pd
+        from django.core.files import File
+
+        super().setUp()
+        path = os.path.join(self.media_root, 'weather.csv')
+        generate_weather_dataset(path, n_rows=2000, n_cols=10, with_labels=True, seed=3)
+        self.features, self.labels = weather_columns(10)
+        # 特征中混入缺失值，由模型直接处理
+        df = pd.read_csv(path)
+        mask = np.random.default_rng(0).random((len(df), 4)) < 0.1
+        df[self.features[1:5]] = df[self.features[1:5]].mask(mask)
+        df.to_csv(path, index=False)
+        with open(path, 'rb') as f:
+            self.data_file = DataFile.objects.create(user=self.user, name='weather.csv', file=File(f, name='weather.csv'))
+
+    def _analyze(self, analysis_type, target):
+        response = self.client.post('/api/analysisresults/analyze/', {
+            'file_id': self.data_file.id,
+            'analysis_type': analysis_type,
+            'parameters': {'features': self.features[1:], 'target': target, 'algorithm': 'hist_gradient_boosting'},
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['result']
+
+    def test_regression_and_classification(self):
+        result = self._analyze('regression', self.features[0])
+        boosting = result['extra_info']['boosting']
+        self.assertTrue(boosting['early_stopping'])
+        self.assertLessEqual(boosting['n_iter'], boosting['max_iter'])
+        self.assertEqual(len(result['coefficients']), len(result['feature_names']))
+        self.assertEqual(set(result['training']), {'seconds', 'peak_memory_bytes', 'input_bytes'})
+        self.assertGreater(result['training']['peak_memory_bytes'], 0)
+
+        result = self._analyze('classification', self.labels[0])
+        self.assertEqual(result['algorithm'], 'hist_gradient_boosting')
+        self.assertGreater(result['accuracy'], 0.5)
+        self.assertEqual(len(result['feature_importance']), len(self.features) - 1)
+        self.assertIn('training', result)
+
+    def test_traced_fit_memory(self):
+        import tracemalloc
+
+        from .memory import TracedPeak
+
+        with TracedPeak() as memory:
+            buffer = np.ones(1_000_000)
+            del buffer
+        # NumPy 的数组缓冲区计入 tracemalloc
+        self.assertGreaterEqual(memory.peak_bytes, 8_000_000)
+        self.assertFalse(tracemalloc.is_tracing())
+
+        # 同时进行的统计无法区分各自的分配
+        with TracedPeak() as outer:
+            with TracedPeak() as inner:
+                np.ones(1000)
+        self.assertIsNone(inner.peak_bytes)
+        self.assertIsNone(outer.peak_bytes)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_batched_fit_matches_single_fit(self):
+        from types import SimpleNamespace
+
+        from sklearn.ensemble import HistGradientBoostingRegressor
+
+        from .progress import Job, fit_boosting
+
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(3000, 5))
+        X[rng.random(X.shape) < 0.05] = np.nan
+        y = np.nan_to_num(X[:, 0]) * 2 + rng.normal(size=3000)
+        direct = HistGradientBoostingRegressor(max_iter=300, early_stopping=True, random_state=42).fit(X, y)
+
+        job = Job(self.user.id, 'analyze')
+        batched = HistGradientBoostingRegressor(max_iter=300, early_stopping=True, random_state=42)
+        fit_boosting(SimpleNamespace(progress_job=job), batched, X, y, 0.3, 0.9)
+        self.assertEqual(batched.n_iter_, direct.n_iter_)
+        self.assertLess(batched.n_iter_, 300)
+        np.testing.assert_array_equal(batched.predict(X), direct.predict(X))
+
+
+class StorageManagerTest(MediaRootTestCase):
+    username = 'keeper'
+    settings_overrides = {'STORAGE_BUDGET_BYTES': 0}
+
+    def setUp(self):
+        from django.core.files.base import ContentFile
+
+        super().setUp()
+        content = b'DATE,a,b\n20000101,1.5,\n20000102,2.5,5\n20000103,,6\n20000104,100.0,7\n'
+        self.files = [
+            DataFile.objects.create(user=self.user, name='same.csv', file=ContentFile(content, name='same.csv'))
+            for _ in range(2)
+        ]
+
+    def clean(self, data_file):
+        response = self.client.post('/api/cleaneddata/clean_data/', {
+            'file_id': data_file.id, 'cleaning_method': 'missing_values', 'parameters': {},
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        return CleanedData.objects.get(id=response.json()['id'])
+
+    def test_usage_eviction_and_orphans(self):
+        import os
+        import time
+
+        from .storage import collect, scan, usage
+
+        cleaned = self.clean(self.files[0])
+        with open(cleaned.file.path, 'rb') as f:
+            original = f.read()
+        scan()
+        entry = usage(self.user)[0]
+        self.assertEqual(entry['kinds']['upload']['files'], 2)
+        self.assertEqual(entry['kinds']['cleaned']['bytes'], len(original))
+        shared = [item for item in usage() if item['user_id'] is None]
+        self.assertGreater(shared[0]['kinds']['cache']['files'], 0)
+
+        # 孤立文件：超过宽限期的删除，刚写入的保留
+        stale = os.path.join(self.media_root, 'cleaned', 'stale.csv')
+        fresh = os.path.join(self.media_root, 'uploads', 'fresh.csv')
+        for path in (stale, fresh):
+            with open(path, 'w') as f:
+                f.write('x\n')
+        os.utime(stale, (time.time() - 7200, time.time() - 7200))
+
+        # 预算只够上传文件：缓存和清洗结果按 LRU 回收，上传文件保留
+        uploads = sum(os.path.getsize(data_file.file.path) for data_file in self.files)
+        report = collect(budget=uploads + 2)
+        self.assertEqual(report['orphans'], ['cleaned/stale.csv'])
+        self.assertIn(cleaned.file.name, report['evicted'])
+        self.assertLessEqual(report['total_bytes'], uploads + 2)
+        self.assertFalse(os.path.exists(cleaned.file.path))
+        self.assertTrue(os.path.exists(fresh))
+        self.assertTrue(all(os.path.exists(data_file.file.path) for data_file in self.files))
+
+        # 被回收的清洗结果在使用时重新生成，内容不变
+        response = self.client.post('/api/analysisresults/analyze/', {
+            'file_id': self.files[0].id, 'cleaned_data_id': cleaned.id,
+            'analysis_type': 'clustering', 'parameters': {'features': ['a', 'b'], 'n_clusters': 2},
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        with open(cleaned.file.path, 'rb') as f:
+            self.assertEqual(f.read(), original)
+
+    def test_deleting_records_releases_files(self):
+        import os
+
+        shared = [self.clean(data_file) for data_file in self.files]
+        self.assertEqual(shared[0].file.name, shared[1].file.name)
+        upload = self.files[0].file.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/datafiles/{self.files[0].id}/')
+        self.assertFalse(os.path.exists(upload))
+        # 另一个文件的清洗记录仍引用同一个结果文件
+        self.assertTrue(os.path.exists(shared[1].file.path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.files[1].delete()
+        self.assertFalse(os.path.exists(shared[1].file.path))
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'cleaned')), [])
+
+
+class ChunkedUploadTest(MediaRootTestCase):
+    username = 'chunks'
+
+    def put(self, session_id, offset, chunk, checksum=None):
+        import hashlib
+
+        return self.client.put(
+            f'/api/uploads/{session_id}/?offset={offset}', chunk, content_type='application/octet-stream',
+            HTTP_X_CONTENT_SHA256=checksum or hashlib.sha256(chunk).hexdigest(),
+        )
+
+    def test_resumable_upload_parses_on_arrival(self):
+        import pandas as pd
+
+        from .loading import get_plan, infer_plan
+        from .sketches import build_sketches, load_sketches
+
+        path = generate_weather_dataset(f'{self.media_root}/weather.csv', n_rows=600, n_cols=12)
+        with open(path, 'rb') as f:
+            content = f.read()
+        session = self.client.post('/api/uploads/', {'name': 'weather.csv', 'size': len(content)}, format='json').json()
+
+        # 块边界落在行中间；第二块先以错误的校验和、错误的 offset 上传
+        chunk_size = 5000
+        offset = 0
+        while offset < len(content):
+            chunk = content[offset:offset + chunk_size]
+            if offset == chunk_size:
+                self.assertEqual(self.put(session['id'], offset, chunk, checksum='0' * 64).status_code, 400)
+                conflict = self.put(session['id'], offset + 10, chunk)
+                self.assertEqual((conflict.status_code, conflict.json()['received']), (409, offset))
+            response = self.put(session['id'], offset, chunk)
+            self.assertEqual(response.status_code, 200, response.content)
+            offset = response.json()['received']
+            self.assertLessEqual(response.json()['parsed'], offset)
+        progress = self.client.get(f'/api/uploads/{session["id"]}/').json()
+        self.assertEqual(progress['received'], len(content))
+        self.assertGreater(progress['rows'], 500)
+
+        response = self.client.post(f'/api/uploads/{session["id"]}/finalize/')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['profile']['rows'], 600)
+        data_file = DataFile.objects.get(id=response.json()['id'])
+        with open(data_file.file.path, 'rb') as f:
+            self.assertEqual(f.read(), content)
+        again = self.client.post(f'/api/uploads/{session["id"]}/finalize/')
+        self.assertEqual(again.json()['id'], data_file.id)
+
+        # 逐块合并得到的类型计划与读取整个文件推断的相同，分布摘要的计数和均值一致
+        df = pd.read_csv(path)
+        expected = infer_plan(df)['columns']
+        plan = get_plan(data_file.file.path)['columns']
+        self.assertEqual({col: spec['dtype'] for col, spec in plan.items()},
+                         {col: spec['dtype'] for col, spec in expected.items()})
+        sketches = load_sketches(data_file)
+        for column, sketch in build_sketches(df).items():
+            self.assertEqual(sketches[column].count, sketch.count)
+            self.assertAlmostEqual(sketches[column].mean, sketch.mean)
+        self.assertEqual(self.client.get(f'/api/datafiles/{data_file.id}/preview/').status_code, 200)
+
+    def test_malformed_chunk_is_rejected(self):
+        content = b'DATE,a,b\n20000101,1.5,2\n20000102,2.5,3\n'
+        session = self.client.post('/api/uploads/', {'name': 'bad.csv', 'size': len(content)}, format='json').json()
+        self.assertEqual(self.put(session['id'], 0, content[:24]).status_code, 200)
+        bad = self.put(session['id'], 24, b'20000102,2.5,3,4,5\n')
+        self.assertEqual((bad.status_code, bad.json()['received']), (400, 24))
+        self.assertEqual(self.put(session['id'], 24, content[24:]).status_code, 200)
+        self.assertEqual(self.client.post(f'/api/uploads/{session["id"]}/finalize/').status_code, 201)
+
+        other = self.client.post('/api/uploads/', {'name': 'x.csv', 'size': 10}, format='json').json()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f'/api/uploads/{other["id"]}/').status_code, 204)
+        self.assertEqual(self.client.get(f'/api/uploads/{other["id"]}/').status_code, 404)
+
+
+class AdmissionTest(MediaRootTestCase):
+    username = 'queued'
+    settings_overrides = {'ADMISSION_SLOTS': 1, 'ADMISSION_USER_QUEUE': 0}
+
+    def test_fair_queueing_and_limits(self):
+        from .admission import AdmissionController, AdmissionRejected
+
+        controller = AdmissionController(slots=1, user_limit=1, user_queue=2, queue_limit=4)
+        granted = []
+        tickets = {}
+        for name, user_id in (('a1', 'a'), ('a2', 'a'), ('a3', 'a'), ('b1', 'b')):
+            tickets[name] = controller.enqueue(user_id, 'analyze', callback=lambda t, name=name: granted.append(name))
+        # a1 立即运行；b1 虽然最后提交，但虚拟完成时间早于 a2、a3
+        self.assertEqual(granted, ['a1'])
+        with self.assertRaises(AdmissionRejected) as rejected:
+            controller.enqueue('a', 'analyze')
+        self.assertGreaterEqual(rejected.exception.retry_after, 1)
+        self.assertTrue(tickets['a3'].cancel())
+        for name in ('a1', 'b1', 'a2'):
+            tickets[name].release()
+        self.assertEqual(granted, ['a1', 'b1', 'a2'])
+        snapshot = controller.snapshot()
+        self.assertEqual((snapshot['in_use'], snapshot['queue_depth'], snapshot['rejected']), (0, 0, 1))
+        self.assertEqual(snapshot['wait']['count'], 3)
+
+    def test_busy_endpoint_returns_429(self):
+        from django.core.files.base import ContentFile
+
+        from .admission import get_controller
+
+        # /api/metrics/ 仅管理员可访问
+        self.user.is_staff = True
+        self.user.save()
+        data_file = DataFile.objects.create(
+            user=self.user, name='small.csv', file=ContentFile(b'a,b\n1,2\n3,5\n4,4\n6,9\n', name='small.csv'),
+        )
+        request = {'file_id': data_file.id, 'analysis_type': 'clustering',
+                   'parameters': {'features': ['a', 'b'], 'n_clusters': 2}}
+        holder = get_controller().enqueue('other', 'analyze')
+        response = self.client.post('/api/analysisresults/analyze/', request, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        metrics = self.client.get('/api/metrics/').json()['admission']
+        self.assertEqual((metrics['in_use'], metrics['rejected']), (1, 1))
+
+        holder.release()
+        response = self.client.post('/api/analysisresults/analyze/', request, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIn('admission', response['Server-Timing'])
+
+
+class ColumnMeansEngine(AnalysisEngine):
+    """测试用的分析引擎：各特征列的均值"""
+
+    label = '均值分析'
+
+    def fit(self, context, prepared):
+        return prepared['X'].mean()
+
+    def serialize(self, context, prepared, fitted):
+        return {'means': fitted.to_numpy(), 'feature_names': context.features}
+
+
+class AnalysisEngineTest(MediaRootTestCase):
+    username = 'engines'
+
+    def setUp(self):
+        from django.core.files import File
+
+        super().setUp()
+
+        path = generate_weather_dataset(f'{self.media_root}/weather.csv', n_rows=200, n_cols=10)
+        with open(path, 'rb') as f:
+            self.data_file = DataFile.objects.create(user=self.user, name='weather.csv', file=File(f, name='weather.csv'))
+        self.features, _ = weather_columns(10)
+
+    def test_url_import_does_not_load_data_libraries(self):
+        import subprocess
+        import sys
+
+        from django.conf import settings
+
+        code = (
+            'import os, sys, django; os.environ["DJANGO_SETTINGS_MODULE"] = "backend.settings"; django.setup(); '
+            'import backend.urls; print(sorted(m for m in ("pandas", "numpy", "sklearn") if m in sys.modules))'
+        )
+        output = subprocess.run([sys.executable, '-c', code], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), '[]')
+
+    def test_engine_registered_in_settings(self):
+        with self.settings(ANALYSIS_ENGINES={'column_means': 'api.tests.ColumnMeansEngine'}):
+            response = self.client.post('/api/analysisresults/analyze/', {
+                'file_id': self.data_file.id,
+                'analysis_type': 'column_means',
+                'parameters': {'features': self.features[:3]},
+            }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        result = response.json()['result']
+        self.assertEqual(result['feature_names'], self.features[:3])
+        self.assertEqual(len(result['means']), 3)
+
+        unknown = self.client.post('/api/analysisresults/analyze/', {
+            'file_id': self.data_file.id, 'analysis_type': 'column_means', 'parameters': {},
+        }, format='json')
+        self.assertEqual(unknown.status_code, 400)
+        missing_target = self.client.post('/api/analysisresults/analyze/', {
+            'file_id': self.data_file.id, 'analysis_type': 'regression', 'parameters': {},
+        }, format='json')
+        self.assertEqual(missing_target.status_code, 400)
+
+
+class ProgressEventsTest(MediaRootMixin, TransactionTestCase):
+    """progress=stream 的进度事件流，以及取消检查点"""
+
+    username = 'progress'
+
+    def setUp(self):
+        from django.core.files import File
+
+        super().setUp()
+
+        path = generate_weather_dataset(f'{self.media_root}/weather.csv', n_rows=1000, n_cols=8)
+        with open(path, 'rb') as f:
+            self.data_file = DataFile.objects.create(user=self.user, name='weather.csv', file=File(f, name='weather.csv'))
+        self.features, _ = weather_columns(8)
+
+    def _events(self, response):
+        import json
+
+        events = []
+        for block in b''.join(response.streaming_content).decode('utf-8').split('\n\n'):
+            fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+            if 'event' in fields:
+                events.append((fields['event'], json.loads(fields['data'])))
+        return events
+
+    def test_stream_random_forest_progress(self):
+        response = self.client.post('/api/analysisresults/analyze/?progress=stream', {
+            'file_id': self.data_file.id,
+            'analysis_type': 'regression',
+            'parameters': {'features': self.features[1:], 'target': self.features[0], 'algorithm': 'random_forest'},
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/event-stream'))
+        events = self._events(response)
+
+        stages = [data['stage'] for name, data in events if name == 'progress']
+        self.assertEqual(
+            [stage for i, stage in enumerate(stages) if i == 0 or stages[i - 1] != stage],
+            ['loading', 'feature_prep', 'fitting', 'persisting'],
+        )
+        trees = [data['trees'] for name, data in events if name == 'progress' and 'trees' in data]
+        self.assertEqual(trees, list(range(10, 101, 10)))
+        progress = [data['progress'] for name, data in events if name == 'progress']
+        self.assertEqual(progress, sorted(progress))
+
+        name, result = events[-1]
+        self.assertEqual((name, result['status']), ('result', 200))
+        saved = AnalysisResult.objects.get(id=result['data']['id'])
+        # 分批拟合与一次拟合 100 棵树的结果相同
+        direct = self.client.post('/api/analysisresults/analyze/', {
+            'file_id': self.data_file.id,
+            'analysis_type': 'regression',
+            'parameters': {'features': self.features[1:], 'target': self.features[0], 'algorithm': 'random_forest'},
+        }, format='json')
+        self.assertEqual(direct.json()['result']['metrics'], saved.result['metrics'])
+
+        job_id = response['X-Job-Id']
+        self.assertEqual(self.client.get(f'/api/jobs/{job_id}/').json()['state'], 'succeeded')
+        other = User.objects.create_user(username='other', password='other')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(f'/api/jobs/{job_id}/').status_code, 403)
+
+    def test_cancel_checkpoints(self):
+        from types import SimpleNamespace
+
+        from sklearn.ensemble import RandomForestRegressor
+
+        from .progress import Job, JobCancelled, event_stream, fit_forest
+
+        job = Job(self.user.id, 'analyze')
+        request = SimpleNamespace(progress_job=job)
+        X = np.random.default_rng(0).random((200, 3))
+        model = RandomForestRegressor(n_estimators=100, random_state=42)
+        job.report('fitting', 0.3)
+        job.cancel()
+        with self.assertRaises(JobCancelled):
+            fit_forest(request, model, X, X[:, 0], 0.3, 0.9)
+        # 取消后在第一批树之后停止
+        self.assertEqual(len(model.estimators_), 10)
+
+        # 事件流被关闭（客户端断开连接）时取消任务
+        job = Job(self.user.id, 'analyze')
+        stream = event_stream(job, cancel_on_close=True)
+        next(stream)
+        stream.close()
+        self.assertTrue(job.cancel_requested)
+
+
+class AsgiOffloadTest(MediaRootMixin, TransactionTestCase):
+    """ASGI 部署：异步中间件、卸载到线程池的视图和异步事件流"""
+
+    username = 'asgi'
+
+    def setUp(self):
+        from django.core.files import File
+        from rest_framework.authtoken.models import Token
+
+        super().setUp()
+        self.token = Token.objects.create(user=self.user)
+        path = generate_weather_dataset(f'{self.media_root}/weather.csv', n_rows=200, n_cols=6)
+        with open(path, 'rb') as f:
+            self.data_file = DataFile.objects.create(user=self.user, name='weather.csv', file=File(f, name='weather.csv'))
+
+    def test_offloaded_preview_runs_in_pool(self):
+        import asyncio
+        import threading
+
+        from asgiref.sync import async_to_sync
+        from rest_framework.test import APIRequestFactory, force_authenticate
+
+        from .offload import offload_patterns
+        from .urls import router
+
+        patterns = {pattern.name: pattern for pattern in offload_patterns(router.urls)}
+        preview = patterns['datafile-preview'].callback
+        self.assertTrue(asyncio.iscoroutinefunction(preview))
+        self.assertFalse(asyncio.iscoroutinefunction(patterns['datafile-list'].callback))
+
+        threads = []
+        inner = {pattern.name: pattern for pattern in router.urls}['datafile-preview'].callback
+
+        def spy(request, *args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return inner(request, *args, **kwargs)
+
+        from .offload import offload
+        request = APIRequestFactory().get(f'/api/datafiles/{self.data_file.id}/preview/')
+        force_authenticate(request, user=self.user)
+        response = async_to_sync(offload(spy, 'read'))(request, pk=str(self.data_file.id))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_rendered)
+        self.assertIn(b'"data"', response.content)
+        self.assertTrue(threads[0].startswith('api-read'))
+
+    async def test_async_middleware_chain(self):
+        from django.test import AsyncClient
+
+        response = await AsyncClient().get('/api/datafiles/', headers={'Authorization': f'Token {self.token.key}'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+    def test_async_event_stream(self):
+        from asgiref.sync import async_to_sync
+
+        from .progress import Job, async_event_stream
+
+        job = Job(self.user.id, 'analyze')
+        job.report('loading', 0.1)
+        job.finish('succeeded', {'status': 200, 'data': {'id': 1}})
+
+        async def collect():
+            return [chunk async for chunk in async_event_stream(job)]
+
+        chunks = async_to_sync(collect)()
+        self.assertEqual(chunks[0], b'retry: 3000\n\n')
+        self.assertIn(b'event: progress', chunks[1])
+        self.assertIn(b'event: result', chunks[2])
+
+
+class LoadTestCommandTest(MediaRootMixin, LiveServerTestCase):
+    """对测试服务器运行一次小规模的 full 场景负载测试"""
+
+    def test_full_scenario_report_and_budget(self):
+        import json
+        import os
+
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+
+        output = os.path.join(self.media_root, 'loadtest.json')
+        options = {
+            'base_url': f'{self.live_server_url}/api', 'concurrency': 1, 'flows': 2,
+            'rows': 200, 'cols': 8, 'data_dir': self.media_root, 'output': output,
+        }
+        call_command('loadtest', budget=['*:p99=60000'], max_error_rate=0.0, rate=5, **options)
+        with open(output, encoding='utf-8') as f:
+            report = json.load(f)
+        self.assertEqual(report['flows'], {**report['flows'], 'completed': 2, 'failed': 0})
+        for endpoint in ('login', 'upload', 'preview', 'clean_data', 'analyze', 'visualize'):
+            stats = report['endpoints'][endpoint]
+            self.assertEqual((stats['requests'], stats['errors']), (2, 0))
+            self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+        self.assertEqual(report['endpoints']['overall']['requests'], 12)
+        # 开环模式（--rate）额外统计到达后的排队时间
+        self.assertIsNotNone(report['queue_delay']['p50_ms'])
+        self.assertTrue(all(check['passed'] for check in report['budgets']))
+        # 结束后虚拟用户上传的文件已删除
+        self.assertFalse(DataFile.objects.exists())
+
+        with self.assertRaises(CommandError):
+            call_command('loadtest', budget=['overall:p50=0.001'], **options)
@@ -0,0 +1,237 @@
+"""
+请求分阶段计时
+
+用法：
+    from .timing import stage, mark
+
+    with stage(request, 'read_csv'):
+        df = pd.read_csv(path)
+
+    # 或者在长流程中按顺序打点，记录距上一次打点（或请求开始）经过的时间
+    mark(request, 'fit')
+
+ServerTimingMiddleware 为每个请求挂载一个 StageTimer，请求结束时：
+1. 以 Server-Timing 响应头返回各阶段耗时（浏览器开发者工具可直接查看）；
+2. 把各阶段耗时累计到按 (接口, 阶段) 分组的延迟直方图中，通过 MetricsView 读取。
+
+settings.API_TIMING_ENABLED 为 False 时中间件不会加载，stage()/mark() 只做一次属性查找。
+"""
+import re
+import threading
+import time
+from contextlib import nullcontext
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+# 直方图桶上界（毫秒），最后一个桶收集所有更大的值
+DEFAULT_BUCKETS_MS = (
+    1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000,
+)
+
+# Server-Timing 的指标名必须是 token，不允许空格等字符
+_TOKEN_INVALID = re.compile(r'[^A-Za-z0-9_.\-]')
+
+_NULL_STAGE = nullcontext()
+
+
+class StageTimer:
+    """记录单个请求中各阶段的耗时（秒）"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last_mark = self.started
+        self.stages = []
+        self.total = None
+
+    def add(self, name, duration):
+        self.stages.append((name, duration))
+
+    def stage(self, name):
+        return _StageContext(self, name)
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.add(name, now - self._last_mark)
+        self._last_mark = now
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+        return self.total
+
+    def header_value(self):
+        """生成 Server-Timing 头，例如 read_csv;dur=12.3, fit;dur=80.1, total;dur=95.0"""
+        parts = [f'{_TOKEN_INVALID.sub("_", name)};dur={duration * 1000:.1f}' for name, duration in self.stages]
+        if self.total is not None:
+            parts.append(f'total;dur={self.total * 1000:.1f}')
+        return ', '.join(parts)
+
+
+class _StageContext:
+    __slots__ = ('timer', 'name', 'start')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        now = time.perf_counter()
+        self.timer.add(self.name, now - self.start)
+        self.timer._last_mark = now
+        return False
+
+
+def get_timer(request):
+    """取得请求上的 StageTimer；计时未启用时返回 None（兼容 DRF Request 和 HttpRequest）"""
+    return getattr(request, 'stage_timer', None)
+
+
+def stage(request, name):
+    """计时上下文管理器；计时未启用时返回空上下文"""
+    timer = get_timer(request)
+    if timer is None:
+        return _NULL_STAGE
+    return timer.stage(name)
+
+
+def mark(request, name):
+    """结束名为 name 的阶段：记录从上一次打点到现在的耗时"""
+    timer = get_timer(request)
+    if timer is not None:
+        timer.mark(name)
+
+
+class LatencyHistogram:
+    """固定桶的延迟直方图（毫秒），记录次数、总和与最大值，可估算分位数"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value_ms):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value_ms <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value_ms
+        self.max = max(self.max, value_ms)
+
+    def quantile(self, q):
+        """按桶上界估算分位数（保守估计，落在最后一个桶时返回最大值）"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return float(self.buckets[i]) if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum_ms': round(self.sum, 3),
+            'mean_ms': round(self.sum / self.count, 3) if self.count else None,
+            'max_ms': round(self.max, 3),
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99),
+            'buckets': {
+                **{f'le_{bound}': count for bound, count in zip(self.buckets, self.counts)},
+                'le_inf': self.counts[-1],
+            },
+        }
+
+
+class TimingRegistry:
+    """进程内按 (接口, 阶段) 聚合的直方图集合，线程安全"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, timer):
+        with self._lock:
+            for name, duration in timer.stages + [('total', timer.total or 0.0)]:
+                histogram = self._histograms.get((endpoint, name))
+                if histogram is None:
+                    histogram = self._histograms[(endpoint, name)] = LatencyHistogram(self.buckets)
+                histogram.observe(duration * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {}
+            for (endpoint, name), histogram in sorted(self._histograms.items()):
+                endpoints.setdefault(endpoint, {})[name] = histogram.snapshot()
+            return endpoints
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+registry = TimingRegistry()
+
+
+def endpoint_name(request):
+    """用于聚合的接口名，例如 'POST analysisresult-analyze'；未匹配到路由时使用路径"""
+    match = getattr(request, 'resolver_match', None)
+    name = match.view_name if match is not None and match.view_name else request.path
+    return f'{request.method} {name}'
+
+
+class ServerTimingMiddleware:
+    """
+    为每个请求计时，写入 Server-Timing 响应头并汇总到 registry。
+
+    同时支持同步和异步调用：ASGI 部署下不会因为这个中间件把异步视图切换回同步线程。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'API_TIMING_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.stage_timer = StageTimer()
+        return self._finish(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        request.stage_timer = StageTimer()
+        return self._finish(request, await self.get_response(request))
+
+    def _finish(self, request, response):
+        timer = request.stage_timer
+        # DRF 的 Response 在 process_template_response 之后才渲染成 JSON，
+        # 这里把渲染开始到现在的时间记为 render 阶段
+        render_started = getattr(request, '_render_started', None)
+        if render_started is not None:
+            timer.add('render', time.perf_counter() - render_started)
+        timer.finish()
+
+        response['Server-Timing'] = timer.header_value()
+        registry.record(endpoint_name(request), timer)
+        return response
+
+    def process_template_response(self, request, response):
+        request._render_started = time.perf_counter()
+        return response
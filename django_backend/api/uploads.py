@@ -0,0 +1,316 @@
+"""
+可续传的分块上传（/api/uploads/）
+
+单文件上传（POST /api/datafiles/）要等整个 multipart 请求体接收完才开始处理，之后还要从头再解析一遍文件
+生成类型计划和分布摘要；连接中断时只能重新上传整个文件。分块上传的流程：
+
+1. POST /api/uploads/ {name, size, description}：创建会话，返回会话 ID 和建议的块大小（settings.UPLOAD_CHUNK_SIZE）；
+2. PUT /api/uploads/{id}/?offset=N：请求体为从第 N 字节开始的一块原始数据，请求头 X-Content-SHA256 为这块数据的
+   SHA-256（十六进制）。offset 必须等于已接收的字节数，否则返回 409 和 received（已接收的字节数），
+   客户端从 received 处继续；校验和不符的块返回 400，不写入文件；
+3. GET /api/uploads/{id}/：查询已接收的字节数等，断线后据此续传；
+4. POST /api/uploads/{id}/finalize/：全部字节接收后创建 DataFile，返回文件记录和概况；重复调用返回同一个文件；
+5. DELETE /api/uploads/{id}/：放弃上传，删除已接收的数据。
+
+每收到一块，就把上次剩下的不完整行和这一块拼起来，解析其中的完整行（引号内的换行不算行尾）：
+
+- 解析失败（例如某行的字段数多于表头）的块直接返回 400，不写入文件，客户端可以修正后重新上传这一块；
+- 各列的统计（loading.column_stats）和数值列的分布摘要（sketches.ColumnSketch）逐块合并后保存在会话中；
+- 文件内容的 SHA-256 在进程内边接收边计算（服务重启或请求被其他进程处理时，完成时再读一遍文件计算）。
+
+完成时只需解析最后一行，由合并的统计得出类型计划，连同分布摘要和概况一起就绪，第一次读取文件时不用再推断类型计划。
+压缩的 CSV、Parquet 和 Arrow 文件（按第一块开头的魔数判断，见 api/formats.py）在接收时只校验和写入，完成时整体读取一遍。
+超过 settings.UPLOAD_SESSION_TTL 秒没有新的块的会话过期，未完成的文件由存储回收删除（见 api/storage.py）。
+"""
+import hashlib
+import io
+import threading
+from datetime import timedelta
+
+import pandas as pd
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import file_digest, remember_digest
+from .formats import CSV, MAGIC_BYTES, detect_bytes, read_table
+from .loading import column_stats, merge_column_stats, plan_from_stats, store_plan
+from .models import DataFile, DistributionSketch, UploadSession, get_file_path
+from .sketches import ColumnSketch, build_sketches, sketch_rows
+
+# 会话状态中最多保存的各块校验和数量（用于排查问题，不参与校验）
+MAX_RECORDED_CHUNKS = 1000
+
+_locks = {}
+_locks_guard = threading.Lock()
+# 会话 ID → (已计算到的字节数, hashlib 对象)
+_hashers = {}
+
+
+class UploadError(ValueError):
+    """请求不合法；status 为返回的 HTTP 状态码，details 为响应中的附加字段"""
+
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+def _session_lock(session_id):
+    # 同一会话的块按顺序写入；多进程部署时还依赖 select_for_update 锁定会话记录
+    with _locks_guard:
+        return _locks.setdefault(str(session_id), threading.Lock())
+
+
+def _forget(session_id):
+    with _locks_guard:
+        _locks.pop(str(session_id), None)
+    _hashers.pop(str(session_id), None)
+
+
+def expires_at(session):
+    return session.updated_at + timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+
+
+def expired(session):
+    return session.status == 'open' and expires_at(session) < timezone.now()
+
+
+def create_session(user, name, size, description=''):
+    """创建会话和空文件"""
+    if not name:
+        raise UploadError('缺少文件名 name')
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError('size 必须是文件的总字节数')
+    if not 0 < size <= settings.UPLOAD_MAX_BYTES:
+        raise UploadError(f'size 必须在 1 到 {settings.UPLOAD_MAX_BYTES} 之间')
+    stored = default_storage.save(get_file_path(None, name), io.BytesIO())
+    session = UploadSession.objects.create(user=user, name=name, description=description or '', file=stored, size=size)
+    _hashers[str(session.id)] = (0, hashlib.sha256())
+    return session
+
+
+def session_info(session):
+    state = session.state
+    return {
+        'id': str(session.id),
+        'name': session.name,
+        'status': session.status,
+        'format': state.get('format'),
+        'size': session.size,
+        'received': session.received,
+        'parsed': session.parsed,
+        'rows': session.rows,
+        'columns': state.get('columns', []),
+        'chunk_size': settings.UPLOAD_CHUNK_SIZE,
+        'max_chunk_bytes': settings.UPLOAD_MAX_CHUNK_BYTES,
+        'expires_at': expires_at(session) if session.status == 'open' else None,
+        'data_file': session.data_file_id,
+    }
+
+
+def _line_end(data):
+    """data 中第一个不在引号内的换行符之后的位置，没有时返回 -1（data 从行首开始）"""
+    position = data.find(b'\n')
+    while position != -1 and data.count(b'"', 0, position) % 2:
+        position = data.find(b'\n', position + 1)
+    return position + 1 if position != -1 else -1
+
+
+def _complete_length(data):
+    """data 中完整行的字节数：最后一个不在引号内的换行符之后的位置"""
+    end = data.rfind(b'\n') + 1
+    if b'"' in data:
+        while end and data.count(b'"', 0, end) % 2:
+            end = data.rfind(b'\n', 0, end - 1) + 1
+    return end
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+def _parse(header, rows):
+    """按表头解析若干完整行，返回按默认类型读取的 DataFrame"""
+    try:
+        return pd.read_csv(io.BytesIO(header + rows))
+    except (pd.errors.ParserError, UnicodeDecodeError, ValueError) as e:
+        raise UploadError(f'无法解析 CSV 数据: {str(e)}')
+
+
+def _accumulate(state, df):
+    """把解析出的一批行合并进会话状态中的列统计和分布摘要"""
+    stats = column_stats(df)
+    state['stats'] = merge_column_stats(state['stats'], stats) if state.get('stats') else stats
+    sketches = state.setdefault('sketches', {})
+    for column, sketch in build_sketches(df).items():
+        if column in sketches:
+            sketch = ColumnSketch.from_dict(sketches[column]).merge(sketch)
+        sketches[column] = sketch.to_dict()
+
+
+def _consume(session, path, data, final=False):
+    """
+    解析 文件中未解析的部分 + data 里的完整行（final 时解析到结尾），更新会话的解析位置、行数和状态。
+    解析失败时抛出 UploadError，会话不变。
+    """
+    state = dict(session.state)
+    buffer = _read_range(path, session.parsed, session.received) + data
+    offset = session.parsed
+    if 'format' not in state:
+        # 还没有解析过任何数据，buffer 从文件开头开始
+        if len(buffer) < MAGIC_BYTES and not final:
+            return
+        state['format'] = detect_bytes(buffer[:MAGIC_BYTES])
+    if state['format'] != CSV:
+        session.state = state
+        return
+    header_end = state.get('header_end')
+    if header_end is None:
+        end = _line_end(buffer)
+        if end == -1:
+            if final:
+                end = len(buffer)
+            else:
+                return
+        header_end = end
+        header = buffer[:end]
+        columns = _parse(header, b'').columns
+        state['header_end'] = header_end
+        state['columns'] = [str(col) for col in columns]
+        buffer, offset = buffer[end:], end
+    else:
+        header = _read_range(path, 0, header_end)
+
+    length = len(buffer) if final else _complete_length(buffer)
+    rows = 0
+    if buffer[:length].strip():
+        df = _parse(header, buffer[:length])
+        _accumulate(state, df)
+        rows = len(df)
+    session.state = state
+    session.parsed = offset + length
+    session.rows += rows
+
+
+def append_chunk(session, offset, data, checksum):
+    """写入从 offset 开始的一块数据并解析其中的完整行"""
+    with _session_lock(session.id), transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.status != 'open':
+            raise UploadError('上传已完成', status=409, received=session.received)
+        if offset != session.received:
+            raise UploadError(
+                f'offset 应为已接收的字节数 {session.received}', status=409, received=session.received,
+            )
+        if not data:
+            raise UploadError('请求体为空')
+        if len(data) > settings.UPLOAD_MAX_CHUNK_BYTES:
+            raise UploadError(f'单块最多 {settings.UPLOAD_MAX_CHUNK_BYTES} 字节')
+        if offset + len(data) > session.size:
+            raise UploadError(f'超出声明的文件大小 {session.size} 字节')
+        digest = hashlib.sha256(data).hexdigest()
+        if not checksum:
+            raise UploadError('缺少请求头 X-Content-SHA256（这一块数据的 SHA-256）')
+        if checksum.lower() != digest:
+            raise UploadError('校验和不匹配，请重新上传这一块')
+
+        path = session.file.path
+        _consume(session, path, data)
+        # 截断到已确认的长度：之前中断的写入可能在文件末尾留下了未确认的数据
+        with open(path, 'r+b') as f:
+            f.truncate(offset)
+            f.seek(offset)
+            f.write(data)
+
+        hashed = _hashers.get(str(session.id))
+        if hashed is not None and hashed[0] == offset:
+            hashed[1].update(data)
+            _hashers[str(session.id)] = (offset + len(data), hashed[1])
+        else:
+            _hashers.pop(str(session.id), None)
+
+        session.received = offset + len(data)
+        chunks = session.state.setdefault('chunks', [])
+        if len(chunks) < MAX_RECORDED_CHUNKS:
+            chunks.append({'offset': offset, 'bytes': len(data), 'sha256': digest})
+        session.save()
+        return session
+
+
+def profile_from_stats(stats, rows):
+    """与 ingest.profile_frame 相同的文件概况，由合并的列统计得出"""
+    return {
+        'rows': rows,
+        'columns': len(stats),
+        'numeric_columns': sum(stat['kind'] in 'iuf' for stat in stats.values()),
+        'missing_values': sum(stat['nulls'] for stat in stats.values()),
+        'column_names': list(stats),
+    }
+
+
+def finalize(session):
+    """解析最后一行，保存类型计划、分布摘要并创建 DataFile；返回 (DataFile, 概况)"""
+    with _session_lock(session.id), transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.status == 'complete' and session.data_file_id:
+            return session.data_file, session.state.get('profile')
+        if session.received != session.size:
+            raise UploadError(
+                f'还有 {session.size - session.received} 字节未上传', status=409, received=session.received,
+            )
+        path = session.file.path
+        _consume(session, path, b'', final=True)
+        state = session.state
+        if state['format'] != CSV:
+            try:
+                df = read_table(path)
+            except (ValueError, OSError) as e:
+                raise UploadError(f'无法读取 {state["format"]} 文件: {str(e)}')
+            _accumulate(state, df)
+            state['columns'] = [str(col) for col in df.columns]
+            session.rows = len(df)
+        if not session.rows or not state.get('stats'):
+            raise UploadError('文件中没有数据')
+
+        hashed = _hashers.get(str(session.id))
+        if hashed is not None and hashed[0] == session.size:
+            digest = hashed[1].hexdigest()
+            remember_digest(path, digest)
+        else:
+            digest = file_digest(path)
+        stats = state['stats']
+        store_plan(path, plan_from_stats(stats, session.rows), digest)
+
+        data_file = DataFile.objects.create(
+            user=session.user, file=session.file.name, name=session.name,
+            description=session.description, file_type=state['format'],
+        )
+        # 某列在部分块中是数值、在其他块中不是时，整列不是数值列，不保存摘要
+        sketches = {
+            column: ColumnSketch.from_dict(sketch) for column, sketch in state.get('sketches', {}).items()
+            if stats[column]['kind'] in 'iuf'
+        }
+        DistributionSketch.objects.bulk_create(sketch_rows(data_file, sketches))
+
+        profile = profile_from_stats(stats, session.rows)
+        session.state = {
+            'format': state['format'], 'header_end': state.get('header_end'), 'columns': state['columns'],
+            'profile': profile, 'sha256': digest,
+        }
+        session.status = 'complete'
+        session.data_file = data_file
+        session.save()
+    _forget(session.id)
+    return data_file, profile
+
+
+def abort(session):
+    """删除会话；未完成的文件在事务提交后删除（见 api/signals.py）"""
+    session.delete()
+    _forget(session.id)
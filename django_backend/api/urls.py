@@ -1,20 +1,30 @@
 #路由系统，URL与视图绑定
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     DataFileViewSet, CleanedDataViewSet, AnalysisResultViewSet, 
-    VisualizationResultViewSet, RegisterView, CustomAuthToken, UserProfileView
+    VisualizationResultViewSet, JobViewSet, UploadSessionViewSet, RegisterView, CustomAuthToken, UserProfileView, MetricsView,
+    StorageView,
 )
+from .offload import offload_patterns
 
 router = DefaultRouter()
 router.register(r'datafiles', DataFileViewSet)
 router.register(r'cleaneddata', CleanedDataViewSet)
 router.register(r'analysisresults', AnalysisResultViewSet)
 router.register(r'visualizations', VisualizationResultViewSet)
+router.register(r'jobs', JobViewSet, basename='job')
+router.register(r'uploads', UploadSessionViewSet, basename='upload')
+
+# ASGI 部署时，预览、分析等耗时接口在有界线程池中执行（见 api/offload.py）
+router_urls = offload_patterns(router.urls) if settings.API_ASGI_MODE else router.urls
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path('', include(router_urls)),
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', CustomAuthToken.as_view(), name='login'),
     path('profile/', UserProfileView.as_view(), name='profile'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('storage/', StorageView.as_view(), name='storage'),
 ] 
\ No newline at end of file
@@ -7,24 +7,62 @@ from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.views import APIView
+from django.conf import settings
 
-import pandas as pd
-import numpy as np
-import os
-import json
 import traceback
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
+import uuid
 
 from .models import DataFile, CleanedData, AnalysisResult, VisualizationResult, UserProfile
+from .timing import stage, mark, registry as timing_registry
 from .serializers import (
     DataFileSerializer, CleanedDataSerializer, AnalysisResultSerializer, 
-    VisualizationResultSerializer, UserSerializer, UserProfileSerializer, RegisterSerializer
+    VisualizationResultSerializer, UserSerializer, UserProfileSerializer, RegisterSerializer,
+    CleanedDataListSerializer, AnalysisResultListSerializer
 )
+from .pagination import CreatedAtCursorPagination
+from .renderers import EventStreamRenderer, NumpyJSONRenderer
+from .engines import get_engine
+from .admission import enabled as admission_enabled, get_controller as admission_controller, run_admitted
+from .progress import event_response, get_job, report_progress, run_with_progress
+from .storage import collect, maybe_collect, scan, usage as storage_usage
+from .caching import (
+    conditional_response, file_digest, file_etag, record_etag, queryset_etag, request_variant, IMMUTABLE
+)
+
+# pandas / NumPy / sklearn 以及依赖它们的数据处理模块（loading、sketches、joins 等）在用到它们的视图方法中导入，
+# 分析算法由 api/engines/ 中的引擎按需导入，登录、个人信息、列表等请求不加载这些依赖。
+
+# preview 响应格式的版本号，修改 preview 输出格式时递增，使客户端缓存的旧 ETag 失效
+PREVIEW_FORMAT_VERSION = 3
+
+# preview 支持的数据布局：rows（每行一个字典，默认）和 columnar（列式，见 api/columnar.py）
+PREVIEW_LAYOUTS = ('rows', 'columnar')
+
+# 连接文件参数（preview 的查询参数 / analyze 的请求参数）
+JOIN_PARAMETERS = ('join_file_id', 'join_key', 'join_how')
+
+
+def resolve_join(request, params):
+    '''
+    解析连接文件参数：join_file_id（连接文件 ID）、join_key（键列，默认 DATE）、
+    join_how（inner 或 left，默认 inner），见 api/joins.py。
+    返回 (连接参数, 错误响应)；未指定连接文件时连接参数为 None。
+    '''
+    join_file_id = params.get('join_file_id')
+    if not join_file_id:
+        return None, None
+    from .joins import join_options
+
+    try:
+        key, how = join_options(params.get('join_key'), params.get('join_how'))
+        join_file = DataFile.objects.filter(id=int(join_file_id)).first()
+    except (TypeError, ValueError) as e:
+        return None, Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if join_file is None:
+        return None, Response({'error': f'无法找到ID为{join_file_id}的连接文件'}, status=status.HTTP_404_NOT_FOUND)
+    if join_file.user_id != request.user.id and not request.user.is_staff:
+        return None, Response({'error': '没有权限访问连接文件'}, status=status.HTTP_403_FORBIDDEN)
+    return {'file': join_file, 'key': key, 'how': how}, None
 
 class RegisterView(generics.CreateAPIView):
     # 用户注册
@@ -110,65 +148,212 @@ class DataFileViewSet(viewsets.ModelViewSet):
     # 如果用户未登录，则返回空查询集，确保未授权用户无法访问任何文件。
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return DataFile.objects.filter(user=self.request.user)
+            # DataFileSerializer 嵌套了 user，使用 select_related 避免逐条查询用户
+            return DataFile.objects.filter(user=self.request.user).select_related('user')
         return DataFile.objects.none()
 
     # 在保存文件时自动将当前登录用户设置为文件的拥有者。
     # 确保每个文件都与上传的用户关联。
+    # 保存后扫描一遍文件，生成各数值列的分布摘要（箱线图/直方图接口使用）和列类型计划（见 api/loading.py）。
+    # 文件格式（CSV、压缩的 CSV、Parquet、Arrow）按文件内容检测，记录在 file_type 中（见 api/formats.py）。
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        from .formats import MAGIC_BYTES, detect_bytes, read_table
+        from .loading import save_plan
+        from .sketches import build_sketches, save_sketches
+
+        upload = serializer.validated_data['file']
+        file_type = detect_bytes(upload.read(MAGIC_BYTES))
+        upload.seek(0)
+        data_file = serializer.save(user=self.request.user, file_type=file_type)
+        try:
+            with stage(self.request, 'sketch'):
+                df = read_table(data_file.file.path)
+                save_plan(data_file.file.path, df)
+                save_sketches(data_file, build_sketches(df))
+        except Exception as e:
+            # 摘要生成失败不影响上传，distribution 接口会在首次访问时重试
+            print(f"生成分布摘要失败: {str(e)}")
+        # 设置了容量预算时检查磁盘用量（见 api/storage.py）
+        maybe_collect()
+
+    # 批量上传：一次请求上传多个 CSV 文件（表单字段 files，可重复）或一个 zip 压缩包（字段 archive）。
+    # 文件在有界线程池中并行保存、解析、校验并生成概况，成功的文件在一个事务中创建记录（见 api/ingest.py）。
+    # 响应包含每个文件的状态以及整体吞吐量；至少有一个文件成功时返回 201。
+    @action(detail=False, methods=['post'])
+    def bulk_upload(self, request):
+        # 与 analyze、clean_data 一样先经过准入控制（见 api/admission.py）
+        return run_admitted(request, 'bulk_upload', lambda: self._bulk_upload(request))
+
+    def _bulk_upload(self, request):
+        from .ingest import BulkUploadError, bulk_ingest, collect_uploads
+
+        try:
+            uploads = collect_uploads(request.FILES.getlist('files'), request.FILES.get('archive'))
+            mark(request, 'collect')
+            files, summary = bulk_ingest(request.user, uploads, request.data.get('description', ''))
+        except BulkUploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        mark(request, 'ingest')
+
+        response_status = status.HTTP_201_CREATED if summary['created'] else status.HTTP_400_BAD_REQUEST
+        maybe_collect()
+        return Response({'files': files, **summary}, status=response_status)
 
     # 定义了一个自定义动作 preview，通过 @action 装饰器标记为支持 GET 请求的视图。
+    # 响应带有由文件内容计算的 ETag，客户端携带 If-None-Match 重复请求时直接返回 304。
+    # 查询参数 layout=columnar 时以列式格式返回数据（列名不再在每一行中重复）。
+    # 查询参数 join_file_id（以及 join_key、join_how）指定连接文件时，返回两个文件在键列上连接后的数据。
     @action(detail=True, methods=['get'])
     def preview(self, request, pk=None):
         # data_file = self.get_object() 获取当前请求的文件对象。
         data_file = self.get_object()
+        layout = request.query_params.get('layout', 'rows')
+        if layout not in PREVIEW_LAYOUTS:
+            return Response({'error': f'不支持的数据布局: {layout}，可选值: {", ".join(PREVIEW_LAYOUTS)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        join, error = resolve_join(request, request.query_params)
+        if error is not None:
+            return error
         try:
-            # 使用 pandas 读取文件路径中的 CSV 文件内容。
-            df = pd.read_csv(data_file.file.path)
-            
+            with stage(request, 'etag'):
+                etag = file_etag(
+                    data_file.file.path, PREVIEW_FORMAT_VERSION, request_variant(request),
+                    file_digest(join['file'].file.path) if join else '',
+                )
+        except OSError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return conditional_response(request, etag, lambda: self._build_preview(request, data_file, layout, join))
+
+    def _build_preview(self, request, data_file, layout='rows', join=None):
+        from .columnar import encode_columnar
+        from .joins import read_joined
+        from .loading import export_frame, memory_report, read_frame
+
+        try:
+            # 按列类型计划读取 CSV 文件内容（指定了连接文件时读取连接后的数据），
+            # 输出前还原为文件中的原始表示（DATE 为 YYYYMMDD 整数等）。
+            join_info = None
+            with stage(request, 'read_csv'):
+                if join:
+                    df, join_info = read_joined(data_file.file.path, join['file'].file.path, join['key'], join['how'])
+                    memory = None
+                else:
+                    df = read_frame(data_file.file.path)
+                    memory = memory_report(df, data_file.file.path)
+                df = export_frame(df)
+
             # 确保布尔值被正确序列化
             df = df.replace({True: 'true', False: 'false'})
             
-            # 确保数据类型兼容JSON序列化
-            # 遍历 CSV 文件的每一行，将数据逐列处理：
-            # 如果值是空值（NaN），设置为 None。
-            # 如果值是整数类型，转换为 Python 的 int。
-            # 如果值是浮点数类型，转换为 Python 的 float。
-            # 其他类型直接保留原值。
-            # 最终将每一行数据存储为字典，并添加到 data_dict 列表中。
-            data_dict = []
-            for _, row in df.iterrows():
-                row_dict = {}
-                for col in df.columns:
-                    value = row[col]
-                    if pd.isna(value):
-                        row_dict[col] = None
-                    elif isinstance(value, (np.int64, np.int32)):
-                        row_dict[col] = int(value)
-                    elif isinstance(value, (np.float64, np.float32)):
-                        row_dict[col] = float(value)
-                    else:
-                        row_dict[col] = value
-                data_dict.append(row_dict)
+            # rows：将每一行转换为 {列名: 值} 的字典。
+            # 空值（NaN）和 NumPy 类型由 NumpyJSONRenderer 在输出时处理（NaN 输出为 null），
+            # 这里不再逐个单元格转换。
+            # columnar：每列一个数组，字符串列字典编码，空值用有效位图表示。
+            if layout == 'columnar':
+                data = encode_columnar(df)
+            else:
+                data = df.to_dict(orient='records')
+            mark(request, 'serialize')
 
             # 返回一个包含以下信息的 JSON 响应：
             # columns：CSV 文件的列名列表。
-            # data：处理后的文件内容，每一行是一个字典。
-            # info：文件的元信息，包括数据形状（行数和列数）以及每列的数据类型。
-            return Response({
+            # layout：data 的布局（rows 或 columnar）。
+            # data：处理后的文件内容。
+            # info：文件的元信息，包括数据形状（行数和列数）、每列的数据类型，
+            #       以及按列类型计划读取时的内存占用（memory，与默认类型相比节省的字节数）。
+            # join：指定了连接文件时的连接信息（键列、连接方式、未匹配行数等）。
+            body = {
                 'columns': df.columns.tolist(),
-                'data': data_dict,
+                'layout': layout,
+                'data': data,
                 'info': {
                     'shape': [int(x) for x in df.shape],
                     'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()}
                 }
-            })
+            }
+            if memory:
+                body['info']['memory'] = memory
+            if join_info:
+                body['join'] = join_info
+            return Response(body)
         # 捕获文件读取或处理过程中可能发生的异常。
         # 返回包含错误信息的响应，状态码为 400（错误请求）。
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    # 箱线图/直方图数据：读取上传或清洗时生成的分布摘要，计算量只与分箱数有关，与行数无关。
+    # 查询参数：
+    #   columns：逗号分隔的列名，默认所有数值列
+    #   bins：直方图分箱数（1 到 FINE_BINS），默认 20
+    #   cleaned_data_id：使用该文件某个清洗结果的分布
+    @action(detail=True, methods=['get'])
+    def distribution(self, request, pk=None):
+        from .cleaning import restore_cleaned
+        from .sketches import FINE_BINS, SKETCH_VERSION
+
+        data_file = self.get_object()
+
+        cleaned_data = None
+        cleaned_data_id = request.query_params.get('cleaned_data_id')
+        if cleaned_data_id:
+            cleaned_data = get_object_or_404(CleanedData, id=cleaned_data_id, original_file=data_file)
+
+        try:
+            bins = int(request.query_params.get('bins', 20))
+        except ValueError:
+            return Response({'error': 'bins 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= bins <= FINE_BINS:
+            return Response({'error': f'bins 必须在 1 到 {FINE_BINS} 之间'}, status=status.HTTP_400_BAD_REQUEST)
+
+        columns = request.query_params.get('columns')
+        columns = [col for col in columns.split(',') if col] if columns else None
+
+        try:
+            # 清洗结果文件已被回收时先重新生成
+            path = restore_cleaned(cleaned_data) if cleaned_data else data_file.file.path
+            etag = file_etag(path, 'distribution', SKETCH_VERSION, request_variant(request))
+        except OSError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return conditional_response(
+            request, etag,
+            lambda: self._build_distribution(request, data_file, cleaned_data, columns, bins),
+        )
+
+    def _build_distribution(self, request, data_file, cleaned_data, columns, bins):
+        from .loading import export_frame, read_frame
+        from .sketches import build_sketches, load_sketches, save_sketches
+
+        with stage(request, 'load_sketches'):
+            sketches = load_sketches(data_file, cleaned_data, columns)
+        if not sketches:
+            # 上传时未能生成摘要（或是生成摘要功能上线前的旧文件）：现在补上
+            try:
+                source = cleaned_data or data_file
+                with stage(request, 'sketch'):
+                    all_sketches = build_sketches(export_frame(read_frame(source.file.path)))
+                    save_sketches(data_file, all_sketches, cleaned_data)
+            except Exception as e:
+                return Response({'error': f'生成分布摘要失败: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+            sketches = {col: all_sketches[col] for col in (columns or all_sketches) if col in all_sketches}
+
+        result = {}
+        for column, sketch in sketches.items():
+            result[column] = {
+                **sketch.summary(),
+                'box': sketch.box(),
+                'histogram': sketch.histogram_data(bins),
+            }
+        mark(request, 'serialize')
+
+        return Response({
+            'file_id': data_file.id,
+            'cleaned_data_id': cleaned_data.id if cleaned_data else None,
+            'bins': bins,
+            'columns': result,
+            # 请求了但不是数值列（或不存在）的列
+            'missing': [col for col in (columns or []) if col not in result],
+        })
+
 # 用于处理与数据清洗相关的操作，包括获取清洗数据列表和执行数据清洗
 class CleanedDataViewSet(viewsets.ModelViewSet):
     # 定义了视图集操作的默认查询集，这里是所有的 CleanedData 对象
@@ -182,18 +367,54 @@ class CleanedDataViewSet(viewsets.ModelViewSet):
     queryset = CleanedData.objects.all()
     # 指定了序列化器类 CleanedDataSerializer，用于将 CleanedData 模型实例转换为 JSON 格式，或将请求数据反序列化为模型实例。
     serializer_class = CleanedDataSerializer
+    # 列表按创建时间游标分页
+    pagination_class = CreatedAtCursorPagination
 
     # 功能：重写了默认的查询集逻辑。
     # 如果用户已登录，则返回当前用户上传的文件关联的清洗数据。
     # 如果用户未登录，则返回空查询集，确保未授权用户无法访问任何清洗数据。
+    # 列表不返回 summary（宽表的逐列摘要可能很大），不从数据库读取。
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return CleanedData.objects.filter(original_file__user=self.request.user)
+            queryset = CleanedData.objects.filter(original_file__user=self.request.user).select_related('original_file')
+            if self.action == 'list':
+                queryset = queryset.defer('summary')
+            return queryset
         return CleanedData.objects.none()
 
+    # 清洗结果创建后不可修改（只能新建或删除），因此可以按记录生成稳定的 ETag
+    http_method_names = ['get', 'post', 'delete', 'head', 'options']
+
+    # 列表使用精简序列化器，详情和其他操作使用完整序列化器
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return CleanedDataListSerializer
+        return CleanedDataSerializer
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        etag = queryset_etag(queryset, request.user.pk, request_variant(request))
+        return conditional_response(request, etag, lambda: super(CleanedDataViewSet, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return conditional_response(
+            request, record_etag(instance),
+            lambda: Response(self.get_serializer(instance).data),
+            cache_control=IMMUTABLE,
+        )
+
     # 定义了一个自定义动作 clean_data，通过 @action 装饰器标记为支持 POST 请求的视图，用于执行数据清洗操作。
+    # 查询参数 progress=stream / job 时在后台运行并推送进度事件（见 api/progress.py）
     @action(detail=False, methods=['post'])
     def clean_data(self, request):
+        return run_with_progress(request, 'clean_data', lambda: self._clean_data(request))
+
+    def _clean_data(self, request):
+        from .cleaning import clean_frame, cleaning_cache_key, write_cleaned
+        from .loading import read_frame
+        from .sketches import build_sketches, save_sketches
+
         # file_id：要清洗的文件的 ID。
         # cleaning_method：清洗方法（如缺失值处理、离群值处理、标准化等）。
         # parameters：清洗方法的参数（如缺失值填充策略、离群值阈值等）。
@@ -206,98 +427,158 @@ class CleanedDataViewSet(viewsets.ModelViewSet):
         # 功能：检查当前用户是否有权限访问指定的文件。
         # 如果文件的拥有者不是当前用户，且用户不是管理员，则返回 403 错误。
         # 检查用户是否有权限访问此文件
-        if data_file.user != request.user and not request.user.is_staff:
+        if data_file.user_id != request.user.id and not request.user.is_staff:
             return Response({'error': '没有权限访问此文件'}, status=status.HTTP_403_FORBIDDEN)
 
 
+        # 清洗结果按内容寻址：相同的 (文件内容, 清洗方法, 规范化参数) 直接返回已有的结果，不再重新计算
+        try:
+            cache_key = cleaning_cache_key(file_digest(data_file.file.path), cleaning_method, parameters)
+        except (OSError, TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        mark(request, 'cache_key')
+        existing = self._reuse_cleaned(data_file, cleaning_method, parameters, cache_key)
+        if existing is not None:
+            mark(request, 'reuse')
+            response = Response(self.get_serializer(existing).data)
+            response['X-Cleaned-Cache'] = 'hit'
+            return response
+
+        summary = {}
         try:
             # 使用 pandas 读取文件路径中的数据文件（假设是 CSV 格式）。
-            df = pd.read_csv(data_file.file.path)
-            # 缺失值处理
-            # mean：用列的均值填充缺失值。
-            # median：用列的中位数填充缺失值。
-            # mode：用列的众数填充缺失值。
-            # drop：删除包含缺失值的行。
-            if cleaning_method == 'missing_values':
-                strategy = parameters.get('strategy', 'mean')
-                if strategy == 'mean':
-                    df = df.fillna(df.mean())
-                elif strategy == 'median':
-                    df = df.fillna(df.median())
-                elif strategy == 'mode':
-                    df = df.fillna(df.mode().iloc[0])
-                elif strategy == 'drop':
-                    df = df.dropna()
-            # 离群值处理
-            # 功能：使用 Z-Score 方法标记离群值，将其设为 NaN，然后用均值填充。
-            # threshold：离群值的阈值（默认 3.0）。
-            # numeric_cols：仅对数值列进行处理。
-            elif cleaning_method == 'outliers':
-                # 使用 z-score 方法标记离群值，将其设为 NaN，然后用均值填充。
-                method = parameters.get('method', 'zscore')
-                threshold = float(parameters.get('threshold', 3.0))
-                
-                if method == 'zscore':
-                    numeric_cols = df.select_dtypes(include=[np.number]).columns
-                    for col in numeric_cols:
-                        df[col] = df[col].mask(np.abs((df[col] - df[col].mean()) / df[col].std()) > threshold, np.nan)
-                    df = df.fillna(df.mean())
-            # 标准化处理
-            # 功能：对数值列进行标准化处理，使其均值为 0，标准差为 1。
-            elif cleaning_method == 'standardization':
-                scaler = StandardScaler()
-                numeric_cols = df.select_dtypes(include=[np.number]).columns
-                df[numeric_cols] = scaler.fit_transform(df[numeric_cols])
-
-            # 使用 f-string 格式化字符串，生成清洗后的文件名。
-            # data_file.name 是原始文件的名称，cleaned_ 是前缀，用于标识这是清洗后的文件。
-            # 例如，如果原始文件名是 data.csv，生成的 output_path 将是 cleaned_data.csv。
-            output_path = f'cleaned_{data_file.name}'
-            # 使用 os.path.join 将目录路径 'media/cleaned' 和文件名 output_path 拼接成完整的文件路径。
-            # media/cleaned 是存储清洗后文件的目录，output_path 是文件名。
-            # 例如，最终路径可能是 media/cleaned/cleaned_data.csv。
-            output_file_path = os.path.join('media/cleaned', output_path)
-            # 使用 os.makedirs 创建文件路径中包含的目录。
-            # os.path.dirname(output_file_path) 获取文件路径的目录部分（如 media/cleaned）。
-            # 参数 exist_ok=True 表示如果目录已存在，不会抛出异常。
-            os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
-            # 使用 pandas 的 to_csv 方法将数据框 df 保存为 CSV 文件。
-            # output_file_path 是保存文件的完整路径。
-            # 参数 index=False 表示不将数据框的索引写入 CSV 文件中
-            df.to_csv(output_file_path, index=False)
+            report_progress(request, 'loading', 0.0)
+            with stage(request, 'read_csv'):
+                df = read_frame(data_file.file.path)
+            report_progress(request, 'cleaning', 0.3)
+            # 缺失值处理、离群值处理或标准化（见 api/cleaning.py 的 clean_frame）
+            df, summary = clean_frame(df, cleaning_method, parameters)
+            mark(request, 'clean')
+            # 写入结果前最后一次检查取消，之后的写入和建记录不再中断
+            report_progress(request, 'persisting', 0.7)
+
+            # 清洗结果的文件名由缓存键决定：cleaned/{key[:2]}/{key}.csv。
+            # 不同的文件内容或清洗参数得到不同的键，不会覆盖已有记录引用的文件。
+            with stage(request, 'write_csv'):
+                output_path, df = write_cleaned(df, cache_key)
 
             # 功能：在数据库中创建一条 CleanedData 记录，保存清洗后的文件路径、清洗方法和参数
-            cleaned_data = CleanedData.objects.create(
-                original_file=data_file,
-                file=f'cleaned/{output_path}',
-                cleaning_method=cleaning_method,
-                parameters=parameters
-            )
+            with stage(request, 'db_insert'):
+                cleaned_data = CleanedData.objects.create(
+                    original_file=data_file,
+                    file=output_path,
+                    cleaning_method=cleaning_method,
+                    parameters=parameters,
+                    summary=summary,
+                    cache_key=cache_key
+                )
+            # 生成清洗后数据的分布摘要（数据已在内存中，无需重新读取文件）
+            with stage(request, 'sketch'):
+                save_sketches(data_file, build_sketches(df), cleaned_data)
+
             # 将保存后的清洗结果通过序列化返回前端。
             serializer = self.get_serializer(cleaned_data)
-            return Response(serializer.data)
+            response = Response(serializer.data)
+            response['X-Cleaned-Cache'] = 'miss'
+            maybe_collect()
+            return response
 
         # 捕获清洗过程中可能发生的异常，并返回错误信息。
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    def _reuse_cleaned(self, data_file, cleaning_method, parameters, cache_key):
+        '''
+        查找缓存键相同的清洗结果。
+        同一个原始文件已有记录时直接返回；只有内容相同的其他文件有记录时，
+        新建一条指向同一个结果文件的记录（连同离群值摘要和分布摘要）。都没有时返回 None。
+        结果文件已被存储管理器回收时先重新生成。
+        '''
+        from .cleaning import cleaned_artifact_name, restore_cleaned
+        from .sketches import load_sketches, save_sketches
+        from .storage import record_access
+
+        sibling = CleanedData.objects.filter(cache_key=cache_key).first()
+        if sibling is None:
+            return None
+        try:
+            record_access(restore_cleaned(sibling))
+        except Exception as e:
+            # 原始文件无法读取等情况下按未命中处理，重新清洗
+            print(f"重新生成清洗结果失败: {str(e)}")
+            return None
+
+        same_file = CleanedData.objects.filter(original_file=data_file, cache_key=cache_key).order_by('-created_at').first()
+        if same_file is not None:
+            return same_file
+
+        output_path = cleaned_artifact_name(cache_key)
+        cleaned_data = CleanedData.objects.create(
+            original_file=data_file,
+            file=output_path,
+            cleaning_method=cleaning_method,
+            parameters=parameters,
+            summary=sibling.summary,
+            cache_key=cache_key
+        )
+        sketches = load_sketches(sibling.original_file_id, sibling)
+        if sketches:
+            save_sketches(data_file, sketches, cleaned_data)
+        return cleaned_data
+
 class AnalysisResultViewSet(viewsets.ModelViewSet):
     '''AnalysisResultViewSet，用于处理与数据分析相关的 API 请求。它继承自 ModelViewSet，
     自动提供了对数据库模型 AnalysisResult 的 CRUD 操作（创建、读取、更新、删除），并通
     过一个自定义的 analyze 动作方法实现了数据分析的核心功能。'''
     queryset = AnalysisResult.objects.all()  # 定义该视图集操作的数据源为所有 AnalysisResult 实例
     serializer_class = AnalysisResultSerializer  # 进行数据的序列化与反序列化，便于前后端交互。
+    pagination_class = CreatedAtCursorPagination  # 列表按创建时间游标分页
 
     
     def get_queryset(self):
         '''
         如果用户已认证，则返回属于该用户的数据文件所关联的所有分析结果。
     否则返回空查询集，防止未授权访问。
+        列表请求不从数据库读取 result 字段；详情请求在确认 ETag 未命中后再加载。
         '''
         if self.request.user.is_authenticated:
-            return AnalysisResult.objects.filter(data_file__user=self.request.user)
+            queryset = AnalysisResult.objects.filter(
+                data_file__user=self.request.user
+            ).select_related('data_file')
+            if self.action in ('list', 'retrieve'):
+                queryset = queryset.defer('result')
+            return queryset
         return AnalysisResult.objects.none()
 
+    # 分析结果创建后不可修改（只能新建或删除），因此可以按记录生成稳定的 ETag
+    http_method_names = ['get', 'post', 'delete', 'head', 'options']
+
+    def get_serializer_class(self):
+        '''列表只返回摘要（不含 result），完整结果通过 GET /analysisresults/{id}/ 获取'''
+        if self.action == 'list':
+            return AnalysisResultListSerializer
+        return AnalysisResultSerializer
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        # 删除清洗结果会把 cleaned_data 置空（SET_NULL），列表的 ETag 需要随之改变
+        etag = queryset_etag(queryset, request.user.pk, request_variant(request), nullable=('cleaned_data',))
+        return conditional_response(request, etag, lambda: super(AnalysisResultViewSet, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        '''
+        先不加载 result 字段计算 ETag，命中缓存时直接返回 304；
+        未命中时才读取完整的 result 并序列化。
+        cleaned_data 会在清洗结果被删除时置空，所以 ETag 包含它，且每次使用前都要重新验证（不是 IMMUTABLE）。
+        '''
+        instance = self.get_object()
+
+        def build_response():
+            instance.refresh_from_db(fields=['result'])
+            return Response(self.get_serializer(instance).data)
+
+        return conditional_response(request, record_etag(instance, instance.cleaned_data_id), build_response)
+
 
     #最核心的功能入口，允许客户端发起一个 POST 请求来进行以下类型的分析
     @action(detail=False, methods=['post'])#定义一个POST方法的自定义操作。detail=False表示该操作是针对集合的，而不是单个资源
@@ -317,7 +598,44 @@ class AnalysisResultViewSet(viewsets.ModelViewSet):
         # 从请求数据中获取额外的参数，这些参数是可选的，如果不存在则默认为空字典
         # 这些参数用于定制化分析过程中的特定行为或配置
         parameters = request.data.get('parameters', {})
-        
+
+        # 连接文件参数与 file_id 同级传入，保存在分析参数中（promote 重新运行时沿用）
+        for name in JOIN_PARAMETERS:
+            if request.data.get(name):
+                parameters = {**parameters, name: request.data.get(name)}
+
+        # 查询参数 progress=stream / job 时在后台运行并推送进度事件（见 api/progress.py）
+        return run_with_progress(
+            request, 'analyze',
+            lambda: self._run_analysis(request, file_id, cleaned_data_id, analysis_type, parameters),
+        )
+
+    # 把抽样分析的结果用全量数据重新运行一次：参数与原分析相同，只去掉 sample
+    @action(detail=True, methods=['post'])
+    def promote(self, request, pk=None):
+        sampled = self.get_object()
+        parameters = dict(sampled.parameters or {})
+        if not parameters.pop('sample', None):
+            return Response({'error': '该分析结果不是抽样分析，无需重新运行'}, status=status.HTTP_400_BAD_REQUEST)
+        parameters.pop('actual_features_used', None)
+        parameters['promoted_from'] = sampled.id
+        return run_with_progress(
+            request, 'analyze',
+            lambda: self._run_analysis(
+                request, sampled.data_file_id, sampled.cleaned_data_id, sampled.analysis_type, parameters
+            ),
+        )
+
+    def _run_analysis(self, request, file_id, cleaned_data_id, analysis_type, parameters):
+        # 数据处理模块依赖 pandas，在这里导入，不处理数据的请求（登录、列表等）不加载它们
+        from .cleaning import restore_cleaned
+        from .engines.base import AnalysisContext
+        from .engines.features import detect_features, feature_matrix, resolve_target
+        from .engines.selection import select_features, selection_options
+        from .loading import read_frame
+        from .outofcore import plan_out_of_core
+        from .sampling import sample_csv, sample_frame, sample_options
+
         print(f"分析参数: file_id={file_id}, analysis_type={analysis_type}, parameters={parameters}")
 
         #检查是否提供了必要的参数
@@ -329,6 +647,13 @@ class AnalysisResultViewSet(viewsets.ModelViewSet):
         if not analysis_type:
             return Response({'error': '缺少必要参数：analysis_type'}, status=status.HTTP_400_BAD_REQUEST)
 
+        # 分析类型对应的引擎（见 api/engines/），首次使用时才导入；回归和分类还需要 target
+        engine = get_engine(analysis_type)
+        if engine is None or (engine.requires_target and not parameters.get('target')):
+            return Response({
+                'error': f'不支持的分析类型: {analysis_type}，或缺少必要参数'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         #根据file_id获取数据文件对象
         try:
             #数据库中获取一个对象，如果找不到该对象，则自动引发 Http404 异常。从 DataFile 表中查找 id 字段等于 file_id 的记录。
@@ -338,14 +663,15 @@ class AnalysisResultViewSet(viewsets.ModelViewSet):
             return Response({'error': f'无法找到ID为{file_id}的文件: {str(e)}'}, status=status.HTTP_404_NOT_FOUND)
         
         # 检查用户是否有权限访问此文件（文件的拥有者request.user，管理员request.user.is_staff
-        if data_file.user != request.user and not request.user.is_staff:
+        if data_file.user_id != request.user.id and not request.user.is_staff:
             return Response({'error': '没有权限访问此文件'}, status=status.HTTP_403_FORBIDDEN)
         
         # 如果提供了cleaned_data_id，则使用清洗后的数据。没有则使用原始数据文件，确定使用哪个数据源
         if cleaned_data_id:
             try:
                 cleaned_data = get_object_or_404(CleanedData, id=cleaned_data_id)
-                file_path = cleaned_data.file.path
+                # 清洗结果文件已被回收时先重新生成
+                file_path = restore_cleaned(cleaned_data)
                 print(f"使用清洗后的数据: {cleaned_data.file.name}")
             except Exception as e:
                 return Response({'error': f'无法找到ID为{cleaned_data_id}的清洗数据: {str(e)}'}, status=status.HTTP_404_NOT_FOUND)
@@ -354,424 +680,169 @@ class AnalysisResultViewSet(viewsets.ModelViewSet):
             cleaned_data = None
             print(f"使用原始数据文件: {data_file.file.name}")
 
+        # 抽样模式：只在样本上拟合，并给出指标的 bootstrap 置信区间
+        try:
+            sampling = sample_options(parameters.get('sample'), analysis_type, parameters.get('target'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        sample_info = None
+
+        # 连接文件：在键列上与分析数据连接（例如特征文件连接标签文件）
+        join, error = resolve_join(request, parameters)
+        if error is not None:
+            return error
+
         try:
             print(f"尝试读取CSV文件: {file_path}")
-            df = pd.read_csv(file_path)
+            mark(request, 'lookup')
+            report_progress(request, 'loading', 0.05)
+
+            # 估算的特征矩阵超过内存阈值时，支持分块计算的引擎（聚类/降维）改为分块计算
+            # （抽样模式下样本本身就很小；连接两个文件时不使用分块计算）
+            if engine.supports_out_of_core and not (sampling or join):
+                out_of_core = plan_out_of_core(file_path, parameters)
+                if out_of_core:
+                    return self._run_out_of_core(request, engine, data_file, cleaned_data, file_path, parameters, out_of_core)
+
+            if join:
+                from .joins import read_joined
+
+                df, join_info = read_joined(file_path, join['file'].file.path, join['key'], join['how'])
+                mark(request, 'join')
+                print(f"连接文件 {join['file'].name}（键列 {join['key']}，{join['how']}），连接后 {join_info['rows']} 行，索引: {join_info['index']}")
+                if sampling:
+                    df, sample_info = sample_frame(df, **sampling)
+                    mark(request, 'sample')
+            elif sampling:
+                df, sample_info = sample_csv(file_path, **sampling)
+                mark(request, 'sample')
+                print(f"抽样完成: {sample_info['size']} / {sample_info['population']} 行，方法: {sample_info['method']}")
+            else:
+                df = read_frame(file_path)
+                mark(request, 'read_csv')
+            report_progress(request, 'feature_prep', 0.25)
             #打印读取成功后的数据维度（行数、列数）和前5个列名
             print(f"CSV读取成功，数据形状: {df.shape}, 列名: {df.columns.tolist()[:5]}...")
-            result = {}
-            
-            # 验证请求中的特征是否存在于数据集中
-            #从请求参数中获取用户指定的特征列表 features，默认为空列表
+
+            # 验证目标变量是否存在（对于回归和分类），不存在时尝试查找替代的目标变量
             requested_features = parameters.get('features', [])
             print(f"请求的特征: {requested_features}")
-            #获取数据集 df 中所有可用的列名，转换为列表形式保存在
-            available_columns = df.columns.tolist()
-            
-            # 过滤出实际存在于数据集的特征
-            valid_features = [f for f in requested_features if f in available_columns]
-            print(f"有效特征: {valid_features}")
-            
-            if not valid_features:
-                # 如果没有有效特征，使用多种方法尝试检测数值型列
-                print("没有有效特征，尝试多种方法检测数值列...")
-                numeric_cols = []
-                
-                # 方法0: 处理BBQ_weather列
-                #筛选出列名包含BBQ_weather的所有列
-                bbq_cols = [col for col in df.columns if 'BBQ_weather' in col]
-                if bbq_cols:
-                    print(f"检测到BBQ_weather列: {bbq_cols}")
-                    # 创建BBQ列的数值版本
-                    for col in bbq_cols:
-                        # 将BBQ值转换为0或1
-                        col_name = f"{col}_numeric"
-                        df[col_name] = df[col].map(lambda x: 1 if str(x).lower() in ['1', 'true', 't', 'yes', 'y', 'good'] else 0)
-                        numeric_cols.append(col_name)
-                    print(f"创建的BBQ数值列: {numeric_cols}")
-                
-                # 方法1: 使用pandas的数值类型检测
-                try:
-                    #选择所有数据类型为数值型的列
-                    numeric_cols_pd = df.select_dtypes(include=[np.number]).columns.tolist()
-                    print(f"方法1-Pandas检测到的数值列: {numeric_cols_pd}")
-                    if numeric_cols_pd:
-                        for col in numeric_cols_pd:
-                            if col != 'DATE' and col not in numeric_cols:
-                                numeric_cols.append(col)
-                except Exception as e:
-                    print(f"pandas数值列检测失败: {str(e)}")
-                
-                # 方法2: 尝试手动检测数值型列（分析每列前100行数据）
-                if len(numeric_cols) < 3:
-                    print("方法2-尝试手动检测数值列...")
-                    for col in df.columns:
-                        # 跳过DATE、MONTH和已处理的BBQ列
-                        if col in ['DATE', 'MONTH'] or col in numeric_cols:
-                            continue
-                            
-                        # 检查前100行样本确认是否为数值
-                        sample = df[col].head(100).dropna()
-                        if len(sample) == 0:
-                            continue
-                            
-                        is_numeric = True
-                        for val in sample:
-                            try:
-                                if val is None or pd.isna(val) or val == '':
-                                    continue
-                                float(val)
-                            except (ValueError, TypeError):
-                                is_numeric = False
-                                break
-                                
-                        if is_numeric:
-                            numeric_cols.append(col)
-                    
-                    print(f"方法2-手动检测到的数值列: {numeric_cols}")
-                
-                # 方法3: 转换DATE列为数值特征
-                if len(numeric_cols) < 3 and 'DATE' in df.columns:
-                    print("方法3-转换DATE列为数值特征...")
-                    try:
-                        # 从DATE列提取月份和日期作为数值特征
-                        df['MONTH_numeric'] = pd.to_datetime(df['DATE']).dt.month
-                        df['DAY_numeric'] = pd.to_datetime(df['DATE']).dt.day
-                        numeric_cols.append('MONTH_numeric')
-                        numeric_cols.append('DAY_numeric')
-                        print(f"添加的时间数值特征: MONTH_numeric, DAY_numeric")
-                    except Exception as e:
-                        print(f"转换DATE列失败: {str(e)}")
-                
-                # 方法4: 最后尝试创建随机特征演示
-                if len(numeric_cols) < 3:
-                    print("方法4-创建随机特征来演示分析...")
-                    for i in range(3):
-                        col_name = f"random_feature_{i+1}"
-                        df[col_name] = np.random.rand(len(df))
-                        numeric_cols.append(col_name)
-                    print(f"创建的随机特征: {numeric_cols[-3:]}")
-                
-                # 排除DATE和MONTH列
-                valid_features = [f for f in numeric_cols if f not in ['DATE', 'MONTH']]
-                
-                print(f"最终选择的有效特征: {valid_features}")
-                
-                # 如果仍然没有有效特征，返回错误
-                if not valid_features:
-                    return Response({
-                        'error': '没有可用的数值特征进行分析，请检查数据格式'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-                
-                # 限制使用的默认特征数量
-                if len(valid_features) > 5:
-                    valid_features = valid_features[:5]
-                    print(f"限制为前5个特征: {valid_features}")
-                
-            # 验证目标变量是否存在（对于回归和分类）
             target = parameters.get('target')
             if target:
-                print(f"目标特征: {target}, 是否存在: {target in available_columns}")
-
-            # 如果目标变量不存在于可用列中，尝试查找替代的目标变量
-            if target and target not in available_columns:
-                # 排除特定列，寻找潜在的目标变量
-                potential_targets = [col for col in df.columns
-                                   if col not in ['DATE', 'MONTH']
-                                   and not col.endswith('BBQ_weather')
-                                   and col not in valid_features]
-
-                # 如果找到潜在的目标变量，选择第一个作为新的目标变量
-                if potential_targets:
-                    new_target = potential_targets[0]
-                    print(f"目标特征 {target} 不存在，使用 {new_target} 作为替代")
-                    target = new_target
-                else:
+                print(f"目标特征: {target}, 是否存在: {target in df.columns}")
+                resolved = resolve_target(df, target, [f for f in requested_features if f in df.columns])
+                if resolved is None:
                     # 如果没有找到替代目标变量，返回错误响应
                     return Response({
-                        'error': f'目标特征 "{target}" 不存在于数据集中，且无法找到替代目标。可用列：{available_columns[:10]}...'
+                        'error': f'目标特征 "{target}" 不存在于数据集中，且无法找到替代目标。可用列：{df.columns.tolist()[:10]}...'
                     }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # 确保在继续之前valid_features不为空
+                target = resolved
+
+            # 确定参与分析的特征：请求中存在于数据集的特征；都不存在时，回归和分类对所有数值列打分后选出 top_k 个
+            # （见 api/engines/selection.py），其他分析类型自动检测数值列（见 api/engines/features.py）
+            selection = None
+            if target and engine.task and not any(f in df.columns for f in requested_features):
+                try:
+                    options = selection_options(parameters, engine.task)
+                except (TypeError, ValueError) as e:
+                    return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+                valid_features, selection = select_features(
+                    df, target, engine.task, options, self._data_source(file_path, join, sampling),
+                )
+                mark(request, 'feature_selection')
+            else:
+                valid_features, selection = detect_features(df, requested_features)
             if not valid_features:
                 return Response({
-                    'error': '没有有效的特征可用于分析，请检查数据格式和列名'
+                    'error': '没有可用的数值特征进行分析，请检查数据格式'
                 }, status=status.HTTP_400_BAD_REQUEST)
-                
+
             print(f"最终使用的特征: {valid_features}")
             print(f"数据样本:\n{df[valid_features].head()}")
             
             # 最终检查特征数据是否实际包含数值
             try:
-                X = df[valid_features].astype(float)
+                X = feature_matrix(df, valid_features, fill=engine.fills_missing(parameters))
                 print(f"特征转换为数值成功，数据形状: {X.shape}")
-                
-                # 检查是否存在无限值或NaN
-                if X.isnull().values.any() or np.isinf(X.values).any():
-                    print("警告：数据中存在NaN或无限值，将进行填充")
-                    X = X.fillna(X.mean())
-                    X = X.replace([np.inf, -np.inf], X.mean())
             except Exception as e:
                 print(f"转换特征为数值时出错: {str(e)}")
                 return Response({
                     'error': f'转换特征为数值失败: {str(e)}。请确保选择的列只包含数值数据。'
                 }, status=status.HTTP_400_BAD_REQUEST)
+            mark(request, 'feature_detection')
+            report_progress(request, 'fitting', 0.3)
 
-            # 对不同的分析类型执行不同的操作
-            if analysis_type == 'clustering':
-                # 从参数中获取聚类数量，默认为3
-                n_clusters = int(parameters.get('n_clusters', 3))
-                # 打印聚类分析的执行信息
-                print(f"执行聚类分析，聚类数: {n_clusters}, 特征数: {len(valid_features)}")
+            # 由引擎完成 prepare / fit / serialize
+            context = AnalysisContext(request, df, X, valid_features, target, parameters, sampling, sample_info, selection)
+            try:
+                result = engine.run(context)
+            except Exception as e:
+                print(f"{engine.label}失败: {str(e)}")
+                traceback.print_exc()  # 打印完整堆栈跟踪
+                return Response({'error': f'{engine.label}失败: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+            if selection:
+                result['feature_selection'] = selection
 
-                try:
-                    # 将有效特征转换为浮点类型
-                    X = df[valid_features].astype(float)
-
-                    # 初始化KMeans对象并进行聚类分析
-                    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-                    clusters = kmeans.fit_predict(X)
-
-                    # 构建聚类分析结果字典
-                    result = {
-                        'clusters': clusters.tolist(),
-                        'centers': kmeans.cluster_centers_.tolist(),
-                        'clusterCounts': [sum(clusters == i) for i in range(n_clusters)],
-                        'feature_names': valid_features
-                    }
-                    # 打印聚类分析完成信息
-                    print("聚类分析完成")
-                except Exception as e:
-                    # 打印并返回聚类分析失败的错误信息
-                    print(f"聚类分析失败: {str(e)}")
-                    return Response({'error': f'聚类分析失败: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
-
-            elif analysis_type == 'dimension_reduction':
-                # 从参数中获取降维后的组件数量，默认为2
-                n_components = int(parameters.get('n_components', 2))
-                # 打印降维分析的执行信息
-                print(f"执行降维分析，组件数: {n_components}, 特征数: {len(valid_features)}")
+            # 保存分析结果
+            report_progress(request, 'persisting', 0.9)
+            analysis_result = AnalysisResult.objects.create(
+                data_file=data_file,
+                cleaned_data=cleaned_data,
+                analysis_type=analysis_type,
+                parameters={
+                    **parameters,
+                    'actual_features_used': valid_features  # 记录实际使用的特征
+                },
+                result=result
+            )
+            print(f"分析结果已保存，ID: {analysis_result.id}")
+            mark(request, 'db_insert')
 
-                try:
-                    # 将有效特征转换为浮点类型
-                    X = df[valid_features].astype(float)
-
-                    # 初始化PCA对象并进行降维分析
-                    pca = PCA(n_components=n_components)
-                    components = pca.fit_transform(X)
-
-                    # 构建降维分析结果字典
-                    result = {
-                        'components': components.tolist(),
-                        'explained_variance_ratio': pca.explained_variance_ratio_.tolist(),
-                        'feature_names': valid_features
-                    }
-                    # 打印降维分析完成信息
-                    print("降维分析完成")
-                except Exception as e:
-                    # 打印并返回降维分析失败的错误信息
-                    print(f"降维分析失败: {str(e)}")
-                    return Response({'error': f'降维分析失败: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
-
-
-            elif analysis_type == 'regression' and target:
-                # 当分析类型为回归分析且目标变量已指定时，执行以下代码块
-                print(f"执行回归分析，目标: {target}, 特征数: {len(valid_features)}")
+            serializer = self.get_serializer(analysis_result)
+            return Response(serializer.data)
 
-                try:
-                    # 将有效特征和目标变量转换为浮点类型
-                    X = df[valid_features].astype(float)
-                    y = df[target].astype(float)
-
-                    # 使用更可靠的特征选择 - 计算与目标的相关性
-                    correlations = []
-                    for feature in valid_features:
-                        corr = np.corrcoef(X[feature], y)[0, 1]
-                        correlations.append((feature, abs(corr)))
-
-                    # 按相关性排序特征
-                    sorted_features = [f for f, _ in sorted(correlations, key=lambda x: x[1], reverse=True)]
-                    print(f"特征按相关性排序: {sorted_features}")
-
-                    # 使用相关性最高的特征
-                    if len(sorted_features) > 5:
-                        best_features = sorted_features[:5]
-                        X = X[best_features]
-                        print(f"使用相关性最高的5个特征: {best_features}")
-
-                    # 分割训练集和测试集
-                    test_size = float(parameters.get('test_size', 0.2))
-                    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=42)
-
-                    # 根据算法选择模型
-                    algorithm = parameters.get('algorithm', 'linear')
-                    result = {}  # 初始化结果字典
-
-                    # 如果选择的算法是随机森林
-                    if algorithm == 'random_forest':
-                        from sklearn.ensemble import RandomForestRegressor
-                        # 创建随机森林回归器实例
-                        model = RandomForestRegressor(n_estimators=100, random_state=42)
-                        # 训练模型
-                        model.fit(X_train, y_train)
-                        # 使用训练好的模型进行预测
-                        y_pred = model.predict(X_test)
-
-                        # 获取特征重要性
-                        feature_importance = model.feature_importances_.tolist()
-                        intercept = 0.0  # 随机森林没有截距
-                        extra_info = {'scaled': False}
-
-                        print(f"随机森林回归分析完成")
-                        
-                    else:  # 线性回归相关算法
-                        # 应用特征缩放，对线性模型很重要
-                        from sklearn.preprocessing import StandardScaler
-                        scaler = StandardScaler()
-                        X_train_scaled = scaler.fit_transform(X_train)
-                        X_test_scaled = scaler.transform(X_test)
-                        
-                        # 检查是否应用多项式特征
-                        use_poly = parameters.get('use_polynomial', False)
-                        poly_degree = int(parameters.get('polynomial_degree', 2))
-                        
-                        if use_poly:
-                            from sklearn.preprocessing import PolynomialFeatures
-                            poly = PolynomialFeatures(degree=poly_degree, include_bias=False)
-                            X_train_scaled = poly.fit_transform(X_train_scaled)
-                            X_test_scaled = poly.transform(X_test_scaled)
-                            print(f"应用多项式特征，阶数: {poly_degree}")
-                        
-                        # 选择适当的线性回归变体
-                        linear_type = parameters.get('linear_type', 'standard')
-                        
-                        if linear_type == 'ridge':
-                            from sklearn.linear_model import Ridge
-                            alpha = float(parameters.get('alpha', 1.0))
-                            model = Ridge(alpha=alpha)
-                            print(f"使用岭回归，alpha={alpha}")
-                        elif linear_type == 'lasso':
-                            from sklearn.linear_model import Lasso
-                            alpha = float(parameters.get('alpha', 0.1))
-                            model = Lasso(alpha=alpha)
-                            print(f"使用Lasso回归，alpha={alpha}")
-                        else:
-                            # 标准线性回归
-                            model = LinearRegression()
-                            print("使用标准线性回归")
-                        
-                        # 使用缩放后的数据
-                        model.fit(X_train_scaled, y_train)
-                        y_pred = model.predict(X_test_scaled)
-                        
-                        # 获取系数和截距
-                        if hasattr(model, 'coef_'):
-                            if len(model.coef_.shape) == 1:
-                                feature_importance = model.coef_.tolist()
-                            else:
-                                feature_importance = model.coef_[0].tolist()
-                        else:
-                            feature_importance = [0] * len(X.columns)
-                            
-                        intercept = float(model.intercept_) if hasattr(model, 'intercept_') else 0.0
-                        
-                        # 额外信息
-                        extra_info = {
-                            'scaled': True,
-                            'linear_type': linear_type
-                        }
-                        if use_poly:
-                            extra_info['polynomial'] = {
-                                'applied': True,
-                                'degree': poly_degree
-                            }
-                        
-                        print(f"线性回归分析完成")
-                    
-                    # 计算通用的评估指标
-                    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-                    r2 = r2_score(y_test, y_pred)
-                    mae = mean_absolute_error(y_test, y_pred)
-                    mse = mean_squared_error(y_test, y_pred)
-                    
-                    # 为了前端可视化，生成预测值与实际值比较
-                    predictions = []
-                    for i in range(min(20, len(X_test))):
-                        actual = float(y_test.iloc[i]) if hasattr(y_test, 'iloc') else float(y_test[i])
-                        predicted = float(y_pred[i])
-                        predictions.append({'actual': actual, 'predicted': predicted})
-                    
-                    # 完成结果字典
-                    result = {
-                        'coefficients': feature_importance,
-                        'intercept': intercept,
-                        'feature_names': X.columns.tolist(),
-                        'target': target,
-                        'predictions': predictions,
-                        'metrics': {
-                            'r2': float(r2),
-                            'mae': float(mae),
-                            'mse': float(mse)
-                        },
-                        'algorithm': algorithm,
-                        'extra_info': extra_info
-                    }
-                    
-                    print(f"分析指标 - R²: {r2:.4f}, MAE: {mae:.4f}, MSE: {mse:.4f}")
-                    
-                    # 创建分析结果
-                    analysis_result = AnalysisResult.objects.create(
-                        data_file=data_file,
-                        cleaned_data=cleaned_data,
-                        analysis_type=analysis_type,
-                        parameters={
-                            **parameters,
-                            'actual_features_used': valid_features  # 记录实际使用的特征
-                        },
-                        result=result
-                    )
-                    print(f"分析结果已保存，ID: {analysis_result.id}")
-                    
-                    serializer = self.get_serializer(analysis_result)
-                    return Response(serializer.data)
-                    
-                except Exception as e:
-                    print(f"回归分析失败: {str(e)}")
-                    traceback.print_exc()  # 打印完整堆栈跟踪
-                    return Response({'error': f'回归分析失败: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
-                
-            elif analysis_type == 'classification' and target:
-                print(f"执行分类分析，目标: {target}, 特征数: {len(valid_features)}")
-                
-                try:
-                    X = df[valid_features].astype(float)
-                    y = df[target]
-                    
-                    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-                    
-                    model = RandomForestClassifier(random_state=42)
-                    model.fit(X_train, y_train)
-                    
-                    result = {
-                        'accuracy': float(model.score(X_test, y_test)),
-                        'feature_importance': model.feature_importances_.tolist(),
-                        'feature_names': valid_features
-                    }
-                    print("分类分析完成，准确率: ", result['accuracy'])
-                except Exception as e:
-                    print(f"分类分析失败: {str(e)}")
-                    return Response({'error': f'分类分析失败: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
-            else:
-                return Response({
-                    'error': f'不支持的分析类型: {analysis_type}，或缺少必要参数'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
         except Exception as e:
-            import traceback
             print("分析过程中出现错误:")
             traceback.print_exc()
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    def _data_source(file_path, join, sampling):
+        '''特征得分缓存的数据来源：文件内容（以及连接文件、抽样参数）确定时分析数据也确定'''
+        source = {'file': file_digest(file_path)}
+        if join:
+            source['join'] = [file_digest(join['file'].file.path), join['key'], join['how']]
+        if sampling:
+            source['sample'] = sampling
+        return source
+
+    def _run_out_of_core(self, request, engine, data_file, cleaned_data, file_path, parameters, plan):
+        features = plan['features']
+        print(f"特征矩阵估算 {plan['estimated_matrix_bytes']} 字节，超过内存阈值，分块计算，特征: {features}")
+        try:
+            result = engine.run_out_of_core(request, data_file, file_path, plan, parameters)
+        except Exception as e:
+            print(f"{engine.label}失败: {str(e)}")
+            return Response({'error': f'{engine.label}失败: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+        result['out_of_core'].update(plan)
+        report_progress(request, 'persisting', 0.9)
+
+        analysis_result = AnalysisResult.objects.create(
+            data_file=data_file,
+            cleaned_data=cleaned_data,
+            analysis_type=engine.name,
+            parameters={
+                **parameters,
+                'actual_features_used': features
+            },
+            result=result
+        )
+        print(f"分析结果已保存，ID: {analysis_result.id}")
+        mark(request, 'db_insert')
+
+        serializer = self.get_serializer(analysis_result)
+        return Response(serializer.data)
+
 class VisualizationResultViewSet(viewsets.ModelViewSet):
     """
     VisualizationResult模型的视图集，提供CRUD功能
@@ -785,7 +856,9 @@ class VisualizationResultViewSet(viewsets.ModelViewSet):
         """
         # 如果用户已认证，则返回属于该用户的数据文件的可视化结果
         if self.request.user.is_authenticated:
-            return VisualizationResult.objects.filter(data_file__user=self.request.user)
+            return VisualizationResult.objects.filter(
+                data_file__user=self.request.user
+            ).select_related('data_file')
         # 如果用户未认证，则返回空查询集
         return VisualizationResult.objects.none()
 
@@ -805,7 +878,7 @@ class VisualizationResultViewSet(viewsets.ModelViewSet):
         data_file = get_object_or_404(DataFile, id=data_file_id)
 
         # 检查用户是否有权限访问此文件
-        if data_file.user != request.user and not request.user.is_staff:
+        if data_file.user_id != request.user.id and not request.user.is_staff:
             return Response({'error': '没有权限访问此文件'}, status=status.HTTP_403_FORBIDDEN)
 
         # 获取分析结果对象，如果提供了分析结果ID
@@ -814,14 +887,212 @@ class VisualizationResultViewSet(viewsets.ModelViewSet):
             analysis_result = get_object_or_404(AnalysisResult, id=analysis_result_id)
 
         # 创建可视化结果
-        visualization = VisualizationResult.objects.create(
-            data_file=data_file,
-            analysis_result=analysis_result,
-            chart_type=chart_type,
-            title=title,
-            configuration=configuration
-        )
+        with stage(request, 'db_insert'):
+            visualization = VisualizationResult.objects.create(
+                data_file=data_file,
+                analysis_result=analysis_result,
+                chart_type=chart_type,
+                title=title,
+                configuration=configuration
+            )
 
         # 使用序列化器序列化新创建的可视化结果并返回响应
         serializer = self.get_serializer(visualization)
         return Response(serializer.data)
+
+
+class JobViewSet(viewsets.ViewSet):
+    """
+    后台任务（analyze / clean_data 带 progress=job 参数时创建，见 api/progress.py）。
+    只能访问自己的任务；任务保存在进程内，服务重启后不再存在。
+    """
+
+    def _get_job(self, request, pk):
+        job = get_job(pk)
+        if job is None:
+            return None, Response({'error': '任务不存在或已过期'}, status=status.HTTP_404_NOT_FOUND)
+        if job.user_id != request.user.id and not request.user.is_staff:
+            return None, Response({'error': '没有权限访问此任务'}, status=status.HTTP_403_FORBIDDEN)
+        return job, None
+
+    def retrieve(self, request, pk=None):
+        job, error = self._get_job(request, pk)
+        if error is not None:
+            return error
+        return Response(job.snapshot())
+
+    # 订阅进度事件；断线重连时从 Last-Event-ID 之后继续推送。断开连接不会取消任务
+    @action(detail=True, methods=['get'], renderer_classes=[NumpyJSONRenderer, EventStreamRenderer])
+    def events(self, request, pk=None):
+        job, error = self._get_job(request, pk)
+        if error is not None:
+            return error
+        try:
+            last_event_id = int(request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id') or 0)
+        except ValueError:
+            return Response({'error': 'Last-Event-ID 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
+        return event_response(job, last_event_id=max(0, last_event_id))
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        job, error = self._get_job(request, pk)
+        if error is not None:
+            return error
+        if not job.done:
+            job.cancel()
+        return Response(job.snapshot())
+
+
+def _is_uuid(value):
+    try:
+        uuid.UUID(str(value))
+    except ValueError:
+        return False
+    return True
+
+
+class UploadSessionViewSet(viewsets.ViewSet):
+    """
+    可续传的分块上传（见 api/uploads.py）：
+    POST 创建会话（name、size、description），PUT ?offset=N 上传一块（请求头 X-Content-SHA256），
+    GET 查询进度，POST finalize 创建数据文件，DELETE 放弃上传。只能访问自己的会话。
+    """
+
+    def _get_session(self, request, pk):
+        from .models import UploadSession
+        from .uploads import abort, expired
+
+        session = UploadSession.objects.filter(pk=pk, user=request.user).first() if _is_uuid(pk) else None
+        if session is None:
+            return None, Response({'error': '上传会话不存在'}, status=status.HTTP_404_NOT_FOUND)
+        if expired(session):
+            abort(session)
+            return None, Response({'error': '上传会话已过期，请重新上传'}, status=status.HTTP_410_GONE)
+        return session, None
+
+    def create(self, request):
+        from .uploads import UploadError, create_session, session_info
+
+        try:
+            session = create_session(
+                request.user, request.data.get('name'), request.data.get('size'), request.data.get('description', ''),
+            )
+        except UploadError as e:
+            return Response({'error': str(e), **e.details}, status=e.status)
+        return Response(session_info(session), status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, pk=None):
+        from .uploads import session_info
+
+        session, error = self._get_session(request, pk)
+        if error is not None:
+            return error
+        return Response(session_info(session))
+
+    # 请求体为原始字节（不经过 DRF 的解析器），读取时最多多读 1 字节以判断是否超过单块上限
+    def update(self, request, pk=None):
+        from .uploads import UploadError, append_chunk, session_info
+
+        session, error = self._get_session(request, pk)
+        if error is not None:
+            return error
+        try:
+            offset = int(request.query_params.get('offset', ''))
+        except ValueError:
+            return Response({'error': 'offset 必须是整数', 'received': session.received},
+                            status=status.HTTP_400_BAD_REQUEST)
+        stream = request.stream
+        data = stream.read(settings.UPLOAD_MAX_CHUNK_BYTES + 1) if stream is not None else b''
+        mark(request, 'receive')
+        try:
+            with stage(request, 'parse'):
+                session = append_chunk(session, offset, data, request.headers.get('X-Content-SHA256'))
+        except UploadError as e:
+            # 块被拒绝时告诉客户端从哪里继续
+            return Response({'error': str(e), 'received': session.received, **e.details}, status=e.status)
+        return Response(session_info(session))
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        from .uploads import UploadError, finalize
+
+        session, error = self._get_session(request, pk)
+        if error is not None:
+            return error
+        try:
+            with stage(request, 'finalize'):
+                data_file, profile = finalize(session)
+        except UploadError as e:
+            return Response({'error': str(e), **e.details}, status=e.status)
+        maybe_collect()
+        return Response(
+            {**DataFileSerializer(data_file, context={'request': request}).data, 'profile': profile},
+            status=status.HTTP_201_CREATED,
+        )
+
+    def destroy(self, request, pk=None):
+        from .uploads import abort
+
+        session, error = self._get_session(request, pk)
+        if error is not None:
+            return error
+        if session.status == 'complete':
+            return Response({'error': '上传已完成，请删除对应的数据文件'}, status=status.HTTP_409_CONFLICT)
+        abort(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class MetricsView(APIView):
+    """
+    读取各接口、各阶段的延迟直方图（由 ServerTimingMiddleware 汇总）和准入控制的排队状态，仅管理员可访问。
+    DELETE 请求清空已收集的数据。
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'enabled': getattr(settings, 'API_TIMING_ENABLED', True),
+            'endpoints': timing_registry.snapshot(),
+            # 耗时接口的准入控制：槽位、排队深度、各用户运行中 / 排队中的请求数、等待时间
+            'admission': admission_controller().snapshot() if admission_enabled() else None,
+        })
+
+    def delete(self, request):
+        timing_registry.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class StorageView(APIView):
+    """
+    磁盘用量（见 api/storage.py）。
+    GET：当前用户各类文件（上传文件、清洗结果、分析结果文件）的大小和数量；
+    管理员返回所有用户和共用缓存的用量，带 refresh 参数时先重新扫描磁盘。
+    POST（仅管理员）：立即回收，参数 budget（字节，默认 settings.STORAGE_BUDGET_BYTES）、dry_run。
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if not request.user.is_staff:
+            users = storage_usage(request.user)
+            return Response(users[0] if users else {
+                'user_id': request.user.id, 'username': request.user.username, 'bytes': 0, 'files': 0, 'kinds': {},
+            })
+        if request.query_params.get('refresh'):
+            scan()
+        users = storage_usage()
+        return Response({
+            'total_bytes': sum(entry['bytes'] for entry in users),
+            'budget_bytes': settings.STORAGE_BUDGET_BYTES,
+            'users': users,
+        })
+
+    def post(self, request):
+        if not request.user.is_staff:
+            return Response({'error': '只有管理员可以回收存储空间'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            budget = request.data.get('budget')
+            budget = int(budget) if budget is not None else None
+        except (TypeError, ValueError):
+            return Response({'error': 'budget 必须是整数（字节）'}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        return Response(collect(budget=budget, dry_run=dry_run))
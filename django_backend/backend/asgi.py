@@ -3,6 +3,9 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run with any ASGI server, e.g. ``uvicorn backend.asgi:application --workers 1``;
+see api/offload.py for how slow endpoints are kept off the event loop.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -12,5 +15,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+# 通过 ASGI 服务器（uvicorn / daphne 等）启动时，耗时接口卸载到线程池、进度事件流使用异步迭代器
+os.environ.setdefault("API_ASGI_MODE", "1")
 
 application = get_asgi_application()
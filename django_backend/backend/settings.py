@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.timing.ServerTimingMiddleware",
+    "api.compression.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -56,6 +58,62 @@ MIDDLEWARE = [
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True
+# 允许前端读取 Server-Timing、ETag、清洗结果缓存命中（X-Cleaned-Cache）和进度任务 ID（X-Job-Id）响应头
+CORS_EXPOSE_HEADERS = ["Server-Timing", "ETag", "X-Cleaned-Cache", "X-Job-Id"]
+
+# 响应压缩（api.compression.CompressionMiddleware）：安装 brotli 包时优先使用 br，否则使用 gzip
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_BROTLI_QUALITY = 5
+
+# 聚类/降维的特征矩阵估算超过该字节数时改为分块计算（MiniBatchKMeans / IncrementalPCA），见 api/outofcore.py
+ANALYSIS_MEMORY_LIMIT = int(os.environ.get("ANALYSIS_MEMORY_LIMIT", 512 * 1024 * 1024))
+ANALYSIS_CHUNK_ROWS = 100_000
+
+# 额外的分析引擎（analysis_type → 引擎类的导入路径），可以新增分析类型或替换内置引擎，见 api/engines/
+ANALYSIS_ENGINES = {}
+
+# 训练模型使用的线程数（梯度提升的 OpenMP 线程、随机森林的 n_jobs），0 表示使用全部 CPU 核
+ANALYSIS_THREADS = int(os.environ.get("ANALYSIS_THREADS", 0))
+
+# 批量上传（/api/datafiles/bulk_upload/）：并行处理的线程数上限、zip 压缩包解压后的总大小上限
+BULK_UPLOAD_WORKERS = int(os.environ.get("BULK_UPLOAD_WORKERS", 4))
+BULK_UPLOAD_MAX_ARCHIVE_BYTES = 1024 * 1024 * 1024
+
+# 分块上传（/api/uploads/，见 api/uploads.py）：建议的块大小、单块最大字节数、
+# 文件最大字节数、会话超过 UPLOAD_SESSION_TTL 秒没有新的块时过期（未完成的文件由存储回收删除）
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+UPLOAD_MAX_CHUNK_BYTES = 16 * 1024 * 1024
+UPLOAD_MAX_BYTES = 10 * 1024 * 1024 * 1024
+UPLOAD_SESSION_TTL = 24 * 3600
+
+# 磁盘存储管理（见 api/storage.py）：MEDIA_ROOT 下文件总大小的预算（字节，0 表示不限制），
+# 超出时按最近访问时间回收缓存和清洗结果；上传、清洗后最多每 STORAGE_GC_INTERVAL 秒自动检查一次
+STORAGE_BUDGET_BYTES = int(os.environ.get("STORAGE_BUDGET_BYTES", 0))
+STORAGE_GC_INTERVAL = 300
+
+# analyze / clean_data 带 progress 参数时在后台运行的任务数上限（见 api/progress.py）
+PROGRESS_JOB_WORKERS = int(os.environ.get("PROGRESS_JOB_WORKERS", 2))
+
+# 耗时接口（analyze、promote、clean_data、bulk_upload）的准入控制（见 api/admission.py）：
+# 全局 CPU 槽位数（0 表示 CPU 核数）、每个请求占用的槽位数、每个用户同时运行的请求数、
+# 每个用户 / 全部排队的请求数上限（超出时返回 429）、同步请求最长排队秒数、用户名 → 加权公平排队的权重（默认 1）
+ADMISSION_ENABLED = True
+ADMISSION_SLOTS = int(os.environ.get("ADMISSION_SLOTS", 0))
+ADMISSION_COSTS = {'analyze': 1, 'promote': 1, 'clean_data': 1, 'bulk_upload': 1}
+ADMISSION_USER_LIMIT = int(os.environ.get("ADMISSION_USER_LIMIT", 2))
+ADMISSION_USER_QUEUE = 8
+ADMISSION_QUEUE = 64
+ADMISSION_MAX_WAIT = 300
+ADMISSION_WEIGHTS = {}
+
+# ASGI 部署（backend/asgi.py 会设置环境变量 API_ASGI_MODE=1）：耗时接口在有界线程池中执行，见 api/offload.py。
+# 线程数为 0 时使用默认值（读取接口 CPU 核数 + 2，分析接口 CPU 核数）
+API_ASGI_MODE = os.environ.get("API_ASGI_MODE", "0") == "1"
+ASGI_READ_WORKERS = int(os.environ.get("ASGI_READ_WORKERS", 0))
+ASGI_ANALYSIS_WORKERS = int(os.environ.get("ASGI_ANALYSIS_WORKERS", 0))
+
+# 请求分阶段计时（Server-Timing 响应头 + /api/metrics/ 延迟直方图），设置环境变量 API_TIMING_ENABLED=0 关闭
+API_TIMING_ENABLED = os.environ.get("API_TIMING_ENABLED", "1") != "0"
 
 ROOT_URLCONF = "backend.urls"
 
@@ -76,6 +134,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "backend.wsgi.application"
+ASGI_APPLICATION = "backend.asgi.application"
 
 
 # Database
@@ -89,6 +148,29 @@ DATABASES = {
     }
 }
 
+# 生产环境的SQLite配置（设置环境变量 DJANGO_DB_PROFILE=production 启用）
+# - WAL 日志模式：写入时不阻塞读取，analyze/clean_data 插入记录时列表接口仍可正常读取
+# - timeout：遇到写锁时最多等待的秒数（busy timeout），而不是立即报 "database is locked"
+# - transaction_mode=IMMEDIATE：事务开始时即获取写锁，避免读锁升级为写锁时的死锁
+# - CONN_MAX_AGE：持久连接，避免每个请求重新打开数据库并重复执行 PRAGMA
+DB_PROFILE = os.environ.get("DJANGO_DB_PROFILE", "development")
+
+if DB_PROFILE == "production":
+    DATABASES["default"].update({
+        "CONN_MAX_AGE": int(os.environ.get("DJANGO_DB_CONN_MAX_AGE", "600")),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "timeout": int(os.environ.get("DJANGO_DB_BUSY_TIMEOUT", "20")),
+            "transaction_mode": "IMMEDIATE",
+            "init_command": (
+                "PRAGMA journal_mode=WAL;"
+                "PRAGMA synchronous=NORMAL;"
+                "PRAGMA temp_store=MEMORY;"
+                "PRAGMA cache_size=-65536;"
+            ),
+        },
+    })
+
 # MySQL数据库配置（取消注释以启用）
 # DATABASES = {
 #     'default': {
@@ -151,6 +233,11 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
+    # 支持直接序列化 NumPy 数组/标量、NaN 和 pandas Timestamp 的 JSON 渲染器（安装 orjson 时使用快速路径）
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.NumpyJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
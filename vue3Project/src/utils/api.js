@@ -74,12 +74,127 @@ export const uploadFile = async (file, name, description) => {
   });
 };
 
+// 超过该大小的文件使用分块上传（断线后从已接收的位置继续）
+export const CHUNKED_UPLOAD_THRESHOLD = 8 * 1024 * 1024;
+
+const sha256Hex = async (buffer) => {
+  const digest = await crypto.subtle.digest("SHA-256", buffer);
+  return Array.from(new Uint8Array(digest))
+    .map((byte) => byte.toString(16).padStart(2, "0"))
+    .join("");
+};
+
+// 分块上传（见后端 api/uploads.py）：创建会话 → 按顺序上传各块（带 SHA-256）→ finalize。
+// 某一块失败时查询已接收的字节数，从该位置重试，最多重试 retries 次；
+// onProgress(已接收字节数, 总字节数)。返回值与 uploadFile 相同（response.data 为数据文件记录，另带 profile）
+export const uploadFileResumable = async (file, name, description, onProgress, retries = 3) => {
+  const session = (
+    await api.post("/uploads/", {
+      name: name || file.name,
+      size: file.size,
+      description: description || "",
+    })
+  ).data;
+  let received = session.received;
+  let failures = 0;
+  while (received < file.size) {
+    const buffer = await file.slice(received, received + session.chunk_size).arrayBuffer();
+    try {
+      const response = await api.put(`/uploads/${session.id}/`, buffer, {
+        params: { offset: received },
+        headers: {
+          "Content-Type": "application/octet-stream",
+          "X-Content-SHA256": await sha256Hex(buffer),
+        },
+        timeout: 0,
+      });
+      received = response.data.received;
+      failures = 0;
+    } catch (error) {
+      // CSV 格式错误等无法通过重试解决的错误直接抛出
+      if (error.response?.status === 400 && !/校验和/.test(error.response.data?.error || "")) {
+        throw error;
+      }
+      failures += 1;
+      if (failures > retries) {
+        throw error;
+      }
+      received = (await api.get(`/uploads/${session.id}/`)).data.received;
+    }
+    if (onProgress) {
+      onProgress(received, file.size);
+    }
+  }
+  return api.post(`/uploads/${session.id}/finalize/`, null, { timeout: 0 });
+};
+
+// 批量上传：files 为 File 数组，archive 为可选的 zip 压缩包；
+// 返回每个文件的状态（created / error）以及整体吞吐量
+export const bulkUploadFiles = async (files, archive, description) => {
+  const formData = new FormData();
+  (files || []).forEach((file) => formData.append("files", file));
+  if (archive) {
+    formData.append("archive", archive);
+  }
+  formData.append("description", description || "");
+
+  return api.post("/datafiles/bulk_upload/", formData, {
+    headers: {
+      "Content-Type": "multipart/form-data",
+    },
+  });
+};
+
 export const getDataFiles = async () => {
   return api.get("/datafiles/");
 };
 
-export const getDataFilePreview = async (fileId) => {
-  return api.get(`/datafiles/${fileId}/preview/`); //获取特定文件的预览信息。
+// 把列式（layout=columnar）的预览数据还原为行数组 [{列名: 值}, ...]
+// 列格式说明见后端 api/columnar.py
+export const columnarToRows = (columns, data, length) => {
+  const decoded = columns.map((name) => {
+    const column = data[name];
+    const validity = column.validity
+      ? Uint8Array.from(atob(column.validity), (c) => c.charCodeAt(0))
+      : null;
+    const isValid = (i) => !validity || (validity[i >> 3] >> (i & 7)) & 1;
+    if (column.type === "dictionary") {
+      return (i) =>
+        column.codes[i] >= 0 ? column.dictionary[column.codes[i]] : null;
+    }
+    return (i) => (isValid(i) ? column.values[i] : null);
+  });
+  const rows = new Array(length);
+  for (let i = 0; i < length; i++) {
+    const row = {};
+    columns.forEach((name, j) => {
+      row[name] = decoded[j](i);
+    });
+    rows[i] = row;
+  }
+  return rows;
+};
+
+// options.columnar 为 true 时请求列式数据（传输量小得多），并在这里还原为行数组，
+// 调用方拿到的 response.data.data 与默认格式相同
+// options.joinFileId 指定连接文件时返回两个文件在键列（options.joinKey，默认 DATE）上连接后的数据
+export const getDataFilePreview = async (fileId, options = {}) => {
+  const params = {};
+  if (options.joinFileId) {
+    params.join_file_id = options.joinFileId;
+    if (options.joinKey) params.join_key = options.joinKey;
+    if (options.joinHow) params.join_how = options.joinHow;
+  }
+  if (!options.columnar) {
+    return api.get(`/datafiles/${fileId}/preview/`, { params }); //获取特定文件的预览信息。
+  }
+  const response = await api.get(`/datafiles/${fileId}/preview/`, {
+    params: { ...params, layout: "columnar" },
+  });
+  const { columns, data, info } = response.data;
+  response.data.data = columnarToRows(columns, data, info.shape[0]);
+  response.data.layout = "rows";
+  return response;
 };
 
 // 数据清洗相关API
@@ -91,8 +206,12 @@ export const cleanData = async (fileId, cleaningMethod, parameters) => {
   }); //数据清洗
 };
 
-export const getCleanedDataList = async () => {
-  return api.get("/cleaneddata/"); //得到清洗后的数据
+// 列表接口按创建时间游标分页，返回 { next, previous, results }；
+// 翻页时把 next/previous 链接中的 cursor 参数传回来
+export const getCleanedDataList = async (cursor, pageSize) => {
+  return api.get("/cleaneddata/", {
+    params: { cursor, page_size: pageSize },
+  }); //得到清洗后的数据
 };
 
 // 数据分析相关API
@@ -100,7 +219,8 @@ export const runAnalysis = async (
   fileId, //数据文件ID
   cleanedDataId, //清洗后的数据 ID
   analysisType, //分析类型
-  parameters //分析所需的参数
+  parameters, //分析所需的参数
+  join = {} //可选的连接文件：{ fileId, key, how }
 ) => {
   const requestData = {
     file_id: fileId,
@@ -108,6 +228,11 @@ export const runAnalysis = async (
     analysis_type: analysisType,
     parameters,
   };
+  if (join.fileId) {
+    requestData.join_file_id = join.fileId;
+    requestData.join_key = join.key;
+    requestData.join_how = join.how;
+  }
 
   console.log("发送数据分析请求:", JSON.stringify(requestData));
 
@@ -129,8 +254,76 @@ export const runAnalysis = async (
   }
 };
 
-export const getAnalysisResults = async () => {
-  return api.get("/analysisresults/");
+// 列表只包含分析摘要（不含 result），完整结果用 getAnalysisResult 获取
+export const getAnalysisResults = async (cursor, pageSize) => {
+  return api.get("/analysisresults/", {
+    params: { cursor, page_size: pageSize },
+  });
+};
+
+export const getAnalysisResult = async (resultId) => {
+  return api.get(`/analysisresults/${resultId}/`);
+};
+
+// 抽样分析（parameters.sample）的结果用全量数据重新运行，返回新的分析结果
+export const promoteAnalysis = async (resultId) => {
+  return api.post(`/analysisresults/${resultId}/promote/`);
+};
+
+// 以进度事件流（?progress=stream，Server-Sent Events）运行 analyze / clean_data。
+// onEvent(event, data) 依次收到 progress 事件（stage、progress 0~1 等），返回最后的 result 事件 { status, data }；
+// signal（AbortController.signal）中止时断开连接，后端随之取消计算。
+// EventSource 不能发送 POST 请求和 Authorization 头，所以这里用 fetch 读取流
+export const streamWithProgress = async (path, body, onEvent, signal) => {
+  const token = localStorage.getItem("token");
+  const response = await fetch(`${baseURL}${path}?progress=stream`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      ...(token ? { Authorization: `Token ${token}` } : {}),
+    },
+    body: JSON.stringify(body),
+    signal,
+  });
+  if (!response.ok) {
+    throw { response: { status: response.status, data: await response.json() } };
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let result = null;
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const blocks = buffer.split("\n\n");
+    buffer = blocks.pop(); //最后一段可能不完整，留到下次
+    for (const block of blocks) {
+      let event = "message";
+      let data = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      if (!data) continue; //retry 和心跳注释行
+      const parsed = JSON.parse(data);
+      if (onEvent) onEvent(event, parsed);
+      if (event === "result" || event === "cancelled") result = { event, ...parsed };
+    }
+  }
+  return result;
+};
+
+export const streamAnalysis = (requestData, onEvent, signal) =>
+  streamWithProgress("/analysisresults/analyze/", requestData, onEvent, signal);
+
+export const streamCleaning = (requestData, onEvent, signal) =>
+  streamWithProgress("/cleaneddata/clean_data/", requestData, onEvent, signal);
+
+// 取消 progress=job 方式提交的后台任务
+export const cancelJob = async (jobId) => {
+  return api.post(`/jobs/${jobId}/cancel/`);
 };
 
 // 数据可视化相关API